@@ -0,0 +1,262 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Long-lived build agent for the managed instances.
+
+Running charmcraft in the instance for each pack means paying every time for starting
+the snap and importing all charmcraft and its dependencies. Instead, an agent process
+is kept running in the instance: it imports everything once and then serves the packs
+requested through a Unix socket, forking a process for each one (so each pack runs
+isolated, but with everything already loaded).
+
+The host requests each pack running a tiny client (that only needs the instance's
+Python, always present) instead of charmcraft itself. The client starts the agent if
+it's not running, and falls back to run charmcraft directly if the agent can not be
+reached. The exit code of the pack is sent by the agent as the last byte of the
+output.
+"""
+
+import contextlib
+import distutils.util
+import json
+import logging
+import os
+import socket
+import sys
+from typing import List
+
+from charmcraft import __version__
+from charmcraft.cmdbase import CommandError
+from charmcraft.env import (
+    get_managed_environment_home_path,
+    is_charmcraft_running_from_snap,
+    is_charmcraft_running_in_developer_mode,
+)
+from charmcraft.snap import get_snap_configuration
+
+logger = logging.getLogger(__name__)
+
+# the option to run charmcraft as the agent (only valid in a managed instance)
+AGENT_OPTION = "--internal-build-agent"
+
+# the agent exits after this many seconds without requests
+AGENT_IDLE_TIMEOUT = 3600
+
+# how long the client waits for the agent it started to be ready
+_AGENT_START_TIMEOUT = 60
+
+_AGENT_LOG_PATH = "/tmp/charmcraft-agent.log"
+
+# the client run in the instance for each pack; it must only use the standard library
+_CLIENT_SCRIPT = """\
+import json, os, socket, subprocess, sys, time
+path, argv = sys.argv[1], sys.argv[2:]
+
+def connect():
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+try:
+    sock = connect()
+except OSError:
+    try:
+        with open({log_path!r}, "ab") as log:
+            subprocess.Popen(
+                [argv[0], {agent_option!r}, path],
+                stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+            )
+    except OSError:
+        os.execvp(argv[0], argv)
+    deadline = time.monotonic() + {start_timeout}
+    while True:
+        try:
+            sock = connect()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                os.execvp(argv[0], argv)
+            time.sleep(0.1)
+
+request = {{"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}}
+sock.sendall(json.dumps(request).encode("utf8") + b"\\n")
+out = sys.stdout.buffer
+last = b""
+while True:
+    data = sock.recv(65536)
+    if not data:
+        break
+    data = last + data
+    out.write(data[:-1])
+    out.flush()
+    last = data[-1:]
+sys.exit(last[0] if last else 1)
+""".format(
+    log_path=_AGENT_LOG_PATH, agent_option=AGENT_OPTION, start_timeout=_AGENT_START_TIMEOUT
+)
+
+
+def parse_build_agent(value) -> bool:
+    """Parse the configuration of the build agent (a boolean, or its string form).
+
+    :raises ValueError: if the configuration is not valid.
+    """
+    if isinstance(value, bool):
+        return value
+    try:
+        return distutils.util.strtobool(str(value)) == 1
+    except ValueError:
+        raise ValueError(f"{value!r} is not a boolean")
+
+
+def is_build_agent_enabled() -> bool:
+    """Tell if the packs in the instances are requested to a long-lived agent.
+
+    (1) use the value specified with CHARMCRAFT_BUILD_AGENT if running
+        in developer mode,
+    (2) use the value specified with snap configuration if running
+        as snap,
+    (3) default to not use the agent.
+
+    :raises CommandError: if the configuration is not valid.
+    """
+    build_agent = None
+
+    if is_charmcraft_running_in_developer_mode():
+        build_agent = os.getenv("CHARMCRAFT_BUILD_AGENT")
+
+    if build_agent is None and is_charmcraft_running_from_snap():
+        snap_config = get_snap_configuration()
+        build_agent = snap_config.build_agent if snap_config else None
+
+    if build_agent is None:
+        return False
+
+    try:
+        return parse_build_agent(build_agent)
+    except ValueError as error:
+        raise CommandError(f"Invalid build agent configuration: {error}.")
+
+
+def get_agent_socket_path() -> str:
+    """Return where the agent listens in the instance.
+
+    It depends on charmcraft's version, so an agent is never used by a different one.
+    """
+    return str(get_managed_environment_home_path() / f".charmcraft-agent-{__version__}.sock")
+
+
+def get_agent_client_command(cmd: List[str]) -> List[str]:
+    """Return the command to run in the instance to request the charmcraft command."""
+    return ["python3", "-c", _CLIENT_SCRIPT, get_agent_socket_path()] + cmd
+
+
+def _get_exit_code(status: int) -> int:
+    """Return the exit code of a process from its status (as a shell does)."""
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_request(conn: socket.socket, request, main) -> None:
+    """Run the requested command in this (forked) process, with its output to the client.
+
+    This never returns.
+    """
+    retcode = 1
+    try:
+        with open(os.devnull, "rb") as devnull:
+            os.dup2(devnull.fileno(), 0)
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        sys.stdout = open(1, "wt", buffering=1, closefd=False)
+        sys.stderr = open(2, "wt", buffering=1, closefd=False)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        sys.argv = request["argv"]
+        retcode = main(request["argv"])
+    except BaseException as exc:
+        print(f"Build agent failed to run the request: {exc!r}", file=sys.stderr)
+    finally:
+        with contextlib.suppress(Exception):
+            sys.stdout.flush()
+            sys.stderr.flush()
+        os._exit(retcode & 0xFF)
+
+
+def serve_request(conn: socket.socket, main) -> None:
+    """Serve a request, running the command in a forked process."""
+    with conn.makefile("rb") as reader:
+        line = reader.readline()
+    try:
+        request = json.loads(line)
+        if not (
+            isinstance(request["argv"], list)
+            and isinstance(request["cwd"], str)
+            and isinstance(request["env"], dict)
+        ):
+            raise ValueError("wrong types")
+    except (ValueError, KeyError, TypeError) as exc:
+        logger.warning("Ignoring invalid request %r: %r", line, exc)
+        return
+
+    pid = os.fork()
+    if pid == 0:
+        _run_request(conn, request, main)
+    _, status = os.waitpid(pid, 0)
+    conn.sendall(bytes([_get_exit_code(status) & 0xFF]))
+
+
+def serve(socket_path: str) -> int:
+    """Serve the requests until idle for too long.
+
+    If another agent is already serving in the same path, just exit.
+    """
+    # import here to avoid cyclic imports (and it's already imported when run as the agent)
+    from charmcraft.main import main
+
+    with socket.socket(socket.AF_UNIX) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            pass
+        else:
+            logger.warning("Build agent already running in %r.", socket_path)
+            return 0
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(socket_path)
+    with socket.socket(socket.AF_UNIX) as server:
+        server.bind(socket_path)
+        server.listen()
+        server.settimeout(AGENT_IDLE_TIMEOUT)
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    return 0
+                with conn:
+                    conn.settimeout(None)
+                    serve_request(conn, main)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
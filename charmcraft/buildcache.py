@@ -0,0 +1,312 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Cache of the charms built, to reuse them when nothing changed in the project."""
+
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import zipfile
+from typing import Optional
+
+import requests
+from xdg import BaseDirectory  # type: ignore
+
+from charmcraft.cmdbase import CommandError
+from charmcraft.env import is_charmcraft_running_from_snap, is_charmcraft_running_in_developer_mode
+from charmcraft.jujuignore import JujuIgnore, default_juju_ignore
+from charmcraft.snap import get_snap_configuration
+
+logger = logging.getLogger(__name__)
+
+BUILD_CACHE_DIRNAME = "charms"
+
+# how many charms are kept for the same charm file name (the least recently used are
+# removed), so the cache does not grow forever while working on a project
+MAX_CACHED_PER_CHARM = 3
+
+# files in the project that are not part of its sources for the cache (charmcraft.yaml
+# is included by its relevant content, the rest are produced by the builds)
+_NOT_SOURCES = {"charmcraft.yaml"}
+_NOT_SOURCES_SUFFIX = ".charm"
+
+# timeout for each request to a shared cache server (connecting and reading)
+_HTTP_TIMEOUT = 30
+
+
+def get_build_cache_path() -> pathlib.Path:
+    """Return the path of the build cache in this machine's charmcraft cache."""
+    return pathlib.Path(BaseDirectory.save_cache_path("charmcraft")) / BUILD_CACHE_DIRNAME
+
+
+def _hash_file(digest, filepath: pathlib.Path) -> None:
+    """Feed the file content to the digest."""
+    with filepath.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(2 ** 20), b""):
+            digest.update(chunk)
+
+
+def hash_project_tree(project_dir: pathlib.Path) -> str:
+    """Return a hash of the project's sources (what a build would take from it).
+
+    The files ignored by `.jujuignore` (and by default) are not included. Everything else
+    is, in order: names, types, if executable, symlink targets and content. Symlinked
+    directories are not walked into (so loops are not a problem), only their targets count.
+    """
+    ignore = JujuIgnore(default_juju_ignore, source="defaults")
+    jujuignore_path = project_dir / ".jujuignore"
+    if jujuignore_path.exists():
+        with jujuignore_path.open("r", encoding="utf-8") as ignores:
+            ignore.extend_patterns(ignores, source=".jujuignore")
+
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(project_dir, followlinks=False):
+        dirpath = pathlib.Path(dirpath)
+        reldir = dirpath.relative_to(project_dir)
+        dirnames[:] = sorted(
+            name for name in dirnames if not ignore.match(str(reldir / name), is_dir=True)
+        )
+        for name in sorted(filenames):
+            relpath = reldir / name
+            if reldir == pathlib.Path(".") and (
+                name in _NOT_SOURCES or name.endswith(_NOT_SOURCES_SUFFIX)
+            ):
+                continue
+            if ignore.match(str(relpath), is_dir=False):
+                continue
+            filepath = dirpath / name
+            digest.update(relpath.as_posix().encode("utf8") + b"\0")
+            if filepath.is_symlink():
+                digest.update(b"L" + os.readlink(filepath).encode("utf8") + b"\0")
+            if filepath.is_file():
+                # the content is always included, even if the file is symlinked
+                digest.update(b"X" if os.access(filepath, os.X_OK) else b"F")
+                _hash_file(digest, filepath)
+                digest.update(b"\0")
+        for name in dirnames:
+            # symlinked directories are not walked into, only their targets matter
+            linkpath = dirpath / name
+            if linkpath.is_symlink():
+                relpath = (reldir / name).as_posix()
+                digest.update(relpath.encode("utf8") + b"\0L" + os.readlink(linkpath).encode())
+    return digest.hexdigest()
+
+
+def hash_file(filepath: pathlib.Path) -> str:
+    """Return the hash of the file content (empty if it does not exist)."""
+    digest = hashlib.sha256()
+    try:
+        _hash_file(digest, filepath)
+    except FileNotFoundError:
+        return ""
+    return digest.hexdigest()
+
+
+class BuildCache:
+    """The charms previously built, each one stored under the key of its build inputs.
+
+    :param basedir: The directory where the charms are stored.
+    """
+
+    def __init__(self, basedir: pathlib.Path):
+        self.basedir = basedir
+
+    def _get_path(self, charm_name: str, key: str) -> pathlib.Path:
+        return self.basedir / charm_name / key
+
+    def get(self, charm_name: str, key: str) -> Optional[pathlib.Path]:
+        """Return the charm built with the key, if any."""
+        path = self._get_path(charm_name, key)
+        if not path.is_file():
+            logger.debug("Charm %r not found in the build cache (key %s).", charm_name, key)
+            return None
+        # record the use, so the most recently used charms are kept
+        path.touch()
+        logger.debug("Charm %r found in the build cache (key %s).", charm_name, key)
+        return path
+
+    def put(self, charm_name: str, key: str, charm_path: pathlib.Path) -> None:
+        """Store the charm built with the key, removing the least recently used ones."""
+        path = self._get_path(charm_name, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(key + ".partial")
+        try:
+            shutil.copyfile(charm_path, temp_path)
+        except FileNotFoundError:
+            logger.debug("Charm %r to store in the build cache not found.", str(charm_path))
+            return
+        os.replace(temp_path, path)
+        logger.debug("Charm %r stored in the build cache (key %s).", charm_name, key)
+
+        cached = sorted(path.parent.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old_path in cached[MAX_CACHED_PER_CHARM:]:
+            logger.debug("Removing old charm from the build cache: %r", str(old_path))
+            old_path.unlink()
+
+
+class CacheStats:
+    """How the charms were obtained in a run: reused from the caches or built."""
+
+    def __init__(self):
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.built = 0
+        self.shared_stored = 0
+        self.shared_errors = 0
+
+
+def is_valid_charm(path: pathlib.Path) -> bool:
+    """Tell if the file looks like a complete charm (e.g. not truncated when transferred)."""
+    try:
+        with zipfile.ZipFile(path) as zipfh:
+            return zipfh.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+class FilesystemSharedCache:
+    """A cache of charms shared between machines in a (e.g. NFS mounted) directory.
+
+    The charms are stored by their key only, spread in subdirectories by its prefix.
+
+    :param basedir: The shared directory.
+    """
+
+    def __init__(self, basedir: pathlib.Path):
+        self.basedir = basedir
+
+    def __str__(self):
+        return str(self.basedir)
+
+    def _get_path(self, key: str) -> pathlib.Path:
+        return self.basedir / key[:2] / key
+
+    def fetch(self, key: str, destination: pathlib.Path) -> bool:
+        """Copy the charm stored with the key to the destination, if it's there.
+
+        :raises OSError: if the shared directory can not be read.
+        """
+        try:
+            shutil.copyfile(self._get_path(key), destination)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key: str, charm_path: pathlib.Path) -> None:
+        """Store the charm with the key.
+
+        :raises OSError: if the shared directory can not be written.
+        """
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # other machines may be storing the same at the same time: the last one wins
+        temp_path = path.with_name(f"{key}.{os.uname().nodename}.{os.getpid()}.partial")
+        shutil.copyfile(charm_path, temp_path)
+        os.replace(temp_path, path)
+
+
+class HTTPSharedCache:
+    """A cache of charms shared between machines in a HTTP server.
+
+    The charms are retrieved with GET and stored with PUT, at the server's URL followed
+    by their key.
+
+    :param url: The base URL of the cache in the server.
+    """
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def __str__(self):
+        return self.url
+
+    def fetch(self, key: str, destination: pathlib.Path) -> bool:
+        """Download the charm stored with the key to the destination, if it's there.
+
+        :raises OSError: if the server can not be reached or fails.
+        """
+        try:
+            with requests.get(f"{self.url}/{key}", stream=True, timeout=_HTTP_TIMEOUT) as resp:
+                if resp.status_code == 404:
+                    return False
+                resp.raise_for_status()
+                with destination.open("wb") as fh:
+                    for chunk in resp.iter_content(chunk_size=2 ** 20):
+                        fh.write(chunk)
+        except requests.RequestException as exc:
+            raise OSError(f"cannot get {key!r}: {exc}")
+        return True
+
+    def store(self, key: str, charm_path: pathlib.Path) -> None:
+        """Upload the charm with the key.
+
+        :raises OSError: if the server can not be reached or fails.
+        """
+        try:
+            with charm_path.open("rb") as fh:
+                resp = requests.put(f"{self.url}/{key}", data=fh, timeout=_HTTP_TIMEOUT)
+            resp.raise_for_status()
+        except requests.RequestException as exc:
+            raise OSError(f"cannot put {key!r}: {exc}")
+
+
+def parse_shared_cache(value: str):
+    """Return the shared cache for the configured location.
+
+    It's a HTTP(S) URL for a server, or an absolute path for a shared directory.
+
+    :raises ValueError: if the location is not valid.
+    """
+    if value.startswith(("http://", "https://")):
+        return HTTPSharedCache(value)
+    if value.startswith("file://"):
+        value = value[len("file://") :]
+    if not value.startswith("/"):
+        raise ValueError(f"{value!r} is not a HTTP(S) URL or an absolute path")
+    return FilesystemSharedCache(pathlib.Path(value))
+
+
+def get_shared_cache():
+    """Get the cache of charms shared between machines, if any.
+
+    (1) use the location specified with CHARMCRAFT_SHARED_CACHE if running
+        in developer mode,
+    (2) use the location specified with snap configuration if running
+        as snap,
+    (3) default to none (only the local cache is used).
+
+    :return: The shared cache, or None.
+
+    :raises CommandError: if the configuration is not valid.
+    """
+    shared_cache = None
+
+    if is_charmcraft_running_in_developer_mode():
+        shared_cache = os.getenv("CHARMCRAFT_SHARED_CACHE")
+
+    if shared_cache is None and is_charmcraft_running_from_snap():
+        snap_config = get_snap_configuration()
+        shared_cache = snap_config.shared_cache if snap_config else None
+
+    if not shared_cache:
+        return None
+
+    try:
+        return parse_shared_cache(shared_cache)
+    except ValueError as error:
+        raise CommandError(f"Invalid shared cache configuration: {error}.")
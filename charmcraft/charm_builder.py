@@ -17,16 +17,31 @@
 """The charm package builder."""
 
 import argparse
+import concurrent.futures
+import contextlib
 import errno
+import hashlib
+import json
 import logging
 import os
 import pathlib
+import platform
+import re
 import shutil
 import sys
 import subprocess
-from typing import List
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:  # not available in all platforms
+    fcntl = None
 
 from charmcraft.cmdbase import CommandError
+from charmcraft.importgraph import ImportGraph, find_unreachable
 from charmcraft.jujuignore import JujuIgnore, default_juju_ignore
 from charmcraft.utils import make_executable
 
@@ -36,6 +51,57 @@ WORK_DIRNAME = "work_dir"
 VENV_DIRNAME = "venv"
 STAGING_VENV_DIRNAME = "staging-venv"
 
+# Where the ignore rules come from (only the project's ones can be changed by the user)
+IGNORE_SOURCE_DEFAULTS = "defaults"
+IGNORE_SOURCE_PROJECT = ".jujuignore"
+IGNORE_SOURCE_INTERNAL = "internal"
+
+# The file, next to the build directory, with the report of the build phases (unless
+# other path is indicated)
+BUILD_REPORT_FILENAME = "charm-build-report.json"
+
+# The directory, inside the cache one, to keep the already installed dependencies
+DEPENDENCIES_CACHE_DIRNAME = "charm-dependencies"
+
+# How many sets of installed dependencies are kept in the cache (the least recently used
+# are removed), so it does not grow forever as the requirements change
+MAX_CACHED_DEPENDENCIES = 5
+
+# The directory, inside the cache one, to keep the wheels built from source
+WHEELHOUSE_DIRNAME = "wheelhouse"
+
+# The prefix of the temporary directories where the wheels are built before being moved
+# to the wheelhouse, so other builds sharing it never see partially written wheels
+WHEELHOUSE_TMP_PREFIX = ".tmp-"
+
+# The directories, inside the build one, with the code to byte-compile (if requested)
+BYTECODE_DIRNAMES = ["src", "lib", VENV_DIRNAME]
+
+# The default rules (in .jujuignore format, from the venv root) to prune the dependencies:
+# test suites, bytecode (compiled for the build environment and without valid timestamps
+# once packed; it's generated properly later if requested) and installation records
+DEFAULT_PRUNE_RULES = ["__pycache__/", "tests/", "*.dist-info/RECORD"]
+
+# Documentation directories, also pruned by default unless they are Python packages
+PRUNE_DOC_DIRNAMES = {"doc", "docs"}
+
+# The strategies to materialize the files in the build directory, in order of preference
+STAGE_REFLINK = "reflink"
+STAGE_HARDLINK = "hardlink"
+STAGE_COPY_RANGE = "copy_file_range"
+STAGE_COPY = "copy"
+STAGE_STRATEGIES = [STAGE_REFLINK, STAGE_HARDLINK, STAGE_COPY_RANGE, STAGE_COPY]
+
+# The ioctl to clone a file (from linux/fs.h), and the size to copy in the kernel each time
+FICLONE = 0x40049409
+COPY_RANGE_CHUNK = 2 ** 30
+
+# The errors that mean that a staging strategy is not supported between two filesystems
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+
+# How many threads to use for linking files (mostly waiting on the filesystem)
+LINK_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
 # The file name and template for the dispatch script
 DISPATCH_FILENAME = "dispatch"
 # If Juju doesn't support the dispatch mechanism, it will execute the
@@ -59,6 +125,187 @@ def relativise(src, dst):
     return pathlib.Path(os.path.relpath(str(dst), str(src.parent)))
 
 
+def _reflink(src_path, dest_path):
+    """Clone the file sharing its data blocks (only supported by some filesystems)."""
+    if fcntl is None or sys.platform != "linux":
+        raise OSError(errno.EOPNOTSUPP, "reflinks not supported in this platform")
+    with open(src_path, "rb") as src_fh, open(dest_path, "xb") as dest_fh:
+        try:
+            fcntl.ioctl(dest_fh.fileno(), FICLONE, src_fh.fileno())
+        except OSError:
+            os.unlink(dest_path)
+            raise
+    shutil.copystat(src_path, dest_path)
+
+
+def _hardlink(src_path, dest_path):
+    """Hard link the file."""
+    os.link(src_path, dest_path)
+
+
+def _copy_range(src_path, dest_path):
+    """Copy the file inside the kernel, which may even share blocks in the filesystem."""
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range not supported in this platform")
+    with open(src_path, "rb") as src_fh, open(dest_path, "xb") as dest_fh:
+        try:
+            while os.copy_file_range(src_fh.fileno(), dest_fh.fileno(), COPY_RANGE_CHUNK):
+                pass
+        except OSError:
+            os.unlink(dest_path)
+            raise
+    shutil.copystat(src_path, dest_path)
+
+
+def _copy(src_path, dest_path):
+    """Copy the file, with its metadata."""
+    shutil.copy2(src_path, dest_path)
+
+
+class FileStager:
+    """Materialize files in the build directory in the cheapest possible way.
+
+    The strategies are tried in order: cloning the file (reflinks, in filesystems like
+    btrfs or XFS), hard linking it, copying it inside the kernel, and a plain copy. A
+    strategy that is not supported between two filesystems is not tried again for them.
+
+    It's safe to use it from different threads. The files staged with each strategy are
+    counted in `counters`, and their total size in `staged_bytes`.
+    """
+
+    def __init__(self):
+        self.counters = dict.fromkeys(STAGE_STRATEGIES, 0)
+        self.staged_bytes = 0
+        self._unsupported = set()
+        self._dir_devices = {}
+        self._lock = threading.Lock()
+
+    def _get_dest_device(self, dest_path):
+        """Return the device of the destination directory."""
+        dest_dir = os.path.dirname(dest_path)
+        dest_device = self._dir_devices.get(dest_dir)
+        if dest_device is None:
+            dest_device = self._dir_devices[dest_dir] = os.stat(dest_dir).st_dev
+        return dest_device
+
+    def stage(self, src_path, dest_path) -> str:
+        """Materialize the source file in the destination, returning the strategy used."""
+        src_stat = os.stat(src_path)
+        devices = (src_stat.st_dev, self._get_dest_device(dest_path))
+        strategies = [
+            (STAGE_REFLINK, _reflink),
+            (STAGE_HARDLINK, _hardlink),
+            (STAGE_COPY_RANGE, _copy_range),
+            (STAGE_COPY, _copy),
+        ]
+        for strategy, function in strategies:
+            if (strategy, devices) in self._unsupported:
+                continue
+            try:
+                function(src_path, dest_path)
+            except OSError as exc:
+                if strategy == STAGE_COPY:
+                    raise
+                if isinstance(exc, PermissionError) or exc.errno == errno.EMLINK:
+                    # e.g. not allowed to hard link this file, try the next strategy
+                    continue
+                if exc.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._unsupported.add((strategy, devices))
+                continue
+            with self._lock:
+                self.counters[strategy] += 1
+                self.staged_bytes += src_stat.st_size
+            return strategy
+
+    def get_totals(self):
+        """Return how many files (and bytes) were materialized so far."""
+        with self._lock:
+            return sum(self.counters.values()), self.staged_bytes
+
+    def stage_files(self, to_stage):
+        """Materialize the files (source and destination pairs)."""
+        for src_path, dest_path in to_stage:
+            self.stage(src_path, dest_path)
+
+    def stage_tree(self, src_dir, dest_dir):
+        """Replicate the whole directory, materializing its files."""
+        shutil.copytree(src_dir, dest_dir, copy_function=self.stage)
+
+    def report(self):
+        """Log how many files were materialized with each strategy."""
+        if any(self.counters.values()):
+            counters = ", ".join(f"{key}={value}" for key, value in self.counters.items())
+            logger.debug("Files staged by strategy: %s", counters)
+
+
+def _get_cpu_time() -> float:
+    """Return the CPU time used by this process and its (finished) subprocesses."""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class BuildReport:
+    """Measure the phases of the build: wall and CPU time, and files and bytes handled.
+
+    The CPU time includes the subprocesses (like pip) run in the phase, and as it's
+    measured for the whole process it's shared by phases that run concurrently. A phase
+    can be measured several times (even from different threads), accumulating all its
+    values.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name, stager=None):
+        """Measure a phase of the build.
+
+        Yield a dict where the files and bytes handled in the phase can be added; if a
+        stager is given, the files it materialized during the phase are counted.
+        """
+        counts = {"files": 0, "bytes": 0}
+        if stager is not None:
+            initial_files, initial_bytes = stager.get_totals()
+        wall_start = time.monotonic()
+        cpu_start = _get_cpu_time()
+        try:
+            yield counts
+        finally:
+            wall_time = time.monotonic() - wall_start
+            cpu_time = _get_cpu_time() - cpu_start
+            if stager is not None:
+                final_files, final_bytes = stager.get_totals()
+                counts["files"] += final_files - initial_files
+                counts["bytes"] += final_bytes - initial_bytes
+
+            with self._lock:
+                record = self.phases.setdefault(
+                    name, {"wall_time": 0.0, "cpu_time": 0.0, "files": 0, "bytes": 0}
+                )
+                record["wall_time"] += wall_time
+                record["cpu_time"] += cpu_time
+                record["files"] += counts["files"]
+                record["bytes"] += counts["bytes"]
+
+    def save(self, path, **extra):
+        """Write the report (with any extra information) as JSON in the given path."""
+        phases = [
+            dict(
+                name=name,
+                wall_time=round(record["wall_time"], 6),
+                cpu_time=round(record["cpu_time"], 6),
+                files=record["files"],
+                bytes=record["bytes"],
+            )
+            for name, record in self.phases.items()
+        ]
+        report = dict(phases=phases, **extra)
+        with path.open("wt", encoding="utf8") as fh:
+            json.dump(report, fh, indent=2)
+
+
 class CharmBuilder:
     """The package builder."""
 
@@ -70,36 +317,123 @@ class CharmBuilder:
         allow_pip_binary: bool = None,
         python_packages: List[str] = None,
         requirements: List[str] = None,
+        ignore_stats: bool = False,
+        cache_dir: pathlib.Path = None,
+        wheelhouse_dir: pathlib.Path = None,
+        compile_bytecode: bool = False,
+        prune: bool = False,
+        prune_keep: List[str] = None,
+        prune_remove: List[str] = None,
+        tree_shake: bool = False,
+        tree_shake_keep: List[str] = None,
+        report_path: pathlib.Path = None,
     ):
         self.charmdir = charmdir
         self.buildpath = builddir
+        if report_path is None:
+            report_path = builddir.parent / BUILD_REPORT_FILENAME
+        self.report_path = report_path
         self.entrypoint = entrypoint
         self.allow_pip_binary = allow_pip_binary
         self.python_packages = python_packages
         self.requirement_paths = requirements
+        self.ignore_stats = ignore_stats
+        self.cache_dir = cache_dir
+        self.wheelhouse_dir = wheelhouse_dir
+        self.compile_bytecode = compile_bytecode
+        self.prune = prune
+        self.prune_keep = prune_keep or []
+        self.prune_remove = prune_remove or []
+        self.tree_shake = tree_shake
+        self.tree_shake_keep = tree_shake_keep or []
+        self.stager = FileStager()
+        self.report = BuildReport()
         self.ignore_rules = self._load_juju_ignore()
-        self.ignore_rules.extend_patterns([f"/{STAGING_VENV_DIRNAME}"])
+        self.ignore_rules.extend_patterns(
+            [f"/{STAGING_VENV_DIRNAME}"], source=IGNORE_SOURCE_INTERNAL
+        )
 
     def build_charm(self) -> None:
         """Build the charm."""
         logger.debug("Building charm in %r", str(self.buildpath))
 
+        # a report left by a previous build must not be taken as this one's
+        if self.report_path.exists():
+            self.report_path.unlink()
+
         if self.buildpath.exists():
             shutil.rmtree(str(self.buildpath))
         self.buildpath.mkdir()
 
-        linked_entrypoint = self.handle_generic_paths()
-        self.handle_dispatcher(linked_entrypoint)
-        self.handle_dependencies()
+        # the dependencies are installed (out of the build directory) while the charm
+        # files are linked, and then placed in the venv
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            installing = executor.submit(self.install_dependencies)
+            try:
+                linked_entrypoint = self.handle_generic_paths()
+                if self.ignore_stats:
+                    self.show_ignore_stats()
+                with self.report.phase("dispatch"):
+                    self.handle_dispatcher(linked_entrypoint)
+            except Exception:
+                # the installation can not be interrupted; wait for it, reporting its
+                # problem too (if any) before the one when linking
+                install_error = installing.exception()
+                if install_error is not None:
+                    logger.error("Installing the dependencies also failed: %s", install_error)
+                raise
+            installed_dir, cached_dir = installing.result()
+        self.place_dependencies(installed_dir, cached_dir)
+        self.stager.report()
+        if self.prune or self.prune_remove:
+            with self.report.phase("prune") as counts:
+                counts["files"], counts["bytes"] = self.handle_pruning()
+        if self.tree_shake:
+            with self.report.phase("tree-shake") as counts:
+                counts["files"], counts["bytes"] = self.handle_tree_shaking(linked_entrypoint)
+        if self.compile_bytecode:
+            with self.report.phase("bytecode"):
+                self.handle_bytecode()
+
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.report.save(self.report_path, staged=self.stager.counters)
 
     def _load_juju_ignore(self):
-        ignore = JujuIgnore(default_juju_ignore)
+        ignore = JujuIgnore(
+            default_juju_ignore, instrument=self.ignore_stats, source=IGNORE_SOURCE_DEFAULTS
+        )
         path = self.charmdir / ".jujuignore"
         if path.exists():
             with path.open("r", encoding="utf-8") as ignores:
-                ignore.extend_patterns(ignores)
+                ignore.extend_patterns(ignores, source=IGNORE_SOURCE_PROJECT)
         return ignore
 
+    def show_ignore_stats(self):
+        """Show the statistics of the ignore rules, and which ones never matched anything.
+
+        Only the rules from the project's .jujuignore are reported as never matched, as the
+        rest can not be removed by the user anyway.
+        """
+        stats = self.ignore_rules.get_stats()
+        logger.debug("Ignore rules statistics (slowest first):")
+        for stat in sorted(stats, key=lambda s: s.elapsed, reverse=True):
+            logger.debug(
+                "   %8.3fms %8d evaluations %8d matches  %s:%d: %r",
+                stat.elapsed * 1000,
+                stat.evaluations,
+                stat.matches,
+                stat.source,
+                stat.line_num,
+                stat.rule,
+            )
+        dead = [
+            stat for stat in stats if not stat.matches and stat.source == IGNORE_SOURCE_PROJECT
+        ]
+        if dead:
+            logger.debug("Ignore rules that never matched:")
+            for stat in dead:
+                logger.debug("   %s:%d: %r", stat.source, stat.line_num, stat.rule)
+
     def create_symlink(self, src_path, dest_path):
         """Create a symlink in dest_path pointing relatively like src_path.
 
@@ -124,56 +458,76 @@ class CharmBuilder:
         - directories: created
         - symlinks: respected if are internal to the project
         - other types (blocks, mount points, etc): ignored
+
+        The tree is walked here, creating the directories in order, while the files of each
+        directory are linked in parallel by a pool of threads. In the build report the "walk"
+        phase is the walking itself (with the linking already going on), and the "link" one
+        is waiting for the linking pending after that (but counts all the linked files).
         """
         logger.debug("Linking in generic paths")
 
-        for basedir, dirnames, filenames in os.walk(str(self.charmdir), followlinks=False):
-            abs_basedir = pathlib.Path(basedir)
-            rel_basedir = abs_basedir.relative_to(self.charmdir)
-
-            # process the directories
-            ignored = []
-            for pos, name in enumerate(dirnames):
-                rel_path = rel_basedir / name
-                abs_path = abs_basedir / name
-
-                if self.ignore_rules.match(str(rel_path), is_dir=True):
-                    logger.debug("Ignoring directory because of rules: %r", str(rel_path))
-                    ignored.append(pos)
-                elif abs_path.is_symlink():
-                    dest_path = self.buildpath / rel_path
-                    self.create_symlink(abs_path, dest_path)
-                else:
-                    dest_path = self.buildpath / rel_path
-                    dest_path.mkdir(mode=abs_path.stat().st_mode)
-
-            # in the future don't go inside ignored directories
-            for pos in reversed(ignored):
-                del dirnames[pos]
-
-            # process the files
-            for name in filenames:
-                rel_path = rel_basedir / name
-                abs_path = abs_basedir / name
-
-                if self.ignore_rules.match(str(rel_path), is_dir=False):
-                    logger.debug("Ignoring file because of rules: %r", str(rel_path))
-                elif abs_path.is_symlink():
-                    dest_path = self.buildpath / rel_path
-                    self.create_symlink(abs_path, dest_path)
-                elif abs_path.is_file():
-                    dest_path = self.buildpath / rel_path
-                    try:
-                        os.link(str(abs_path), str(dest_path))
-                    except PermissionError:
-                        # when not allowed to create hard links
-                        shutil.copy2(str(abs_path), str(dest_path))
-                    except OSError as e:
-                        if e.errno != errno.EXDEV:
-                            raise
-                        shutil.copy2(str(abs_path), str(dest_path))
-                else:
-                    logger.debug("Ignoring file because of type: %r", str(rel_path))
+        buildpath = str(self.buildpath)
+        futures = []
+        initial_files, initial_bytes = self.stager.get_totals()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=LINK_WORKERS) as executor:
+            with self.report.phase("walk") as walk_counts:
+                # directories to walk: relative path, absolute path, and if all inside is kept
+                pending = [("", str(self.charmdir), self.ignore_rules.is_subtree_kept(""))]
+                while pending:
+                    rel_basedir, abs_basedir, all_kept = pending.pop()
+                    to_link = []
+                    with os.scandir(abs_basedir) as direntries:
+                        for entry in direntries:
+                            walk_counts["files"] += 1
+                            if rel_basedir:
+                                rel_path = rel_basedir + "/" + entry.name
+                            else:
+                                rel_path = entry.name
+                            dest_path = os.path.join(buildpath, rel_path)
+
+                            if entry.is_dir():
+                                if not all_kept and self.ignore_rules.match(rel_path, is_dir=True):
+                                    logger.debug(
+                                        "Ignoring directory because of rules: %r", rel_path
+                                    )
+                                    continue
+                                if entry.is_symlink():
+                                    self.create_symlink(
+                                        pathlib.Path(entry.path), pathlib.Path(dest_path)
+                                    )
+                                    continue
+                                stat_result = entry.stat(follow_symlinks=False)
+                                os.mkdir(dest_path, mode=stat_result.st_mode)
+                                if all_kept or self.ignore_rules.is_subtree_kept(rel_path):
+                                    pending.append((rel_path, entry.path, True))
+                                elif self.ignore_rules.is_subtree_ignored(rel_path):
+                                    logger.debug(
+                                        "Ignoring directory content because of rules: %r", rel_path
+                                    )
+                                else:
+                                    pending.append((rel_path, entry.path, False))
+
+                            elif not all_kept and self.ignore_rules.match(rel_path, is_dir=False):
+                                logger.debug("Ignoring file because of rules: %r", rel_path)
+                            elif entry.is_symlink():
+                                self.create_symlink(
+                                    pathlib.Path(entry.path), pathlib.Path(dest_path)
+                                )
+                            elif entry.is_file(follow_symlinks=False):
+                                to_link.append((entry.path, dest_path))
+                            else:
+                                logger.debug("Ignoring file because of type: %r", rel_path)
+
+                    if to_link:
+                        futures.append(executor.submit(self.stager.stage_files, to_link))
+
+            # surface any problem when linking
+            with self.report.phase("link") as link_counts:
+                for future in futures:
+                    future.result()
+                final_files, final_bytes = self.stager.get_totals()
+                link_counts["files"] = final_files - initial_files
+                link_counts["bytes"] = final_bytes - initial_bytes
 
         # the linked entrypoint is calculated here because it's when it's really in the build dir
         linked_entrypoint = self.buildpath / self.entrypoint.relative_to(self.charmdir)
@@ -223,34 +577,407 @@ class CharmBuilder:
 
     def handle_dependencies(self):
         """Handle from-directory and virtualenv dependencies."""
+        installed_dir, cached_dir = self.install_dependencies()
+        self.place_dependencies(installed_dir, cached_dir)
+
+    def install_dependencies(self):
+        """Install the dependencies in the staging virtualenv, if they are not cached.
+
+        Nothing is done in the build directory, so this can run while the charm files are
+        linked there. Return the directory with the installed dependencies (the cached one,
+        if they were already there) and the directory to cache them (None if no cache);
+        both are None if the charm has no dependencies.
+        """
         logger.debug("Installing dependencies")
 
-        if self.requirement_paths or self.python_packages:
-            # create virtualenv using the host environment python
-            staging_venv_dir = self.charmdir / STAGING_VENV_DIRNAME
+        if not (self.requirement_paths or self.python_packages):
+            return None, None
+
+        cached_dir = None
+        if self.cache_dir is not None:
+            dependencies_hash = self._get_dependencies_hash()
+            cached_dir = self.cache_dir / DEPENDENCIES_CACHE_DIRNAME / dependencies_hash
+            if cached_dir.is_dir():
+                logger.debug("Reusing the dependencies cached in %r", str(cached_dir))
+                # record the use, so the most recently used dependencies are kept
+                os.utime(cached_dir)
+                return cached_dir, cached_dir
+
+        # create virtualenv using the host environment python
+        staging_venv_dir = self.charmdir / STAGING_VENV_DIRNAME
+        with self.report.phase("venv"):
             _process_run(["python3", "-m", "venv", str(staging_venv_dir)])
             pip_cmd = str(_find_venv_bin(staging_venv_dir, "pip3"))
 
             _process_run([pip_cmd, "--version"])
 
-            if self.python_packages:
-                # install python packages
-                cmd = [pip_cmd, "install", "--upgrade", "--no-binary", ":all:"]  # base command
-                for pkg in self.python_packages:
-                    cmd.append(pkg)  # the python package to install
-                _process_run(cmd)
+        if self.python_packages:
+            # install python packages
+            with self.report.phase("pip"):
+                self._pip_install(pip_cmd, self.python_packages)
+
+        if self.requirement_paths:
+            # install dependencies from requirement files
+            requirements = ["--requirement={}".format(path) for path in self.requirement_paths]
+            with self.report.phase("pip"):
+                self._pip_install(pip_cmd, requirements)
+
+        basedir = pathlib.Path(STAGING_VENV_DIRNAME)
+        site_packages_dir = _find_venv_site_packages(basedir)
+        if self.cache_dir is not None:
+            _touch_used_wheels(site_packages_dir, self._get_wheelhouse_dir())
+        return site_packages_dir, cached_dir
+
+    def place_dependencies(self, installed_dir, cached_dir):
+        """Put the installed dependencies in the venv directory of the charm."""
+        if installed_dir is None:
+            return
+
+        # copy the virtualvenv site-packages directory to /venv in charm (through the
+        # cache, if any, so next builds with the same dependencies can just link them)
+        venv_dir = self.buildpath / VENV_DIRNAME
+        with self.report.phase("copy", stager=self.stager):
+            if cached_dir is None or installed_dir == cached_dir:
+                self.stager.stage_tree(installed_dir, venv_dir)
+            else:
+                try:
+                    _store_in_cache(self.stager, installed_dir, cached_dir)
+                except OSError as exc:
+                    logger.debug("Cannot cache the dependencies in %r: %r", str(cached_dir), exc)
+                    self.stager.stage_tree(installed_dir, venv_dir)
+                else:
+                    self.stager.stage_tree(cached_dir, venv_dir)
+                    _evict_cached_dependencies(cached_dir.parent)
+
+    def handle_pruning(self):
+        """Remove from the venv what is not needed to run the charm.
+
+        The default rules are used if pruning was requested, plus the rules to remove
+        more, minus the rules to keep some paths anyway (all in .jujuignore format, from
+        the venv root). By default also the debug symbols of shared libraries are removed.
+
+        Return how many paths were removed or stripped, and the bytes saved.
+        """
+        venv_dir = self.buildpath / VENV_DIRNAME
+        if not venv_dir.is_dir():
+            return 0, 0
 
-            if self.requirement_paths:
-                # install dependencies from requirement files
-                cmd = [pip_cmd, "install", "--upgrade", "--no-binary", ":all:"]  # base command
-                for reqspath in self.requirement_paths:
-                    cmd.append("--requirement={}".format(reqspath))  # the dependencies file(s)
-                _process_run(cmd)
+        logger.debug("Pruning the dependencies")
+        remove_patterns = (DEFAULT_PRUNE_RULES if self.prune else []) + self.prune_remove
+        remove_rules = JujuIgnore(remove_patterns)
+        keep_rules = JujuIgnore(self.prune_keep)
+        strip_cmd = shutil.which("strip") if self.prune else None
 
-            # copy the virtualvenv site-packages directory to /venv in charm
-            basedir = pathlib.Path(STAGING_VENV_DIRNAME)
-            site_packages_dir = _find_venv_site_packages(basedir)
-            shutil.copytree(site_packages_dir, self.buildpath / VENV_DIRNAME)
+        removed_count = removed_size = stripped_count = stripped_size = 0
+        pending = [("", str(venv_dir), False)]
+        while pending:
+            rel_dir, abs_dir, removing = pending.pop()
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if keep_rules.match(rel_path, is_dir=is_dir):
+                        continue
+
+                    remove = removing or remove_rules.match(rel_path, is_dir=is_dir)
+                    if is_dir:
+                        if not remove and self.prune and entry.name in PRUNE_DOC_DIRNAMES:
+                            remove = not os.path.exists(os.path.join(entry.path, "__init__.py"))
+                        # note that for the keep rules "kept" means nothing inside matches
+                        if remove and keep_rules.is_subtree_kept(rel_path):
+                            logger.debug("Pruning directory %r", rel_path)
+                            removed_count += 1
+                            removed_size += _get_tree_size(entry.path)
+                            shutil.rmtree(entry.path)
+                        else:
+                            pending.append((rel_path, entry.path, remove))
+                    elif remove:
+                        logger.debug("Pruning file %r", rel_path)
+                        removed_count += 1
+                        removed_size += entry.stat(follow_symlinks=False).st_size
+                        os.unlink(entry.path)
+                    elif strip_cmd and _is_shared_library(entry):
+                        saved = _strip_debug_symbols(strip_cmd, entry.path)
+                        if saved:
+                            stripped_count += 1
+                            stripped_size += saved
+
+        logger.info(
+            "Pruned dependencies: removed %d paths (%d bytes), stripped %d libraries "
+            "(%d bytes); %d bytes saved",
+            removed_count,
+            removed_size,
+            stripped_count,
+            stripped_size,
+            removed_size + stripped_size,
+        )
+        return removed_count + stripped_count, removed_size + stripped_size
+
+    def handle_tree_shaking(self, linked_entrypoint):
+        """Remove from the venv the modules that are never imported by the charm.
+
+        The static import graph is followed from the entrypoint and the charm libraries
+        (and the modules indicated to keep, which are kept completely), looking for the
+        modules where Python would look for them when running the charm.
+
+        Return how many modules were removed, and their size.
+        """
+        venv_dir = self.buildpath / VENV_DIRNAME
+        if not venv_dir.is_dir():
+            return 0, 0
+
+        logger.debug("Finding the modules imported by the charm")
+        lib_dir = self.buildpath / "lib"
+        graph = ImportGraph([linked_entrypoint.parent, lib_dir, venv_dir])
+        graph.add_module(linked_entrypoint.stem)
+        for lib_path in sorted((lib_dir / "charms").glob("**/*.py")):
+            module_parts = lib_path.relative_to(lib_dir).with_suffix("").parts
+            if module_parts[-1] == "__init__":
+                module_parts = module_parts[:-1]
+            graph.add_module(".".join(module_parts))
+        for name in self.tree_shake_keep:
+            graph.add_module(name, keep_all=True)
+        graph.resolve()
+
+        removed = []
+        for name, path in list(find_unreachable(graph, venv_dir)):
+            if os.path.isdir(path):
+                size = _get_tree_size(path)
+                shutil.rmtree(path)
+            else:
+                size = os.stat(path).st_size
+                os.unlink(path)
+                basedir, filename = os.path.split(path)
+                for pyc_path in pathlib.Path(basedir, "__pycache__").glob(
+                    filename[:-3] + ".*.pyc"
+                ):
+                    size += pyc_path.stat().st_size
+                    pyc_path.unlink()
+            removed.append((size, name))
+
+        total = sum(size for size, _ in removed)
+        logger.info("Tree shaking removed %d unused modules (%d bytes)", len(removed), total)
+        for size, name in sorted(removed, reverse=True):
+            logger.info("   %s: %d bytes", name, size)
+        return len(removed), total
+
+    def handle_bytecode(self):
+        """Byte-compile the charm code and its dependencies.
+
+        It's done with the host environment python, which is the one that will run the
+        charm, so the units don't need to compile them in every hook. The bytecode is
+        deterministic: the files are validated by the source's hash (not its timestamp,
+        which is not reliably kept when packing) and they refer to their sources relative
+        to the charm's directory.
+        """
+        output = subprocess.check_output(
+            ["python3", "-c", "import sys; print(sys.version_info >= (3, 7))"], text=True
+        )
+        if output.strip() != "True":
+            logger.warning("Not compiling bytecode: Python 3.7 or newer is needed")
+            return
+
+        logger.debug("Compiling bytecode")
+        env = dict(os.environ, PYTHONHASHSEED="0")
+        for dirname in BYTECODE_DIRNAMES:
+            basedir = self.buildpath / dirname
+            if not basedir.is_dir():
+                continue
+            cmd = [
+                "python3",
+                "-m",
+                "compileall",
+                "-q",
+                "-f",
+                "-j",
+                "0",
+                "--invalidation-mode",
+                "checked-hash",
+                "-d",
+                dirname,
+                str(basedir),
+            ]
+            try:
+                _process_run(cmd, env=env)
+            except CommandError:
+                # the charm works anyway, those files would just be compiled when used
+                logger.warning("Some files in %r could not be compiled", dirname)
+
+    def _get_wheelhouse_dir(self) -> pathlib.Path:
+        """Return the wheelhouse to use: the one indicated (if any) or the one in the cache."""
+        if self.wheelhouse_dir is not None:
+            return self.wheelhouse_dir
+        return self.cache_dir / WHEELHOUSE_DIRNAME
+
+    def _pip_install(self, pip_cmd: str, specs: List[str]) -> None:
+        """Install the packages or requirements, always from wheels built from source.
+
+        Without a cache pip builds everything from source every time. With the cache, what
+        is built is kept in the wheelhouse and installed from there without going to the
+        index at all; only if something is missing there the requirements are resolved in
+        the index and just the distributions without a wheel yet are built from source.
+        """
+        if self.cache_dir is None:
+            cmd = [pip_cmd, "install", "--upgrade", "--no-binary", ":all:"]  # base command
+            _process_run(cmd + specs)
+            return
+
+        wheelhouse = self._get_wheelhouse_dir()
+        wheelhouse.mkdir(parents=True, exist_ok=True)
+        install_cmd = [pip_cmd, "install", "--upgrade", "--no-index", f"--find-links={wheelhouse}"]
+        try:
+            _process_run(install_cmd + specs)
+        except CommandError:
+            logger.debug("Dependencies missing in the wheelhouse, building them from source")
+        else:
+            return
+
+        # built in a temporary directory inside the wheelhouse, and then moved there (which
+        # is atomic), as other builds may be using the same wheelhouse at the same time
+        with tempfile.TemporaryDirectory(prefix=WHEELHOUSE_TMP_PREFIX, dir=wheelhouse) as tmp:
+            sources_dir = pathlib.Path(tmp) / "sources"
+            wheels_dir = pathlib.Path(tmp) / "wheels"
+            download_cmd = [pip_cmd, "download", "--no-binary", ":all:", f"--dest={sources_dir}"]
+            _process_run(download_cmd + specs)
+
+            available = {_get_distribution_key(wheel.name) for wheel in wheelhouse.glob("*.whl")}
+            wheel_cmd = [pip_cmd, "wheel", "--no-deps", "--no-binary", ":all:"]
+            for source in sorted(sources_dir.glob("*")):
+                if _get_distribution_key(source.name) in available:
+                    continue
+                _process_run(wheel_cmd + [f"--wheel-dir={wheels_dir}", str(source)])
+            for wheel in sorted(wheels_dir.glob("*.whl")):
+                os.replace(wheel, wheelhouse / wheel.name)
+
+        _process_run(install_cmd + specs)
+
+    def _get_dependencies_hash(self) -> str:
+        """Return the hash that identifies the installed dependencies in the cache.
+
+        It covers everything that affects what pip installs: the requirement files'
+        content, the packages, the Python interpreter (version and ABI) and the
+        architecture.
+        """
+        requirements = []
+        for reqspath in self.requirement_paths or []:
+            content = pathlib.Path(reqspath).read_bytes()
+            requirements.append(hashlib.sha256(content).hexdigest())
+
+        key = {
+            "requirements": requirements,
+            "packages": self.python_packages or [],
+            "interpreter": _get_interpreter_info(),
+            "machine": platform.machine(),
+        }
+        serialized = json.dumps(key, sort_keys=True).encode("utf8")
+        return hashlib.sha256(serialized).hexdigest()
+
+
+def _normalize_wheel_name(name: str) -> str:
+    """Normalize a project name the way it's used in wheel and dist-info names."""
+    return re.sub(r"[-_.]+", "_", name).lower()
+
+
+def _get_distribution_key(filename: str):
+    """Return the normalized name and the version of a wheel or a source distribution."""
+    if filename.endswith(".whl"):
+        name, version = filename.split("-")[:2]
+    else:
+        for suffix in (".tar.gz", ".tar.bz2", ".tar.xz", ".zip", ".tgz", ".tar"):
+            if filename.endswith(suffix):
+                filename = filename[: -len(suffix)]
+                break
+        name, _, version = filename.rpartition("-")
+    return _normalize_wheel_name(name), version
+
+
+def _touch_used_wheels(site_packages_dir, wheelhouse):
+    """Update the modification time of the wheelhouse wheels that were installed.
+
+    So the wheelhouse can be pruned by when the wheels were last used.
+    """
+    if not wheelhouse.is_dir():
+        return
+    installed = set()
+    for dist_info in site_packages_dir.glob("*.dist-info"):
+        name, _, version = dist_info.name[: -len(".dist-info")].partition("-")
+        installed.add((_normalize_wheel_name(name), version))
+    for wheel in wheelhouse.glob("*.whl"):
+        if _get_distribution_key(wheel.name) in installed:
+            os.utime(wheel)
+
+
+def _get_tree_size(dirpath) -> int:
+    """Return the size of all the files in the directory tree."""
+    total = 0
+    for basedir, _, filenames in os.walk(dirpath):
+        for filename in filenames:
+            total += os.lstat(os.path.join(basedir, filename)).st_size
+    return total
+
+
+def _is_shared_library(entry) -> bool:
+    """Tell if the directory entry is a shared library (e.g. foo.so or libfoo.so.1)."""
+    name = entry.name
+    return (name.endswith(".so") or ".so." in name) and entry.is_file(follow_symlinks=False)
+
+
+def _strip_debug_symbols(strip_cmd, path) -> int:
+    """Remove the debug symbols of the shared library, returning the bytes saved.
+
+    The stripped library is written in a new file, as the original one may be linked
+    from elsewhere (e.g. the dependencies cache).
+    """
+    stripped_path = path + ".stripped"
+    cmd = [strip_cmd, "--strip-debug", "-o", stripped_path, path]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if proc.returncode:
+        logger.debug("Cannot strip library %r", path)
+        if os.path.exists(stripped_path):
+            os.unlink(stripped_path)
+        return 0
+
+    saved = os.stat(path).st_size - os.stat(stripped_path).st_size
+    if saved <= 0:
+        os.unlink(stripped_path)
+        return 0
+    shutil.copymode(path, stripped_path)
+    os.replace(stripped_path, path)
+    return saved
+
+
+def _store_in_cache(stager, src_dir, cached_dir):
+    """Copy the directory into the cache, atomically so it's never seen half written."""
+    cached_dir.parent.mkdir(parents=True, exist_ok=True)
+    temp_dir = cached_dir.with_name(f"{cached_dir.name}.tmp-{os.getpid()}")
+    if temp_dir.exists():
+        shutil.rmtree(str(temp_dir))
+    stager.stage_tree(src_dir, temp_dir)
+    try:
+        os.rename(temp_dir, cached_dir)
+    except OSError:
+        shutil.rmtree(str(temp_dir))
+        if not cached_dir.is_dir():
+            raise
+        # other build cached the same dependencies in the meantime
+
+
+def _evict_cached_dependencies(basedir):
+    """Remove the least recently used dependencies from the cache, keeping the last ones."""
+    cached = []
+    for path in basedir.iterdir():
+        if ".tmp-" in path.name:
+            # being stored by other build
+            continue
+        try:
+            cached.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            # removed by other build in the meantime
+            continue
+    cached.sort(reverse=True)
+    for _, old_path in cached[MAX_CACHED_DEPENDENCIES:]:
+        logger.debug("Removing old dependencies from the cache: %r", str(old_path))
+        shutil.rmtree(str(old_path), ignore_errors=True)
 
 
 def _find_venv_bin(basedir, exec_base):
@@ -275,9 +1002,24 @@ def _find_venv_site_packages(basedir):
     return basedir / "lib" / f"python{major}.{minor}" / "site-packages"
 
 
-def _process_run(cmd: List[str]) -> None:
+def _get_interpreter_info() -> str:
+    """Describe the host environment python, which is the one used for the virtualenv."""
+    return subprocess.check_output(
+        [
+            "python3",
+            "-c",
+            "import sys, sysconfig; "
+            "print(sys.implementation.cache_tag, sysconfig.get_config_var('SOABI'), sys.version)",
+        ],
+        text=True,
+    ).strip()
+
+
+def _process_run(cmd: List[str], env: Dict[str, str] = None) -> None:
     """Run an external command logging its output.
 
+    If an environment is given it's used instead of the current one.
+
     :raises CommandError: if execution crashes or ends with return code not zero.
     """
     logger.debug("Running external command %s", cmd)
@@ -287,6 +1029,7 @@ def _process_run(cmd: List[str]) -> None:
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             universal_newlines=True,
+            env=env,
         )
     except Exception as err:
         raise CommandError(f"Subprocess execution crashed for command {cmd}") from err
@@ -335,6 +1078,66 @@ def _parse_arguments() -> argparse.Namespace:
         default=None,
         help="Requirements file to install dependencies from.",
     )
+    parser.add_argument(
+        "--ignore-stats",
+        action="store_true",
+        help="Report the statistics of the ignore rules.",
+    )
+    parser.add_argument(
+        "--compile-bytecode",
+        action="store_true",
+        help="Byte-compile the charm code and its dependencies.",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Remove from the dependencies what is not needed to run the charm.",
+    )
+    parser.add_argument(
+        "--prune-keep",
+        metavar="pattern",
+        action="append",
+        default=None,
+        help="Path in the dependencies to never prune (.jujuignore format).",
+    )
+    parser.add_argument(
+        "--prune-remove",
+        metavar="pattern",
+        action="append",
+        default=None,
+        help="Path in the dependencies to also prune (.jujuignore format).",
+    )
+    parser.add_argument(
+        "--tree-shake",
+        action="store_true",
+        help="Remove from the dependencies the modules never imported by the charm.",
+    )
+    parser.add_argument(
+        "--tree-shake-keep",
+        metavar="module",
+        action="append",
+        default=None,
+        help="Module (with everything under it) to keep when tree shaking.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="dirname",
+        default=None,
+        help="The directory to cache the installed dependencies between builds.",
+    )
+    parser.add_argument(
+        "--wheelhouse-dir",
+        metavar="dirname",
+        default=None,
+        help="The wheelhouse to use instead of the one in the cache directory.",
+    )
+    parser.add_argument(
+        "--build-report",
+        metavar="filename",
+        default=None,
+        help="Where to write the report of the build phases; defaults to {!r} next to "
+        "the build directory.".format(BUILD_REPORT_FILENAME),
+    )
 
     return parser.parse_args()
 
@@ -353,6 +1156,16 @@ def main():
         entrypoint=pathlib.Path(options.entrypoint),
         python_packages=options.package,
         requirements=options.requirement,
+        ignore_stats=options.ignore_stats,
+        cache_dir=pathlib.Path(options.cache_dir) if options.cache_dir else None,
+        wheelhouse_dir=pathlib.Path(options.wheelhouse_dir) if options.wheelhouse_dir else None,
+        compile_bytecode=options.compile_bytecode,
+        prune=options.prune,
+        prune_keep=options.prune_keep,
+        prune_remove=options.prune_remove,
+        tree_shake=options.tree_shake,
+        tree_shake_keep=options.tree_shake_keep,
+        report_path=pathlib.Path(options.build_report) if options.build_report else None,
     )
     builder.build_charm()
 
@@ -16,23 +16,51 @@
 
 """Infrastructure for the 'build' command."""
 
+import concurrent.futures
+import contextlib
+import hashlib
+import json
 import logging
 import os
 import pathlib
+import shutil
 import subprocess
-import zipfile
+import threading
+import time
 from typing import List, Optional, Tuple
 
-from charmcraft import env, linters, parts
+from humanize import naturalsize
+from tabulate import tabulate
+
+from charmcraft import __version__, env, linters, parts
+from charmcraft.agent import get_agent_client_command, is_build_agent_enabled
 from charmcraft.bases import check_if_base_matches_host
+from charmcraft.buildcache import (
+    BuildCache,
+    CacheStats,
+    get_build_cache_path,
+    get_shared_cache,
+    hash_file,
+    hash_project_tree,
+    is_valid_charm,
+)
+from charmcraft.charm_builder import BUILD_REPORT_FILENAME
 from charmcraft.cmdbase import BaseCommand, CommandError
+from charmcraft.commands.wheelhouse import get_wheelhouse_path
 from charmcraft.config import Base, BasesConfiguration, Config
 from charmcraft.deprecations import notify_deprecation
 from charmcraft.logsetup import message_handler
 from charmcraft.manifest import create_manifest
 from charmcraft.metadata import parse_metadata_yaml
+from charmcraft.package import COMPRESSION_LEVEL, build_zip, get_file_sha256
 from charmcraft.parts import Step
-from charmcraft.providers import capture_logs_from_instance, get_provider
+from charmcraft.providers import (
+    LXDProvider,
+    RemoteScheduler,
+    capture_logs_from_instance,
+    get_lxd_remotes,
+    get_provider,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +68,11 @@ logger = logging.getLogger(__name__)
 BUILD_DIRNAME = "build"
 VENV_DIRNAME = "venv"
 
+# The build report and log of each charm packed in an instance, left in the project's
+# build directory (so they are written straight in the host if the project is mounted)
+INSTANCE_BUILD_REPORT_TEMPLATE = "{}.build-report.json"
+INSTANCE_LOG_TEMPLATE = "{}.log"
+
 # The file name and template for the dispatch script
 DISPATCH_FILENAME = "dispatch"
 # If Juju doesn't support the dispatch mechanism, it will execute the
@@ -55,6 +88,10 @@ JUJU_DISPATCH_PATH="${{JUJU_DISPATCH_PATH:-$0}}" PYTHONPATH=lib:venv ./{entrypoi
 MANDATORY_HOOK_NAMES = {"install", "start", "upgrade-charm"}
 HOOKS_DIR = "hooks"
 
+# The memory an instance is expected to need when packing, to decide how many of them
+# can be run at the same time
+INSTANCE_MEMORY = 2 * 1024 ** 3
+
 CHARM_FILES = [
     "metadata.yaml",
     DISPATCH_FILENAME,
@@ -117,6 +154,71 @@ def relativise(src, dst):
     return pathlib.Path(os.path.relpath(str(dst), str(src.parent)))
 
 
+def _get_available_memory() -> Optional[int]:
+    """Return the memory available in the host, None if it can not be known."""
+    try:
+        with open("/proc/meminfo", "rt", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def get_concurrent_jobs(requested: int, builds: int) -> int:
+    """Return how many instances to pack in at the same time.
+
+    It's what was requested, limited by the builds to do and by the host's CPUs and
+    available memory (but always at least one).
+    """
+    limits = [requested, builds, os.cpu_count() or 1]
+    memory = _get_available_memory()
+    if memory is not None:
+        limits.append(memory // INSTANCE_MEMORY)
+    jobs = max(1, min(limits))
+    if jobs < min(requested, builds):
+        logger.debug("Limiting concurrent jobs to %d because of host resources.", jobs)
+    return jobs
+
+
+def _execute_with_prefixed_output(instance, cmd, *, cwd, env=None, prefix):
+    """Run the command in the instance, logging each line of its output with the prefix.
+
+    :raises subprocess.CalledProcessError: if the command ends with return code not zero.
+    """
+    proc = instance.execute_popen(
+        cmd,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True,
+    )
+    for line in proc.stdout:
+        logger.info("%s %s", prefix, line.rstrip())
+    retcode = proc.wait()
+    if retcode:
+        raise subprocess.CalledProcessError(retcode, cmd)
+
+
+def _collect_charms(futures) -> List[str]:
+    """Return the charms packed in each future, in order.
+
+    All the futures are waited for, and all the problems reported together.
+    """
+    charms = []
+    errors = []
+    for future in futures:
+        try:
+            charms.append(future.result())
+        except CommandError as error:
+            errors.append(str(error))
+    if errors:
+        raise CommandError("\n".join(errors))
+    return charms
+
+
 class Builder:
     """The package builder."""
 
@@ -128,6 +230,13 @@ class Builder:
         self.debug = args["debug"]
         self.shell = args["shell"]
         self.shell_after = args["shell_after"]
+        self.jobs = args["jobs"]
+        self.compression_level = args["compression_level"]
+        self.no_cache = args["no_cache"]
+        self.ignore_stats = args["ignore_stats"]
+
+        # if set, the charms packed here are pushed to the Store while being packed
+        self.uploads = None
 
         self.buildpath = self.charmdir / BUILD_DIRNAME
         self.config = config
@@ -137,6 +246,78 @@ class Builder:
         self._charm_part = self._parts.setdefault("charm", {})
         self._prime = self._charm_part.setdefault("prime", [])
         self.provider = get_provider()
+        self._instance_logs_lock = threading.Lock()
+
+    def get_project_key(self) -> str:
+        """Return the key of what is common to the charm's builds for all the bases.
+
+        It changes with everything that may produce a different charm (except the bases):
+        the project sources, the requirement files, the relevant configuration and options,
+        and Charmcraft itself. As it hashes all the sources, get it once for all the bases.
+        """
+        inputs = {
+            "charmcraft-version": __version__,
+            "sources": hash_project_tree(self.charmdir),
+            "requirements": [
+                (str(path), hash_file(pathlib.Path(path))) for path in self.requirement_paths
+            ],
+            "entrypoint": str(self.entrypoint),
+            "parts": self.config.parts,
+            "analysis": self.config.analysis.dict(),
+            "force": self.force_packing,
+            "compression-level": self.compression_level,
+            "source-date-epoch": os.getenv("SOURCE_DATE_EPOCH"),
+        }
+        serialized = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf8")).hexdigest()
+
+    def get_build_key(
+        self, bases_config: BasesConfiguration, project_key: Optional[str] = None
+    ) -> str:
+        """Return the key of the charm's build for the bases configuration in the cache.
+
+        It's the project key (calculated if not given) combined with the bases.
+        """
+        if project_key is None:
+            project_key = self.get_project_key()
+        inputs = {"project": project_key, "bases": bases_config.dict()}
+        serialized = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf8")).hexdigest()
+
+    def show_build_report(self, report_path, build_started):
+        """Show the phases of the charm build, if it was built (not reused) in this run.
+
+        The report is written by the charm builder next to its build directory, or in
+        the project's build directory when packing in a managed environment (it's shown
+        from inside the instance, and also left in the host if the project is mounted).
+        """
+        try:
+            if report_path.stat().st_mtime < build_started:
+                logger.debug("The charm build was reused, no build report to show")
+                return
+            with report_path.open("rt", encoding="utf8") as fh:
+                report = json.load(fh)
+            data = [
+                (
+                    phase["name"],
+                    "{:.3f}s".format(phase["wall_time"]),
+                    "{:.3f}s".format(phase["cpu_time"]),
+                    phase["files"],
+                    naturalsize(phase["bytes"]),
+                )
+                for phase in report["phases"]
+            ]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug("Cannot read the charm build report %r: %r", str(report_path), exc)
+            return
+
+        headers = ["Phase", "Wall time", "CPU time", "Files", "Size"]
+        logger.debug("Charm build phases (report in %r):", str(report_path))
+        table = tabulate(data, headers=headers, tablefmt="plain", numalign="left")
+        for line in table.splitlines():
+            logger.debug(line)
 
     def show_linting_results(self, linting_results):
         """Manage the linters results, show some in different conditions, decide if continue."""
@@ -192,8 +373,13 @@ class Builder:
 
         if env.is_charmcraft_running_in_managed_mode():
             work_dir = env.get_managed_environment_home_path()
+            # the parts are not in the project, so the report is left in its build directory
+            charm_name = format_charm_file_name(self.metadata.name, bases_config)
+            report_path = self.buildpath / INSTANCE_BUILD_REPORT_TEMPLATE.format(charm_name)
+            self._charm_part["charm-build-report"] = str(report_path)
         else:
             work_dir = self.buildpath
+            report_path = None
 
         logger.debug("Building charm in %r", str(work_dir))
 
@@ -203,6 +389,13 @@ class Builder:
         # set source for buiding
         self._charm_part["source"] = str(self.charmdir)
 
+        # nothing from previous builds is reused if requested
+        if self.no_cache:
+            self._charm_part["charm-dependencies-cache"] = False
+
+        if self.ignore_stats:
+            self._charm_part["charm-ignore-stats"] = True
+
         # run the parts lifecycle
         logger.debug("Parts definition: %s", self._parts)
         lifecycle = parts.PartsLifecycle(
@@ -211,7 +404,11 @@ class Builder:
             project_dir=self.charmdir,
             ignore_local_sources=["*.charm"],
         )
+        build_started = time.time()
         lifecycle.run(Step.PRIME)
+        if report_path is None:
+            report_path = lifecycle.parts_dir / "charm" / BUILD_REPORT_FILENAME
+        self.show_build_report(report_path, build_started)
 
         # run linters and show the results
         linting_results = linters.analyze(self.config, lifecycle.prime_dir)
@@ -226,6 +423,7 @@ class Builder:
 
         zipname = self.handle_package(lifecycle.prime_dir, bases_config)
         logger.info("Created '%s'.", zipname)
+        logger.info("SHA-256 of %r: %s", zipname, get_file_sha256(zipname))
         return zipname
 
     def _handle_deprecated_cli_arguments(self):
@@ -379,6 +577,126 @@ class Builder:
                 "No suitable 'build-on' environment found in any 'bases' configuration."
             )
 
+        # the build cache is used from the host (so the instances are not even launched),
+        # and never for interactive builds
+        if managed_mode or self.debug or self.shell or self.shell_after:
+            return self.pack_planned(build_plan, managed_mode, destructive_mode)
+
+        cache = BuildCache(get_build_cache_path())
+        shared_cache = get_shared_cache()
+        stats = CacheStats()
+        cache_keys = []
+        charms = [None] * len(build_plan)
+        project_key = self.get_project_key()
+        for idx, (bases_config, _, bases_index, _) in enumerate(build_plan):
+            charm_name = format_charm_file_name(self.metadata.name, bases_config)
+            key = self.get_build_key(bases_config, project_key)
+            cache_keys.append((charm_name, key))
+            if self.no_cache:
+                continue
+            origin = self._get_from_caches(cache, shared_cache, stats, charm_name, key)
+            if origin is not None:
+                logger.info(
+                    "Reusing %r from the %s, nothing changed for bases index '%d' "
+                    "(use --no-cache to build it anyway).",
+                    charm_name,
+                    origin,
+                    bases_index,
+                )
+                charms[idx] = charm_name
+
+        pending = [idx for idx, charm in enumerate(charms) if charm is None]
+        if pending:
+            packed = self.pack_planned(
+                [build_plan[idx] for idx in pending], managed_mode, destructive_mode
+            )
+            for idx, charm in zip(pending, packed):
+                charm_name, key = cache_keys[idx]
+                stats.built += 1
+                cache.put(charm_name, key, pathlib.Path(charm))
+                if shared_cache is not None:
+                    try:
+                        shared_cache.store(key, pathlib.Path(charm))
+                        stats.shared_stored += 1
+                    except OSError as exc:
+                        stats.shared_errors += 1
+                        logger.warning("Cannot store in the shared build cache: %s", exc)
+                charms[idx] = charm
+
+        if shared_cache is None:
+            logger.info("Build cache: %d reused, %d built.", stats.local_hits, stats.built)
+        else:
+            logger.info(
+                "Build cache: %d reused locally, %d reused from %s, %d built (%d shared, "
+                "%d errors).",
+                stats.local_hits,
+                stats.shared_hits,
+                shared_cache,
+                stats.built,
+                stats.shared_stored,
+                stats.shared_errors,
+            )
+        return charms
+
+    def _get_from_caches(self, cache, shared_cache, stats, charm_name, key) -> Optional[str]:
+        """Put in place the charm built with the key, from the local or shared caches.
+
+        :returns: Where the charm was found, None if in no cache.
+        """
+        temp_path = pathlib.Path(charm_name + ".partial")
+        cached_path = cache.get(charm_name, key)
+        if cached_path is not None:
+            shutil.copyfile(cached_path, temp_path)
+            os.replace(temp_path, charm_name)
+            stats.local_hits += 1
+            return "build cache"
+
+        if shared_cache is None:
+            return None
+        try:
+            found = shared_cache.fetch(key, temp_path)
+        except OSError as exc:
+            stats.shared_errors += 1
+            logger.warning("Cannot get from the shared build cache: %s", exc)
+            found = False
+        if found and not is_valid_charm(temp_path):
+            logger.warning("Ignoring broken charm %r from the shared build cache.", key)
+            found = False
+        if not found:
+            with contextlib.suppress(FileNotFoundError):
+                temp_path.unlink()
+            return None
+        os.replace(temp_path, charm_name)
+        cache.put(charm_name, key, pathlib.Path(charm_name))
+        stats.shared_hits += 1
+        return "shared build cache"
+
+    def pack_planned(
+        self,
+        build_plan: List[Tuple[BasesConfiguration, Base, int, int]],
+        managed_mode: bool,
+        destructive_mode: bool,
+    ) -> List[str]:
+        """Pack the charm for all the planned bases, here or in instances as corresponds.
+
+        :returns: List of charm files created, in the order of the build plan.
+        """
+        if not (managed_mode or destructive_mode) and isinstance(self.provider, LXDProvider):
+            remotes = get_lxd_remotes()
+            if remotes and (self.debug or self.shell or self.shell_after):
+                logger.debug("Not using LXD remotes as the build needs to be interactive.")
+            elif remotes:
+                return self.pack_charms_in_remotes(build_plan, remotes)
+
+        if self.jobs > 1 and not (managed_mode or destructive_mode):
+            if self.debug or self.shell or self.shell_after:
+                raise CommandError(
+                    "The --jobs option can not be used with --debug, --shell or --shell-after."
+                )
+            jobs = get_concurrent_jobs(self.jobs, len(build_plan))
+            if jobs > 1:
+                return self.pack_charms_concurrently(build_plan, jobs)
+
         charms = []
         for bases_config, build_on, bases_index, build_on_index in build_plan:
             logger.debug("Building for 'bases[%d][%d]'.", bases_index, build_on_index)
@@ -408,25 +726,145 @@ class Builder:
 
         return charms
 
+    def pack_charms_concurrently(
+        self, build_plan: List[Tuple[BasesConfiguration, Base, int, int]], jobs: int
+    ) -> List[str]:
+        """Pack the charm for all the planned bases at the same time, each in its instance.
+
+        The output of each instance is logged prefixed with its bases index. All the packs
+        are done even if some fail, to report all the problems together at the end.
+
+        :returns: List of charm files created, in the order of the build plan.
+        """
+        logger.debug("Packing for %d bases in up to %d instances.", len(build_plan), jobs)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(
+                    self.pack_charm_in_instance,
+                    bases_index=bases_index,
+                    build_on=build_on,
+                    build_on_index=build_on_index,
+                    output_prefix=f"[bases {bases_index}]",
+                )
+                for _, build_on, bases_index, build_on_index in build_plan
+            ]
+        return _collect_charms(futures)
+
+    def pack_charms_in_remotes(
+        self, build_plan: List[Tuple[BasesConfiguration, Base, int, int]], remotes
+    ) -> List[str]:
+        """Pack the charm for all the planned bases, distributing them in the LXD remotes.
+
+        Each build goes to the least loaded remote (waiting if all of them are at full
+        capacity), where the project is transferred into the instance and the charm is
+        retrieved from it. If packing in a remote fails, it's done locally instead (with
+        as many local instances at the same time as the --jobs option allows).
+
+        :returns: List of charm files created, in the order of the build plan.
+        """
+        scheduler = RemoteScheduler(remotes)
+        local_slots = threading.Semaphore(get_concurrent_jobs(self.jobs, len(build_plan)))
+
+        def _pack(build_on, bases_index, build_on_index):
+            with scheduler.reserved() as remote:
+                try:
+                    return self.pack_charm_in_instance(
+                        bases_index=bases_index,
+                        build_on=build_on,
+                        build_on_index=build_on_index,
+                        output_prefix=f"[bases {bases_index} @ {remote.name}]",
+                        provider=LXDProvider(
+                            lxd_project=self.provider.lxd_project,
+                            lxd_remote=remote.name,
+                            keep_alive=self.provider.keep_alive,
+                        ),
+                    )
+                except CommandError as error:
+                    logger.warning(
+                        "Packing for bases index '%d' in LXD remote %r failed, "
+                        "packing locally: %s",
+                        bases_index,
+                        remote.name,
+                        error,
+                    )
+            with local_slots:
+                return self.pack_charm_in_instance(
+                    bases_index=bases_index,
+                    build_on=build_on,
+                    build_on_index=build_on_index,
+                    output_prefix=f"[bases {bases_index}]",
+                )
+
+        total_capacity = sum(remote.capacity for remote in remotes)
+        logger.debug("Packing for %d bases in %d LXD remotes.", len(build_plan), len(remotes))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=total_capacity) as executor:
+            futures = [
+                executor.submit(_pack, build_on, bases_index, build_on_index)
+                for _, build_on, bases_index, build_on_index in build_plan
+            ]
+        return _collect_charms(futures)
+
     def pack_charm_in_instance(
-        self, *, bases_index: int, build_on: Base, build_on_index: int
+        self,
+        *,
+        bases_index: int,
+        build_on: Base,
+        build_on_index: int,
+        output_prefix: Optional[str] = None,
+        provider=None,
     ) -> str:
-        """Pack instance in Charm."""
+        """Pack instance in Charm.
+
+        If an output prefix is given, the output of the instance is logged line by line
+        with it (instead of going straight to the terminal). The instance is launched with
+        the given provider, or the default one.
+        """
+        if provider is None:
+            provider = self.provider
         charm_name = format_charm_file_name(self.metadata.name, self.config.bases[bases_index])
 
         # If building in project directory, use the project path as the working
         # directory. The output charms will be placed in the correct directory
         # without needing retrieval. If outputing to a directory other than the
-        # charm project directory, we need to output the charm outside the
-        # project directory and can retrieve it when complete.
+        # charm project directory, that directory is also mounted in the instance
+        # so the charms are placed there directly. Only if the project is not
+        # mounted in the instance (so neither the output directory can be) we need
+        # to output the charm in the instance and retrieve it when complete.
         cwd = pathlib.Path.cwd()
-        if cwd == self.charmdir:
+        if cwd == self.charmdir and provider.mounts_project:
             instance_output_dir = env.get_managed_environment_project_path()
+            output_path = None
+            pull_charm = False
+        elif provider.mounts_project:
+            instance_output_dir = env.get_managed_environment_output_path()
+            output_path = cwd
             pull_charm = False
         else:
             instance_output_dir = env.get_managed_environment_home_path()
+            output_path = None
             pull_charm = True
 
+        # The log of the pack (as the build report) is left in the project's build
+        # directory, so it's written straight in the host if the project is mounted.
+        if provider.mounts_project:
+            self.buildpath.mkdir(exist_ok=True)
+            host_log_path = self.buildpath / INSTANCE_LOG_TEMPLATE.format(charm_name)
+            instance_log_path = (
+                env.get_managed_environment_project_path() / BUILD_DIRNAME / host_log_path.name
+            )
+            cmd_env = {"CHARMCRAFT_MANAGED_LOG_PATH": str(instance_log_path)}
+        else:
+            host_log_path = None
+            cmd_env = None
+
+        # The host's wheelhouse is also mounted (if possible) so the wheels built from source
+        # are shared by all the instances; not when asked to not use caches.
+        if provider.mounts_project and not self.no_cache:
+            wheelhouse_path = get_wheelhouse_path()
+            wheelhouse_path.mkdir(parents=True, exist_ok=True)
+        else:
+            wheelhouse_path = None
+
         cmd = ["charmcraft", "pack", "--bases-index", str(bases_index)]
 
         if message_handler.mode == message_handler.VERBOSE:
@@ -443,22 +881,45 @@ class Builder:
         if self.shell_after:
             cmd.append("--shell-after")
 
+        if self.compression_level != COMPRESSION_LEVEL:
+            cmd.extend(["--compression-level", str(self.compression_level)])
+
+        if self.no_cache:
+            cmd.append("--no-cache")
+
+        if self.ignore_stats:
+            cmd.append("--ignore-stats")
+
+        if not (self.debug or self.shell or self.shell_after) and is_build_agent_enabled():
+            # request the pack to the agent running in the instance (started if needed),
+            # which keeps everything loaded between packs; never for interactive builds
+            cmd = get_agent_client_command(cmd)
+
         logger.info(f"Packing charm {charm_name!r}...")
-        with self.provider.launched_environment(
+        with provider.launched_environment(
             charm_name=self.metadata.name,
             project_path=self.charmdir,
             base=build_on,
             bases_index=bases_index,
             build_on_index=build_on_index,
+            output_path=output_path,
+            wheelhouse_path=wheelhouse_path,
         ) as instance:
             try:
-                instance.execute_run(
-                    cmd,
-                    check=True,
-                    cwd=instance_output_dir,
-                )
+                if output_prefix is None:
+                    instance.execute_run(
+                        cmd,
+                        check=True,
+                        cwd=instance_output_dir,
+                        env=cmd_env,
+                    )
+                else:
+                    _execute_with_prefixed_output(
+                        instance, cmd, cwd=instance_output_dir, env=cmd_env, prefix=output_prefix
+                    )
             except subprocess.CalledProcessError as error:
-                capture_logs_from_instance(instance)
+                with self._instance_logs_lock:
+                    capture_logs_from_instance(instance, host_log_path=host_log_path)
                 raise CommandError(
                     f"Failed to build charm for bases index '{bases_index}'."
                 ) from error
@@ -480,14 +941,17 @@ class Builder:
         """Handle the final package creation."""
         logger.debug("Creating the package itself")
         zipname = format_charm_file_name(self.metadata.name, bases_config)
-        zipfh = zipfile.ZipFile(zipname, "w", zipfile.ZIP_DEFLATED)
-        for dirpath, dirnames, filenames in os.walk(prime_dir, followlinks=True):
-            dirpath = pathlib.Path(dirpath)
-            for filename in filenames:
-                filepath = dirpath / filename
-                zipfh.write(str(filepath), str(filepath.relative_to(prime_dir)))
-
-        zipfh.close()
+        if self.uploads is None:
+            build_zip(zipname, prime_dir, self.compression_level)
+        else:
+            with self.uploads.stream(zipname) as upload:
+                build_zip(
+                    zipname,
+                    prime_dir,
+                    self.compression_level,
+                    inspector=upload.inspector,
+                    stream=upload,
+                )
         return zipname
 
 
@@ -504,6 +968,10 @@ class Validator:
         "debug",
         "shell",
         "shell_after",
+        "jobs",
+        "compression_level",
+        "no_cache",
+        "ignore_stats",
     ]
 
     def __init__(self, config: Config):
@@ -608,6 +1076,32 @@ class Validator:
         """Validate the value (just convert to bool to make None explicit)."""
         return bool(value)
 
+    def validate_no_cache(self, value):
+        """Validate the value (just convert to bool to make None explicit)."""
+        return bool(value)
+
+    def validate_ignore_stats(self, value):
+        """Validate the value (just convert to bool to make None explicit)."""
+        return bool(value)
+
+    def validate_jobs(self, jobs):
+        """Validate the number of concurrent jobs (just one if not specified)."""
+        if jobs is None:
+            return 1
+        if jobs < 1:
+            raise CommandError(f"The number of jobs '{jobs}' is invalid (must be >= 1).")
+        return jobs
+
+    def validate_compression_level(self, compression_level):
+        """Validate the compression level of the package (the default if not specified)."""
+        if compression_level is None:
+            return COMPRESSION_LEVEL
+        if not 0 <= compression_level <= 9:
+            raise CommandError(
+                f"The compression level '{compression_level}' is invalid (must be 0 to 9)."
+            )
+        return compression_level
+
 
 _overview = """
 Build a charm operator package.
@@ -20,14 +20,15 @@ import logging
 
 from charmcraft.cmdbase import BaseCommand
 from charmcraft.metadata import parse_metadata_yaml
-from charmcraft.providers import get_provider
+from charmcraft.providers import LXDProvider, get_lxd_remotes, get_provider
 
 logger = logging.getLogger(__name__)
 
 _overview = """
 Purge Charmcraft project's artifacts, including:
 
-- LXD Containers created for building charm(s)
+- LXD Containers created for building charm(s), also those in the
+  configured LXD remotes
 """
 
 
@@ -47,4 +48,14 @@ class CleanCommand(BaseCommand):
 
         provider = get_provider()
         provider.clean_project_environments(charm_name=metadata.name, project_path=project_path)
+        if isinstance(provider, LXDProvider):
+            # the builds may have been distributed in the remotes too
+            for remote in get_lxd_remotes():
+                logger.debug("Cleaning project %r in LXD remote %r.", metadata.name, remote.name)
+                remote_provider = LXDProvider(
+                    lxd_project=provider.lxd_project, lxd_remote=remote.name
+                )
+                remote_provider.clean_project_environments(
+                    charm_name=metadata.name, project_path=project_path
+                )
         logger.info("Cleaned project %r.", metadata.name)
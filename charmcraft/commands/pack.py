@@ -17,16 +17,16 @@
 """Infrastructure for the 'pack' command."""
 
 import logging
-import os
 import pathlib
-import zipfile
 from argparse import Namespace
-from typing import List
+from typing import List, Optional
 
 from charmcraft import parts
 from charmcraft.cmdbase import BaseCommand, CommandError
 from charmcraft.commands import build
+from charmcraft.commands.store import StreamedUploads
 from charmcraft.manifest import create_manifest
+from charmcraft.package import COMPRESSION_LEVEL, build_zip, get_file_sha256
 from charmcraft.parts import Step
 from charmcraft.utils import SingleOptionEnsurer, load_yaml, useful_filepath
 
@@ -36,23 +36,12 @@ logger = logging.getLogger(__name__)
 MANDATORY_FILES = {"bundle.yaml", "README.md"}
 
 
-def build_zip(zippath, prime_dir):
-    """Build the final file."""
-    zipfh = zipfile.ZipFile(zippath, "w", zipfile.ZIP_DEFLATED)
-    for dirpath, dirnames, filenames in os.walk(prime_dir, followlinks=True):
-        dirpath = pathlib.Path(dirpath)
-        for filename in filenames:
-            filepath = dirpath / filename
-            zipfh.write(str(filepath), str(filepath.relative_to(prime_dir)))
-
-    zipfh.close()
-
-
 _overview = """
 Build and pack a charm operator package or a bundle.
 
 You can `juju deploy` the resulting `.charm` or bundle's `.zip`
-file directly, or upload it to Charmhub with `charmcraft upload`.
+file directly, or upload it to Charmhub with `charmcraft upload`
+(or directly when packing, using `--upload`).
 
 For the charm you must be inside a charm directory with a valid
 `metadata.yaml`, `requirements.txt` including the `ops` package
@@ -132,12 +121,55 @@ class PackCommand(BaseCommand):
             action="store_true",
             help="Force packing even after finding lint errors",
         )
+        parser.add_argument(
+            "--jobs",
+            type=int,
+            metavar="N",
+            help="Pack for up to N bases at the same time, each in its own instance; "
+            "defaults to 1",
+        )
+        parser.add_argument(
+            "--no-cache",
+            action="store_true",
+            help="Build the charm even if nothing changed since it was built before",
+        )
+        parser.add_argument(
+            "--ignore-stats",
+            action="store_true",
+            help="Report how much time each ignore rule took and which ones never matched "
+            "(makes the packing slower)",
+        )
+        parser.add_argument(
+            "--compression-level",
+            type=int,
+            metavar="LEVEL",
+            help="Compression level of the package, from 0 (none) to 9 (best); "
+            "defaults to {}".format(COMPRESSION_LEVEL),
+        )
+        parser.add_argument(
+            "--upload",
+            action="store_true",
+            help="Upload the packed charm(s) or bundle to Charmhub (those packed in this "
+            "host are pushed while being packed)",
+        )
+        parser.add_argument(
+            "--release",
+            action="append",
+            help="The channel(s) to release the uploaded revisions to (this option can be "
+            "indicated multiple times)",
+        )
 
     def run(self, parsed_args):
         """Run the command."""
+        if parsed_args.release and not parsed_args.upload:
+            raise CommandError("The --release option can only be used with --upload.")
+
+        # the packages packed here are pushed to the Store while being packed
+        uploads = StreamedUploads(self.config.charmhub) if parsed_args.upload else None
+
         # decide if this will work on a charm or a bundle
         if self.config.type == "charm" or not self.config.project.config_provided:
-            self._pack_charm(parsed_args)
+            packages = self._pack_charm(parsed_args, uploads)
         elif self.config.type == "bundle":
             if parsed_args.entrypoint is not None:
                 raise CommandError("The -e/--entry option is valid only when packing a charm")
@@ -145,11 +177,19 @@ class PackCommand(BaseCommand):
                 raise CommandError(
                     "The -r/--requirement option is valid only when packing a charm"
                 )
-            self._pack_bundle(parsed_args)
+            packages = self._pack_bundle(parsed_args, uploads)
         else:
             raise CommandError("Unknown type {!r} in charmcraft.yaml".format(self.config.type))
 
-    def _pack_charm(self, parsed_args) -> List[pathlib.Path]:
+        if uploads is not None:
+            uploaded = [uploads.upload(package, parsed_args.release) for package in packages]
+            if not all(uploaded):
+                return 1
+        return 0
+
+    def _pack_charm(
+        self, parsed_args, uploads: Optional[StreamedUploads] = None
+    ) -> List[pathlib.Path]:
         """Pack a charm."""
         # adapt arguments to use the build infrastructure
         build_args = Namespace(
@@ -163,6 +203,10 @@ class PackCommand(BaseCommand):
                 "shell_after": parsed_args.shell_after,
                 "bases_indices": parsed_args.bases_index,
                 "force": parsed_args.force,
+                "jobs": parsed_args.jobs,
+                "compression_level": parsed_args.compression_level,
+                "no_cache": parsed_args.no_cache,
+                "ignore_stats": parsed_args.ignore_stats,
             }
         )
 
@@ -171,16 +215,22 @@ class PackCommand(BaseCommand):
         args = validator.process(build_args)
         logger.debug("Working arguments: %s", args)
         builder = build.Builder(args, self.config)
+        builder.uploads = uploads
         charms = builder.run(parsed_args.bases_index, destructive_mode=build_args.destructive_mode)
 
         return [pathlib.Path(c).absolute() for c in charms]
 
-    def _pack_bundle(self, parsed_args) -> List[pathlib.Path]:
+    def _pack_bundle(
+        self, parsed_args, uploads: Optional[StreamedUploads] = None
+    ) -> List[pathlib.Path]:
         """Pack a bundle."""
         if parsed_args.shell:
             build.launch_shell()
             return []
 
+        validator = build.Validator(self.config)
+        compression_level = validator.validate_compression_level(parsed_args.compression_level)
+
         project = self.config.project
         config_parts = self.config.parts.copy()
         bundle_part = config_parts.setdefault("bundle", {})
@@ -229,9 +279,20 @@ class PackCommand(BaseCommand):
         # pack everything
         create_manifest(lifecycle.prime_dir, project.started_at, None, [])
         zipname = project.dirpath / (bundle_name + ".zip")
-        build_zip(zipname, lifecycle.prime_dir)
+        if uploads is None:
+            build_zip(zipname, lifecycle.prime_dir, compression_level)
+        else:
+            with uploads.stream(zipname) as upload:
+                build_zip(
+                    zipname,
+                    lifecycle.prime_dir,
+                    compression_level,
+                    inspector=upload.inspector,
+                    stream=upload,
+                )
 
         logger.info("Created %r.", str(zipname))
+        logger.info("SHA-256 of %r: %s", zipname.name, get_file_sha256(zipname))
 
         if parsed_args.shell_after:
             build.launch_shell()
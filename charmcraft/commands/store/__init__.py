@@ -20,9 +20,11 @@ import ast
 import hashlib
 import logging
 import pathlib
+import queue
 import string
 import tempfile
 import textwrap
+import threading
 import zipfile
 from collections import namedtuple
 from operator import attrgetter
@@ -57,6 +59,13 @@ LibData = namedtuple(
 # The token used in the 'init' command (as bytes for easier comparison)
 INIT_TEMPLATE_TOKEN = b"TEMPLATE-TODO"
 
+# how many chunks of a package being packed may wait to be pushed to the Storage
+_STREAM_QUEUE_SIZE = 64
+
+# put in the chunks queue to signal the package is complete, or that packing failed
+_STREAM_END = object()
+_STREAM_ABORT = object()
+
 
 def get_name_from_metadata():
     """Return the name if present and plausible in metadata.yaml."""
@@ -295,26 +304,29 @@ class ListNamesCommand(BaseCommand):
             logger.info(line)
 
 
-def get_name_from_zip(filepath):
-    """Get the charm/bundle name from a zip file."""
+def _open_zip(filepath):
+    """Open the charm/bundle zip file."""
     try:
-        zf = zipfile.ZipFile(str(filepath))
+        return zipfile.ZipFile(str(filepath))
     except zipfile.BadZipFile:
         raise CommandError("Cannot open {!r} (bad zip file).".format(str(filepath)))
 
+
+def _get_name_from_yaml(filepath, metadata, bundle):
+    """Get the charm/bundle name from the content of its metadata.yaml or bundle.yaml."""
     # get the name from the given file (trying first if it's a charm, then a bundle,
     # otherwise it's an error)
-    if "metadata.yaml" in zf.namelist():
+    if metadata is not None:
         try:
-            name = yaml.safe_load(zf.read("metadata.yaml"))["name"]
+            name = yaml.safe_load(metadata)["name"]
         except Exception:
             raise CommandError(
                 "Bad 'metadata.yaml' file inside charm zip {!r}: must be a valid YAML with "
                 "a 'name' key.".format(str(filepath))
             )
-    elif "bundle.yaml" in zf.namelist():
+    elif bundle is not None:
         try:
-            name = yaml.safe_load(zf.read("bundle.yaml"))["name"]
+            name = yaml.safe_load(bundle)["name"]
         except Exception:
             raise CommandError(
                 "Bad 'bundle.yaml' file inside bundle zip {!r}: must be a valid YAML with "
@@ -329,6 +341,203 @@ def get_name_from_zip(filepath):
     return name
 
 
+def get_name_from_zip(filepath):
+    """Get the charm/bundle name from a zip file."""
+    with _open_zip(filepath) as zf:
+        namelist = zf.namelist()
+        metadata = zf.read("metadata.yaml") if "metadata.yaml" in namelist else None
+        bundle = zf.read("bundle.yaml") if "bundle.yaml" in namelist else None
+    return _get_name_from_yaml(filepath, metadata, bundle)
+
+
+class PackageInspector:
+    """Inspect a charm/bundle file by file, to get its name and verify it's ready to be uploaded.
+
+    The package must not have any file with the 'init' template TODO marker, to avoid
+    uploading low-quality charms that are just bootstrapped and not corrected.
+
+    The files can be fed while the package is read, or while it's being packed.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._yamls = {}
+        self._tainted_filenames = []
+
+    def __call__(self, filename, content):
+        """Inspect a file of the package."""
+        if INIT_TEMPLATE_TOKEN in content:
+            self._tainted_filenames.append(filename)
+        if filename in ("metadata.yaml", "bundle.yaml"):
+            self._yamls[filename] = content
+
+    def get_name(self):
+        """Return the charm/bundle name, after all its files were inspected."""
+        name = _get_name_from_yaml(
+            self.filepath, self._yamls.get("metadata.yaml"), self._yamls.get("bundle.yaml")
+        )
+        if self._tainted_filenames:
+            raise CommandError(
+                "Cannot upload the charm as it include the following files with a leftover "
+                "TEMPLATE-TODO token from when the project was created using the 'init' "
+                "command: {}".format(", ".join(self._tainted_filenames))
+            )
+        return name
+
+
+def inspect_package(filepath):
+    """Get the name from a charm/bundle zip file, verifying it's ready to be uploaded.
+
+    Everything is checked in a single pass, reading each file in the zip only once.
+    """
+    inspector = PackageInspector(filepath)
+    with _open_zip(filepath) as zf:
+        for info in zf.infolist():
+            inspector(info.filename, zf.read(info))
+    return inspector.get_name()
+
+
+def _process_upload_result(store, name, result, releases, resources):
+    """Report the upload result, releasing the new revision if indicated.
+
+    :returns: If the upload was successful.
+    """
+    if not result.ok:
+        logger.info("Upload failed with status %r:", result.status)
+        for error in result.errors:
+            logger.info("- %s: %s", error.code, error.message)
+        return False
+
+    logger.info("Revision %s of %r created", result.revision, str(name))
+    if releases:
+        # also release!
+        store.release(name, result.revision, releases, resources or [])
+        msg = "Revision released to %s"
+        args = [", ".join(releases)]
+        if resources:
+            msg += " (attaching resources: %s)"
+            args.append(", ".join("{!r} r{}".format(r.name, r.revision) for r in resources))
+        logger.info(msg, *args)
+    return True
+
+
+def upload_package(charmhub_config, filepath, releases=None, resources=None):
+    """Upload the charm/bundle to Charmhub, releasing the new revision if indicated.
+
+    :returns: If the upload was successful.
+    """
+    name = inspect_package(filepath)
+    store = Store(charmhub_config)
+    result = store.upload(name, filepath)
+    return _process_upload_result(store, name, result, releases, resources)
+
+
+class StreamedUpload:
+    """Push a charm/bundle to the Storage while it's being packed.
+
+    Use it as a context manager around the packing, which must write the package to
+    it and feed its inspector with every file; the bytes are pushed by another thread
+    as they are written, so packing and the network transfer overlap. If packing fails
+    the push is aborted, so the Storage discards the incomplete package.
+    """
+
+    def __init__(self, charmhub_config, filepath):
+        self.filepath = pathlib.Path(filepath)
+        self.inspector = PackageInspector(self.filepath)
+        self._store = Store(charmhub_config)
+        self._chunks = queue.Queue(_STREAM_QUEUE_SIZE)
+        self._push_ended = threading.Event()
+        self._thread = threading.Thread(target=self._push, name="streamed-upload")
+        self._upload_id = None
+        self._error = None
+
+    def __enter__(self):
+        # the pushed bytes can't be pushed again, so any login must happen before
+        self._store.ensure_login()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._put(_STREAM_END if exc_type is None else _STREAM_ABORT)
+        self._thread.join()
+        if exc_type is None and self._error is not None:
+            raise self._error
+
+    def write(self, data):
+        """Queue the bytes to be pushed."""
+        if not self._put(data):
+            raise CommandError(
+                "Cannot push {!r} to the Store: {}".format(self.filepath.name, self._error)
+            )
+        return len(data)
+
+    def _put(self, item):
+        """Queue the item, unless the push already ended; return if it was queued."""
+        while not self._push_ended.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def _iter_chunks(self):
+        """Produce the queued chunks, until the package is complete."""
+        while True:
+            chunk = self._chunks.get()
+            if chunk is _STREAM_END:
+                return
+            if chunk is _STREAM_ABORT:
+                raise CommandError("Packing failed, push aborted.")
+            yield chunk
+
+    def _push(self):
+        """Push the package (run in its own thread)."""
+        try:
+            self._upload_id = self._store.push_stream(self.filepath.name, self._iter_chunks())
+        except Exception as error:
+            self._error = error
+        finally:
+            self._push_ended.set()
+
+    def finish(self, releases=None, resources=None):
+        """Create the revision from the pushed package, releasing it if indicated.
+
+        :returns: If the upload was successful.
+        """
+        name = self.inspector.get_name()
+        result = self._store.upload_pushed(name, self._upload_id)
+        return _process_upload_result(self._store, name, result, releases, resources)
+
+
+class StreamedUploads:
+    """Upload the packages to Charmhub, those packed here while being packed.
+
+    The packages built through `stream` are pushed while packing; the rest (e.g. those
+    packed in other environments, or reused from a cache) are uploaded from their files.
+    """
+
+    def __init__(self, charmhub_config):
+        self._charmhub_config = charmhub_config
+        self._streamed = {}
+
+    def stream(self, filepath):
+        """Return the streamed upload to use while packing the package."""
+        upload = StreamedUpload(self._charmhub_config, filepath)
+        self._streamed[pathlib.Path(filepath).absolute()] = upload
+        return upload
+
+    def upload(self, filepath, releases=None):
+        """Upload the package (if not pushed while packed), releasing it if indicated.
+
+        :returns: If the upload was successful.
+        """
+        upload = self._streamed.get(pathlib.Path(filepath).absolute())
+        if upload is None:
+            return upload_package(self._charmhub_config, filepath, releases)
+        return upload.finish(releases)
+
+
 class UploadCommand(BaseCommand):
     """Upload a charm or bundle to Charmhub."""
 
@@ -370,53 +579,11 @@ class UploadCommand(BaseCommand):
             ),
         )
 
-    def _validate_template_is_handled(self, filepath):
-        """Verify the zip does not have any file with the 'init' template TODO marker.
-
-        This is important to avoid uploading low-quality charms that are just
-        bootstrapped and not corrected.
-        """
-        # we're already sure we can open it ok
-        zf = zipfile.ZipFile(str(filepath))
-
-        tainted_filenames = []
-        for name in zf.namelist():
-            content = zf.read(name)
-            if INIT_TEMPLATE_TOKEN in content:
-                tainted_filenames.append(name)
-
-        if tainted_filenames:
-            raise CommandError(
-                "Cannot upload the charm as it include the following files with a leftover "
-                "TEMPLATE-TODO token from when the project was created using the 'init' "
-                "command: {}".format(", ".join(tainted_filenames))
-            )
-
     def run(self, parsed_args):
         """Run the command."""
-        name = get_name_from_zip(parsed_args.filepath)
-        self._validate_template_is_handled(parsed_args.filepath)
-        store = Store(self.config.charmhub)
-        result = store.upload(name, parsed_args.filepath)
-        if result.ok:
-            logger.info("Revision %s of %r created", result.revision, str(name))
-            if parsed_args.release:
-                # also release!
-                store.release(name, result.revision, parsed_args.release, parsed_args.resource)
-                msg = "Revision released to %s"
-                args = [", ".join(parsed_args.release)]
-                if parsed_args.resource:
-                    msg += " (attaching resources: %s)"
-                    args.append(
-                        ", ".join(
-                            "{!r} r{}".format(r.name, r.revision) for r in parsed_args.resource
-                        )
-                    )
-                logger.info(msg, *args)
-        else:
-            logger.info("Upload failed with status %r:", result.status)
-            for error in result.errors:
-                logger.info("- %s: %s", error.code, error.message)
+        upload_package(
+            self.config.charmhub, parsed_args.filepath, parsed_args.release, parsed_args.resource
+        )
 
 
 class ListRevisionsCommand(BaseCommand):
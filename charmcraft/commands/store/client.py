@@ -19,8 +19,9 @@
 import logging
 import os
 import platform
+import uuid
 from json.decoder import JSONDecodeError
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator
 
 import craft_store
 import requests
@@ -48,6 +49,33 @@ def build_user_agent():
     )
 
 
+class _StreamedMultipart:
+    """A multipart body with a single file, whose content is produced while it's sent.
+
+    Its size is not known in advance, so it's sent with chunked transfer encoding.
+    """
+
+    def __init__(self, filename: str, chunks: Iterable[bytes]):
+        self._filename = filename
+        self._chunks = chunks
+        self._boundary = uuid.uuid4().hex
+        self.content_type = "multipart/form-data; boundary={}".format(self._boundary)
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield (
+            "--{}\r\n"
+            'Content-Disposition: form-data; name="binary"; filename="{}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n".format(self._boundary, self._filename)
+        ).encode()
+        for chunk in self._chunks:
+            # an empty chunk would end the chunked body
+            if chunk:
+                self.bytes_read += len(chunk)
+                yield chunk
+        yield "\r\n--{}--\r\n".format(self._boundary).encode()
+
+
 class Client(craft_store.StoreClient):
     """Lightweight layer above StoreClient."""
 
@@ -95,6 +123,18 @@ class Client(craft_store.StoreClient):
             monitor = MultipartEncoderMonitor(encoder, _progress)
             response = self._storage_push(monitor)
 
+        return self._get_upload_id(response)
+
+    def push_stream(self, filename: str, chunks: Iterable[bytes]) -> str:
+        """Push the bytes from the chunks to the Storage, as they are produced."""
+        logger.debug("Starting to push %r while it's produced", filename)
+        body = _StreamedMultipart(filename, chunks)
+        response = self._storage_push(body)
+        logger.debug("Pushed %d bytes", body.bytes_read)
+        return self._get_upload_id(response)
+
+    def _get_upload_id(self, response: requests.Response) -> str:
+        """Get the upload id from the Storage response to a push."""
         result = response.json()
         if not result["successful"]:
             raise CommandError("Server error while pushing file: {}".format(result))
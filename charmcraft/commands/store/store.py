@@ -222,6 +222,10 @@ class Store:
     def _upload(self, endpoint, filepath, *, extra_fields=None):
         """Upload for all charms, bundles and resources (generic process)."""
         upload_id = self._client.push_file(filepath)
+        return self._process_upload(endpoint, upload_id, extra_fields=extra_fields)
+
+    def _process_upload(self, endpoint, upload_id, *, extra_fields=None):
+        """Create the revision from the pushed bytes, waiting for its review."""
         payload = {"upload-id": upload_id}
         if extra_fields is not None:
             payload.update(extra_fields)
@@ -255,6 +259,32 @@ class Store:
         endpoint = f"/v1/charm/{name}/revisions"
         return self._upload(endpoint, filepath)
 
+    def push_stream(self, filename, chunks):
+        """Push to the Storage the bytes from chunks, while they are produced.
+
+        As the bytes can't be pushed again, the login is not retried here; call
+        `ensure_login` before starting to produce them.
+
+        :returns: The upload id, to create the revision with `upload_pushed`.
+        """
+        try:
+            return self._client.push_stream(filename, chunks)
+        except craft_store.errors.CraftStoreError as error:
+            raise CommandError(
+                f"Server error while communicating to the Store: {error!s}"
+            ) from error
+
+    @_store_client_wrapper
+    def upload_pushed(self, name, upload_id):
+        """Create a revision of the indicated charm from the already pushed bytes."""
+        endpoint = f"/v1/charm/{name}/revisions"
+        return self._process_upload(endpoint, upload_id)
+
+    @_store_client_wrapper
+    def ensure_login(self):
+        """Verify the current credentials, logging in if needed."""
+        self._client.whoami()
+
     @_store_client_wrapper
     def upload_resource(self, charm_name, resource_name, resource_type, filepath):
         """Upload the content of filepath to the indicated resource."""
@@ -0,0 +1,153 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Infrastructure for the 'wheelhouse' command."""
+
+import datetime
+import logging
+import pathlib
+from collections import namedtuple
+from typing import List
+
+from humanize import naturalsize
+from tabulate import tabulate
+from xdg import BaseDirectory  # type: ignore
+
+from charmcraft.charm_builder import WHEELHOUSE_DIRNAME
+from charmcraft.cmdbase import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+WheelInfo = namedtuple("WheelInfo", "path name version tag size last_used")
+
+
+def get_wheelhouse_path() -> pathlib.Path:
+    """Return the path of the wheelhouse in this machine's charmcraft cache."""
+    return pathlib.Path(BaseDirectory.save_cache_path("charmcraft")) / WHEELHOUSE_DIRNAME
+
+
+def list_wheels(wheelhouse: pathlib.Path) -> List[WheelInfo]:
+    """Return the information of the wheels in the wheelhouse, sorted by name and version."""
+    if not wheelhouse.is_dir():
+        return []
+
+    wheels = []
+    for path in wheelhouse.glob("*.whl"):
+        # name-version[-build]-python-abi-platform.whl
+        parts = path.name[: -len(".whl")].split("-")
+        if len(parts) not in (5, 6):
+            logger.debug("Ignoring unexpected file in the wheelhouse: %r", path.name)
+            continue
+        stat = path.stat()
+        last_used = datetime.datetime.fromtimestamp(stat.st_mtime)
+        tag = "-".join(parts[-3:])
+        wheels.append(WheelInfo(path, parts[0], parts[1], tag, stat.st_size, last_used))
+    wheels.sort(key=lambda wheel: (wheel.name.lower(), wheel.version, wheel.tag))
+    return wheels
+
+
+_overview = """
+Show or prune the local cache of wheels built from source.
+
+To honour that charm dependencies are built from source in the base
+they run on, Charmcraft builds wheels for them and keeps those in a
+wheelhouse in the local cache, so next packs (of any charm, for any
+base with the same Python ABI) install them without building again or
+even accessing the network. Note that only when something is missing in
+the wheelhouse the dependencies are looked up in the package index
+again, so unpinned requirements will not be upgraded until then.
+
+Without options, the cached wheels are listed with their size and the
+last time they were used. With `--prune` they are removed (only those
+not used in the last days, if `--older-than` is also given).
+
+When packing in a managed environment (the default), this wheelhouse is
+shared with the instances (except those in LXD remotes), so this command
+manages the wheels built in all of them. Packing with `--no-cache` does not
+use the wheelhouse at all, so the requirements are resolved in the package
+index and built from source again.
+"""
+
+
+class WheelhouseCommand(BaseCommand):
+    """Show or prune the wheels cache."""
+
+    name = "wheelhouse"
+    help_msg = "Show or prune the local cache of wheels built from source"
+    overview = _overview
+    needs_config = False
+
+    def fill_parser(self, parser):
+        """Add own parameters to the general parser."""
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Remove the wheels from the cache",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            metavar="days",
+            help="Only prune the wheels not used in the indicated days",
+        )
+
+    def run(self, parsed_args):
+        """Run the command."""
+        if parsed_args.older_than is not None:
+            if not parsed_args.prune:
+                raise CommandError("The --older-than option can only be used with --prune.")
+            if parsed_args.older_than < 0:
+                raise CommandError("The --older-than option must be a non-negative integer.")
+
+        wheelhouse = get_wheelhouse_path()
+        wheels = list_wheels(wheelhouse)
+        if parsed_args.prune:
+            self._prune(wheels, parsed_args.older_than)
+            return
+
+        if not wheels:
+            logger.info("No wheels in the wheelhouse (%s).", wheelhouse)
+            return
+
+        headers = ["Name", "Version", "Tag", "Size", "Last used"]
+        data = [
+            (
+                wheel.name,
+                wheel.version,
+                wheel.tag,
+                naturalsize(wheel.size),
+                wheel.last_used.strftime("%Y-%m-%d %H:%M"),
+            )
+            for wheel in wheels
+        ]
+        table = tabulate(data, headers=headers, tablefmt="plain", numalign="left")
+        for line in table.splitlines():
+            logger.info(line)
+        total = sum(wheel.size for wheel in wheels)
+        logger.info("Total: %d wheels, %s (%s).", len(wheels), naturalsize(total), wheelhouse)
+
+    def _prune(self, wheels, older_than):
+        """Remove the wheels, all of them or those not used in the indicated days."""
+        if older_than is not None:
+            limit = datetime.datetime.now() - datetime.timedelta(days=older_than)
+            wheels = [wheel for wheel in wheels if wheel.last_used < limit]
+
+        freed = 0
+        for wheel in wheels:
+            logger.debug("Removing wheel %r", wheel.path.name)
+            wheel.path.unlink()
+            freed += wheel.size
+        logger.info("Removed %d wheels, freeing %s.", len(wheels), naturalsize(freed))
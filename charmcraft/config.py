@@ -33,6 +33,15 @@ parts:
   charm:
     charm-entrypoint: [string] optional, defaults to "src/charm.py"
     charm-requirements: [list of strings] optional, defaults to ["requirements.txt"] if present
+    charm-dependencies-cache: [boolean] optional, defaults to true
+    charm-compile-bytecode: [boolean] optional, defaults to false
+    charm-prune: [boolean] optional, defaults to false
+    charm-prune-keep: [list of strings] optional
+    charm-prune-remove: [list of strings] optional
+    charm-tree-shake: [boolean] optional, defaults to false
+    charm-tree-shake-keep: [list of strings] optional
+    charm-ignore-stats: [boolean] optional, defaults to false
+    charm-build-report: [string] optional
     prime: [list of strings]
 
   bundle:
@@ -76,6 +85,7 @@ from charmcraft.cmdbase import CommandError
 from charmcraft.deprecations import notify_deprecation
 from charmcraft.env import (
     get_managed_environment_project_path,
+    get_source_date_epoch,
     is_charmcraft_running_in_managed_mode,
 )
 from charmcraft.parts import validate_part
@@ -447,7 +457,11 @@ def load(dirpath: Optional[str]) -> Config:
     else:
         dirpath = pathlib.Path(dirpath).expanduser().resolve()
 
-    now = datetime.datetime.utcnow()
+    source_date_epoch = get_source_date_epoch()
+    if source_date_epoch is None:
+        now = datetime.datetime.utcnow()
+    else:
+        now = datetime.datetime.utcfromtimestamp(source_date_epoch)
 
     content = load_yaml(dirpath / "charmcraft.yaml")
     if content is None:
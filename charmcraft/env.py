@@ -22,6 +22,8 @@ import os
 import pathlib
 from typing import Optional
 
+from charmcraft.cmdbase import CommandError
+
 
 def get_managed_environment_home_path():
     """Path for home when running in managed environment."""
@@ -29,8 +31,17 @@ def get_managed_environment_home_path():
 
 
 def get_managed_environment_log_path():
-    """Path for charmcraft log when running in managed environment."""
-    return pathlib.Path("/tmp/charmcraft.log")
+    """Path for charmcraft log when running in managed environment.
+
+    The host may indicate another one (e.g. in the mounted project, so the log is
+    written straight in the host).
+    """
+    return pathlib.Path(os.getenv("CHARMCRAFT_MANAGED_LOG_PATH", "/tmp/charmcraft.log"))
+
+
+def is_managed_environment_log_path_set() -> bool:
+    """Check if the host indicated where to leave the log in the managed environment."""
+    return "CHARMCRAFT_MANAGED_LOG_PATH" in os.environ
 
 
 def get_managed_environment_project_path():
@@ -38,6 +49,16 @@ def get_managed_environment_project_path():
     return get_managed_environment_home_path() / "project"
 
 
+def get_managed_environment_output_path():
+    """Path for the host's output directory when running in managed environment."""
+    return get_managed_environment_home_path() / "output"
+
+
+def get_managed_environment_wheelhouse_path():
+    """Path for the host's wheelhouse when running in managed environment."""
+    return get_managed_environment_home_path() / "wheelhouse"
+
+
 def get_managed_environment_snap_channel() -> Optional[str]:
     """User-specified channel to use when installing Charmcraft snap from Snap Store.
 
@@ -46,6 +67,24 @@ def get_managed_environment_snap_channel() -> Optional[str]:
     return os.getenv("CHARMCRAFT_INSTALL_SNAP_CHANNEL")
 
 
+def get_source_date_epoch() -> Optional[int]:
+    """Timestamp to use for everything built, as defined by Reproducible Builds.
+
+    :returns: The value of SOURCE_DATE_EPOCH if set, else None.
+    :raises CommandError: if the value is not a valid timestamp.
+    """
+    value = os.getenv("SOURCE_DATE_EPOCH")
+    if value is None:
+        return None
+    try:
+        timestamp = int(value)
+    except ValueError:
+        timestamp = -1
+    if timestamp < 0:
+        raise CommandError(f"Invalid SOURCE_DATE_EPOCH {value!r} (must be a Unix timestamp).")
+    return timestamp
+
+
 def is_charmcraft_running_from_snap():
     """Check if charmcraft is running from the snap."""
     return os.getenv("SNAP_NAME") == "charmcraft" and os.getenv("SNAP") is not None
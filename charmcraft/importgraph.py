@@ -0,0 +1,186 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Static import graph of the charm code and its dependencies."""
+
+import ast
+import logging
+import os
+import pathlib
+from typing import Generator, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def iter_imports(filepath: pathlib.Path) -> Generator[Tuple[int, str, List[str]], None, None]:
+    """Parse a Python filepath and yield its imports.
+
+    If the file does not exist or cannot be parsed, return empty. Otherwise yield
+    for each import its level (how many leading dots in a relative import, 0 if
+    absolute), the imported module (empty in "from . import foo") and the names
+    imported from the module (empty in "import foo"). The modules imported with
+    `importlib.import_module` or `__import__` using a literal name are included.
+    """
+    if not os.access(filepath, os.R_OK):
+        return
+    try:
+        parsed = ast.parse(filepath.read_bytes())
+    except (SyntaxError, ValueError):
+        return
+
+    for node in ast.walk(parsed):
+        if isinstance(node, ast.Import):
+            for name in node.names:
+                yield 0, name.name, []
+        elif isinstance(node, ast.ImportFrom):
+            yield node.level, node.module or "", [name.name for name in node.names]
+        elif isinstance(node, ast.Call) and node.args:
+            func = node.func
+            func_name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+            if func_name not in ("import_module", "__import__"):
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str) and arg.value:
+                if not arg.value.startswith("."):
+                    yield 0, arg.value, []
+
+
+class ImportGraph:
+    """Follow the static imports from some modules through the given directories.
+
+    The directories are where Python would look for the modules when running the charm;
+    all of them are checked for each module (so namespace packages are supported, and
+    in case of doubt more modules are considered reachable, not less).
+
+    Everything imported anywhere in a module is followed (even inside functions or under
+    conditions), but modules imported dynamically can not be found (except when using
+    `importlib.import_module` or `__import__` with a literal name): those need to be
+    explicitly kept.
+
+    :param search_dirs: The directories to look for the modules.
+    """
+
+    def __init__(self, search_dirs: List[pathlib.Path]):
+        self.search_dirs = search_dirs
+        self.reached = set()
+        self.kept = set()
+        self._pending = []
+
+    def add_module(self, name: str, keep_all: bool = False) -> None:
+        """Add a module (and its parent packages) as reachable.
+
+        If `keep_all`, everything under the module is also considered reachable.
+        """
+        if keep_all:
+            self.kept.add(name)
+        parts = name.split(".")
+        for idx in range(1, len(parts) + 1):
+            prefix = ".".join(parts[:idx])
+            if prefix not in self.reached:
+                self.reached.add(prefix)
+                self._pending.append(prefix)
+
+    def resolve(self) -> None:
+        """Follow the imports of all the reachable modules, until nothing new is found."""
+        while self._pending:
+            name = self._pending.pop()
+            for filepath in self._find_module_files(name):
+                self._add_imports(name, filepath)
+
+    def is_reachable(self, name: str) -> bool:
+        """Tell if the module was reached following the imports."""
+        if name in self.reached:
+            return True
+        parts = name.split(".")
+        return any(".".join(parts[:idx]) in self.kept for idx in range(1, len(parts)))
+
+    def _find_module_files(self, name: str) -> List[pathlib.Path]:
+        """Return the source files of the module in all the directories."""
+        parts = name.split(".")
+        found = []
+        for search_dir in self.search_dirs:
+            package_init = search_dir.joinpath(*parts, "__init__.py")
+            module_file = search_dir.joinpath(*parts[:-1], parts[-1] + ".py")
+            for candidate in (package_init, module_file):
+                if candidate.is_file():
+                    found.append(candidate)
+        return found
+
+    def _find_submodules(self, name: str) -> List[str]:
+        """Return the names of the modules directly under the package."""
+        parts = name.split(".")
+        submodules = set()
+        for search_dir in self.search_dirs:
+            package_dir = search_dir.joinpath(*parts)
+            if not package_dir.is_dir():
+                continue
+            for entry in package_dir.iterdir():
+                stem = entry.name[:-3] if entry.name.endswith(".py") else entry.name
+                if stem.isidentifier() and (entry.is_dir() or entry.name.endswith(".py")):
+                    submodules.add(f"{name}.{stem}")
+        return sorted(submodules)
+
+    def _add_imports(self, name: str, filepath: pathlib.Path) -> None:
+        """Add as reachable all the modules imported in the module's file."""
+        is_package = filepath.name == "__init__.py"
+        for level, module, imported_names in iter_imports(filepath):
+            if level:
+                # relative import: find the base package from the module's one
+                package_parts = name.split(".") if is_package else name.split(".")[:-1]
+                if level - 1 >= len(package_parts):
+                    logger.debug("Ignoring relative import beyond top package in %r", name)
+                    continue
+                base_parts = package_parts[: len(package_parts) - (level - 1)]
+                module = ".".join(base_parts + ([module] if module else []))
+
+            self.add_module(module)
+            for imported in imported_names:
+                if imported == "*":
+                    for submodule in self._find_submodules(module):
+                        self.add_module(submodule)
+                else:
+                    # it may be an object in the module or a submodule; in the first case
+                    # it will not be found, which is harmless
+                    self.add_module(f"{module}.{imported}")
+
+
+def find_unreachable(graph: ImportGraph, basedir: pathlib.Path) -> Iterable[Tuple[str, str]]:
+    """Yield the modules in the directory not reached in the graph, with their paths.
+
+    Only regular packages (with `__init__.py`) and Python source modules are considered:
+    namespace packages are walked into but never removed as a whole, data directories
+    inside packages are kept with the package, and extension modules outside packages
+    are always kept (they may be imported from compiled code).
+    """
+    pending = [("", str(basedir))]
+    while pending:
+        prefix, dirpath = pending.pop()
+        with os.scandir(dirpath) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.isidentifier() or entry.name == "__pycache__":
+                        continue
+                    name = prefix + entry.name
+                    is_package = os.path.isfile(os.path.join(entry.path, "__init__.py"))
+                    if is_package and not graph.is_reachable(name):
+                        yield name, entry.path
+                    elif is_package or not prefix:
+                        # reachable package, or a namespace one in the root
+                        pending.append((name + ".", entry.path))
+                elif entry.name.endswith(".py") and entry.name != "__init__.py":
+                    name = prefix + entry.name[:-3]
+                    if entry.name[:-3].isidentifier() and not graph.is_reachable(name):
+                        yield name, entry.path
@@ -18,7 +18,9 @@
 
 import logging
 import re
+import time
 import typing
+from collections import namedtuple
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +28,9 @@ KEEP = "keep"
 SKIP = "skip"
 FORCEKEEP = "forcekeep"
 
+# the statistics collected for each rule when instrumentation is enabled
+RuleStats = namedtuple("RuleStats", "source line_num rule evaluations matches elapsed")
+
 _unescapes = {
     r"\!": "!",
     r"\ ": " ",
@@ -118,22 +123,122 @@ def _rule_to_regex(rule):
     return res
 
 
+# the different kind of literal rules that can be resolved without a regex
+_LITERAL_BASENAME = "basename"  # e.g. ".git", matches the last component of the path
+_LITERAL_SUFFIX = "suffix"  # e.g. "*.pyc", matches the end of the last component of the path
+_LITERAL_PATH = "path"  # e.g. "/build", matches the whole path
+
+_WILDCARD_CHARS = set("*?[")
+
+
+def _rule_to_literal(rule):
+    """Detect if the rule is a literal that can be matched without a regex.
+
+    This assumes that the rule is already normalized (so it starts with '/' if anchored, or
+    with '**/' if it can match in any directory).
+
+    Returns None if the rule really needs a regex, or a tuple with the literal kind and its value.
+    """
+    if rule.startswith("/"):
+        if _WILDCARD_CHARS.isdisjoint(rule):
+            return _LITERAL_PATH, rule
+        return None
+
+    rest = rule[3:]  # remove the "**/" prefix
+    if rest.startswith("*"):
+        kind = _LITERAL_SUFFIX
+        rest = rest[1:]
+    else:
+        kind = _LITERAL_BASENAME
+    if rest and "/" not in rest and _WILDCARD_CHARS.isdisjoint(rest):
+        return kind, rest
+    return None
+
+
+def _rule_to_components(rule):
+    """Split a rule in per-directory matchers, to analyze which subtrees it can reach.
+
+    This assumes that the rule is already normalized (so it starts with '/' if anchored, or
+    with '**/' if it can match in any directory).
+
+    Returns a list with a compiled regex for each component of the path, where None means that
+    from that point the rule can match anything, even across directories (in that case the
+    previous regex only needs to match the start of the component).
+    """
+    parts = rule.split("/")
+    components = []
+    for idx, part in enumerate(parts):
+        if "[" in part and "]" not in part:
+            # a bracket that includes a slash, too complex to split
+            components.append(None)
+            break
+        if "**" in part:
+            # crosses directories from there
+            prefix = part[: part.index("**")]
+        elif idx + 2 < len(parts) and parts[idx + 1] == "**":
+            # a '/**/' in the middle is translated to '.*/', so it extends this component
+            prefix = part
+        else:
+            components.append(re.compile(_rule_to_regex(part), re.DOTALL))
+            continue
+        components.append(re.compile(_rule_to_regex(prefix)[: -len(r"\Z")], re.DOTALL))
+        components.append(None)
+        break
+    return components
+
+
+def _may_match_below(components, dir_parts):
+    """Tell if the rule components may match something inside the given directory."""
+    for idx, dir_part in enumerate(dir_parts):
+        if idx >= len(components):
+            return False
+        component = components[idx]
+        if component is None:
+            return True
+        if not component.match(dir_part):
+            return False
+    return len(components) > len(dir_parts)
+
+
+def _regex_to_cover(regex):
+    """Get a regex matching the directories under which the given regex matches everything.
+
+    Only rules ending in '/**' match everything under a directory; None is returned otherwise.
+    """
+    tail = r"/.*\Z"
+    if not regex.endswith(tail):
+        return None
+    return regex[: -len(tail)] + r"(?:/.*)?\Z"
+
+
 class _Matcher:
     """Couple a regex with other metadata for how we should match a given pattern."""
 
     def __init__(
         self,
+        source: str,
         line_num: int,
         orig_rule: str,
         invert: bool,
         only_dirs: bool,
         regex: typing.Pattern,
+        literal: typing.Optional[typing.Tuple[str, str]] = None,
+        components: typing.Optional[typing.List[typing.Optional[typing.Pattern]]] = None,
     ):
+        self.source = source
         self.line_num = line_num
         self.orig_rule = orig_rule
         self.invert = invert
         self.only_dirs = only_dirs
         self.compiled = re.compile(regex, re.DOTALL)
+        self.literal = literal
+        self.components = [None] if components is None else components
+        self.cover = None if only_dirs else _regex_to_cover(regex)
+
+        # statistics, only collected if the instrumentation is enabled
+        self.evaluations = 0
+        self.matches = 0
+        self.elapsed = 0.0
 
     def match(self, path: str, is_dir: bool) -> str:
         """Check if a path matches.
@@ -150,18 +255,107 @@ class _Matcher:
         return KEEP
 
 
+class _MatcherGroup:
+    """Evaluate several matchers of the same kind in one pass.
+
+    Literal rules are resolved with hash lookups: exact basenames and whole paths in sets, and
+    suffixes in sets per suffix length. The rest of the regexes are joined in a single
+    alternation, so the regex engine decides if any of them matches without looping over the
+    rules in Python.
+    """
+
+    def __init__(self, matchers: typing.List[_Matcher]):
+        self.matchers = matchers
+        self.basenames = set()
+        self.paths = set()
+        self.suffixes = {}
+        regexes = []
+        for matcher in matchers:
+            if matcher.literal is None:
+                regexes.append(matcher.compiled.pattern)
+                continue
+            kind, value = matcher.literal
+            if kind == _LITERAL_BASENAME:
+                self.basenames.add(value)
+            elif kind == _LITERAL_SUFFIX:
+                self.suffixes.setdefault(len(value), set()).add(value)
+            else:
+                self.paths.add(value)
+
+        if regexes:
+            combined = "|".join("(?:{})".format(regex) for regex in regexes)
+            self.compiled = re.compile(combined, re.DOTALL)
+        else:
+            self.compiled = None
+
+        covers = [m.cover for m in matchers if m.cover is not None]
+        if covers:
+            combined = "|".join("(?:{})".format(cover) for cover in covers)
+            self.cover = re.compile(combined, re.DOTALL)
+        else:
+            self.cover = None
+
+    def match(self, path: str) -> bool:
+        """Check if any of the matchers matches the path."""
+        if path in self.paths:
+            return True
+        if self.basenames or self.suffixes:
+            basename = path.rpartition("/")[2]
+            if basename in self.basenames:
+                return True
+            for length, suffixes in self.suffixes.items():
+                if basename[-length:] in suffixes:
+                    return True
+        if self.compiled is None:
+            return False
+        return self.compiled.match(path) is not None
+
+    def covers(self, dirpath: str) -> bool:
+        """Check if any of the matchers matches everything under the directory."""
+        if self.cover is None:
+            return False
+        return self.cover.match(dirpath) is not None
+
+    def may_match_below(self, dir_parts: typing.List[str]) -> bool:
+        """Check if any of the matchers may match something under the directory."""
+        return any(_may_match_below(m.components, dir_parts) for m in self.matchers)
+
+
 class JujuIgnore:
-    """Track a set of ignore patterns from a .jujuignore file."""
+    """Track a set of ignore patterns from a .jujuignore file.
+
+    If instrumented, each rule is evaluated separately so the number of evaluations, matches
+    and the time spent in each of them is recorded (see `get_stats`); this is way slower than
+    the normal operation, use it only to debug the rules. The subtree analysis is disabled
+    then, so the paths under a directory are always checked and counted against the rules
+    that decide them.
+
+    Each set of patterns can be labelled with its source (e.g. where it was read from), which
+    is kept for each rule along with its line number in that source.
+    """
 
-    def __init__(self, patterns: typing.Iterable[str]):
+    def __init__(self, patterns: typing.Iterable[str], instrument: bool = False, source: str = ""):
         self._matchers = []
-        self._compile_from(patterns)
+        self._groups = None
+        self._instrument = instrument
+        self._compile_from(patterns, source)
 
-    def extend_patterns(self, patterns: typing.Iterable[str]) -> None:
+    def extend_patterns(self, patterns: typing.Iterable[str], source: str = "") -> None:
         """Add more patterns to the ignore list."""
-        self._compile_from(patterns)
+        self._compile_from(patterns, source)
+
+    def _get_groups(self) -> typing.Dict[typing.Tuple[bool, bool], _MatcherGroup]:
+        """Return the matchers grouped by (invert, only_dirs), building them if needed."""
+        if self._groups is None:
+            grouped = {
+                (invert, only_dirs): [] for invert in (True, False) for only_dirs in (True, False)
+            }
+            for matcher in self._matchers:
+                grouped[(matcher.invert, matcher.only_dirs)].append(matcher)
+            self._groups = {key: _MatcherGroup(matchers) for key, matchers in grouped.items()}
+        return self._groups
 
-    def _compile_from(self, patterns: typing.Iterable[str]):
+    def _compile_from(self, patterns: typing.Iterable[str], source: str):
         for line_num, rule in enumerate(patterns, 1):
             orig_rule = rule
             rule = rule.lstrip().rstrip("\r\n")
@@ -182,14 +376,20 @@ class JujuIgnore:
                 rule = "**/" + rule
             regex = _rule_to_regex(rule)
             m = _Matcher(
+                source=source,
                 line_num=line_num,
                 orig_rule=orig_rule,
                 invert=invert,
                 only_dirs=only_dirs,
                 regex=regex,
+                literal=_rule_to_literal(rule),
+                components=_rule_to_components(rule),
             )
             self._matchers.append(m)
-            logger.debug('Translated .jujuignore %d "%s" => "%s"', line_num, orig_rule, regex)
+            self._groups = None
+            logger.debug(
+                'Translated .jujuignore %s:%d "%s" => "%s"', source, line_num, orig_rule, regex
+            )
 
     def match(self, path: str, is_dir: bool) -> bool:
         """Check if the given path should be ignored.
@@ -204,15 +404,108 @@ class JujuIgnore:
         """
         if not path.startswith("/"):
             path = "/" + path
-        keep = True
+        if self._instrument:
+            return self._match_instrumented(path, is_dir)
+
+        # any negated rule matching forces to keep the path, no matter the rest of rules;
+        # otherwise the path is ignored if any of the regular rules matches
+        groups = self._get_groups()
+        if groups[(True, False)].match(path):
+            return False
+        if is_dir and groups[(True, True)].match(path):
+            return False
+        if groups[(False, False)].match(path):
+            return True
+        if is_dir and groups[(False, True)].match(path):
+            return True
+        return False
+
+    def _match_instrumented(self, path: str, is_dir: bool) -> bool:
+        """Check the path against each rule, recording the statistics for all of them."""
+        ignored = False
+        forced = False
         for matcher in self._matchers:
-            matchRes = matcher.match(path, is_dir)
-            if matchRes == SKIP:
-                keep = False
-            elif matchRes == FORCEKEEP:
-                keep = True
-                break
-        return not keep
+            start = time.perf_counter()
+            result = matcher.match(path, is_dir)
+            matcher.elapsed += time.perf_counter() - start
+            matcher.evaluations += 1
+            if result == SKIP:
+                matcher.matches += 1
+                ignored = True
+            elif result == FORCEKEEP:
+                matcher.matches += 1
+                forced = True
+        return ignored and not forced
+
+    def get_stats(self) -> typing.List[RuleStats]:
+        """Return the statistics collected for each rule, in the order they were loaded.
+
+        Note the statistics are only collected if the instrumentation is enabled.
+        """
+        return [
+            RuleStats(
+                source=m.source,
+                line_num=m.line_num,
+                rule=m.orig_rule.rstrip("\r\n"),
+                evaluations=m.evaluations,
+                matches=m.matches,
+                elapsed=m.elapsed,
+            )
+            for m in self._matchers
+        ]
+
+    def is_subtree_ignored(self, path: str) -> bool:
+        """Check if everything under the given directory is ignored.
+
+        This happens when a rule like 'foo/**' matches the whole subtree and no negated rule
+        can force to keep anything under it, so the directory doesn't need to be walked.
+
+        Args:
+            path: A local path (eg /foo/bar or foo/bar) from the root directory of the project.
+        Return:
+            A boolean indicating that all the paths under the directory would be ignored (the
+            directory itself may not be ignored, that is indicated by `match`); always False
+            if instrumented.
+        """
+        if self._instrument:
+            return False
+        path = "/" + path.strip("/")
+        if path == "/":
+            # the project root itself is never ignored as a whole
+            return False
+        groups = self._get_groups()
+        if not groups[(False, False)].covers(path):
+            return False
+        dir_parts = path.split("/")
+        return not (
+            groups[(True, False)].may_match_below(dir_parts)
+            or groups[(True, True)].may_match_below(dir_parts)
+        )
+
+    def is_subtree_kept(self, path: str) -> bool:
+        """Check if nothing under the given directory is ignored.
+
+        This happens when a negated rule like '!foo/**' forces to keep the whole subtree, or
+        when no rule can match anything under it, so the paths inside don't need to be checked.
+
+        Args:
+            path: A local path (eg /foo/bar or foo/bar) from the root directory of the project.
+        Return:
+            A boolean indicating that all the paths under the directory would be kept (the
+            directory itself may be ignored, that is indicated by `match`); always False if
+            instrumented.
+        """
+        if self._instrument:
+            return False
+        path = "/" + path.strip("/")
+        groups = self._get_groups()
+        if path != "/" and groups[(True, False)].covers(path):
+            return True
+        dir_parts = path.rstrip("/").split("/")
+        return not (
+            groups[(False, False)].may_match_below(dir_parts)
+            or groups[(False, True)].may_match_below(dir_parts)
+        )
 
 
 # default_juju_ignore is the initial set of ignores.
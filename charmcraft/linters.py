@@ -16,7 +16,6 @@
 
 """Analyze and lint charm structures and files."""
 
-import ast
 import os
 import pathlib
 import shlex
@@ -26,6 +25,7 @@ from typing import List, Generator, Union
 import yaml
 
 from charmcraft import config
+from charmcraft.importgraph import iter_imports
 from charmcraft.metadata import parse_metadata_yaml
 
 CheckType = namedtuple("CheckType", "attribute lint")(attribute="attribute", lint="lint")
@@ -140,19 +140,9 @@ class Framework:
         If the file does not exist or cannot be parsed, return empty. Otherwise
         return the name for each imported module, splitted by possible dots.
         """
-        if not os.access(filepath, os.R_OK):
-            return
-        try:
-            parsed = ast.parse(filepath.read_bytes())
-        except SyntaxError:
-            return
-
-        for node in ast.walk(parsed):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    yield name.name.split(".")
-            elif isinstance(node, ast.ImportFrom):
-                yield node.module.split(".")
+        for _, module, _ in iter_imports(filepath):
+            if module:
+                yield module.split(".")
 
     def _check_operator(self, basedir: pathlib.Path) -> bool:
         """Detect if the Operator Framework is used."""
@@ -24,6 +24,7 @@ from charmcraft import __version__
 from charmcraft.env import (
     get_managed_environment_log_path,
     is_charmcraft_running_in_managed_mode,
+    is_managed_environment_log_path_set,
 )
 
 FORMATTER_SIMPLE = "%(message)s"
@@ -66,6 +67,7 @@ class _MessageHandler:
             setattr(self, k.upper(), k)
 
         self.mode = self.NORMAL
+        self._keep_log = False
 
     def init(self, initial_mode):
         """Initialize internal structures; this must be done before start logging."""
@@ -86,6 +88,9 @@ class _MessageHandler:
         managed_mode = is_charmcraft_running_in_managed_mode()
         if managed_mode:
             self._log_filepath = str(get_managed_environment_log_path())
+            # a log the host asked for is left in place, even if everything went fine
+            self._keep_log = is_managed_environment_log_path_set()
+            os.makedirs(os.path.dirname(self._log_filepath), exist_ok=True)
         else:
             fd, self._log_filepath = tempfile.mkstemp(prefix="charmcraft-log-")
             # Logger will re-open as needed.
@@ -109,7 +114,7 @@ class _MessageHandler:
     def ended_ok(self):
         """Cleanup after successful execution."""
         logging.shutdown()
-        os.unlink(self._log_filepath)
+        self._remove_log()
 
     def ended_interrupt(self):
         """Clean up on keyboard interrupt."""
@@ -118,7 +123,12 @@ class _MessageHandler:
         else:
             logger.error("Interrupted.")
         logging.shutdown()
-        os.unlink(self._log_filepath)
+        self._remove_log()
+
+    def _remove_log(self):
+        """Remove the log file, unless it must be kept."""
+        if not self._keep_log:
+            os.unlink(self._log_filepath)
 
     def ended_cmderror(self, err):
         """Report the (expected) problem and (maybe) logfile location."""
@@ -21,9 +21,10 @@ import logging
 import sys
 from collections import namedtuple
 
-from charmcraft import config
+from charmcraft import agent, config
 from charmcraft.cmdbase import CommandError
-from charmcraft.commands import build, clean, init, pack, store, version, analyze
+from charmcraft.commands import build, clean, init, pack, store, version, analyze, wheelhouse
+from charmcraft.env import is_charmcraft_running_in_managed_mode
 from charmcraft.helptexts import help_builder
 from charmcraft.logsetup import message_handler
 from charmcraft.parts import setup_parts
@@ -60,6 +61,7 @@ _basic_commands = [
     pack.PackCommand,
     init.InitCommand,
     version.VersionCommand,
+    wheelhouse.WheelhouseCommand,
 ]
 _charmhub_commands = [
     # auth
@@ -332,12 +334,20 @@ class Dispatcher:
 
 def main(argv=None):
     """Provide the main entry point."""
-    help_builder.init("charmcraft", GENERAL_SUMMARY, COMMAND_GROUPS)
-    message_handler.init(message_handler.NORMAL)
-
     if argv is None:
         argv = sys.argv
 
+    # internal: serve the packs requested from the host, when in a managed instance
+    if (
+        len(argv) == 3
+        and argv[1] == agent.AGENT_OPTION
+        and is_charmcraft_running_in_managed_mode()
+    ):
+        return agent.serve(argv[2])
+
+    help_builder.init("charmcraft", GENERAL_SUMMARY, COMMAND_GROUPS)
+    message_handler.init(message_handler.NORMAL)
+
     extra_global_options = [
         GlobalArgument(
             "project_dir",
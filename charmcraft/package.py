@@ -0,0 +1,309 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Creation of the charm and bundle packages."""
+
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import stat
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from typing import Callable, List, Optional, Tuple
+
+from charmcraft.env import get_source_date_epoch
+
+logger = logging.getLogger(__name__)
+
+# the default compression level; it's always explicit so the same content is always
+# compressed the same way
+COMPRESSION_LEVEL = 6
+
+# files in these formats are already compressed, so they are stored as they are
+STORED_SUFFIXES = {
+    ".bz2",
+    ".charm",
+    ".gif",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".png",
+    ".tgz",
+    ".whl",
+    ".xz",
+    ".zip",
+}
+
+# the oldest timestamp that can be stored in a zip file (1980-01-01)
+_MIN_ZIP_TIMESTAMP = 315532800
+
+# the Unix permissions stored for the files, depending if they are executable or not
+_EXECUTABLE_MODE = 0o755
+_REGULAR_MODE = 0o644
+
+# how many files may be compressed ahead of the one being written, per worker
+_PENDING_PER_WORKER = 4
+
+# the package's comment records how its content was compressed, so it's only reused
+# by the next build if compressing with the same level
+_COMMENT_TEMPLATE = "charmcraft compression-level={}"
+
+# the fixed part of a zip's local file header, and its signature
+_LOCAL_HEADER = struct.Struct("<4s22xHH")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+
+def _collect_files(prime_dir: pathlib.Path) -> List[Tuple[str, pathlib.Path]]:
+    """Return the files to pack (following symlinks), with their names in the zip, sorted."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(prime_dir, followlinks=True):
+        dirpath = pathlib.Path(dirpath)
+        for filename in filenames:
+            filepath = dirpath / filename
+            files.append((filepath.relative_to(prime_dir).as_posix(), filepath))
+    files.sort()
+    return files
+
+
+class _PreviousPackage:
+    """The package from a previous build, to reuse its already compressed entries.
+
+    It's only used if it was built by this module with the same compression level;
+    otherwise (or if it's missing or broken) nothing is reused.
+    """
+
+    def __init__(self, zippath, compression_level: int):
+        self.entries = {}
+        self._file = None
+        self._lock = threading.Lock()
+        try:
+            with zipfile.ZipFile(zippath) as zipfh:
+                if zipfh.comment != _COMMENT_TEMPLATE.format(compression_level).encode():
+                    logger.debug("Not reusing the previous package, compressed differently.")
+                    return
+                self.entries = {info.filename: info for info in zipfh.infolist()}
+            self._file = open(zippath, "rb")
+        except FileNotFoundError:
+            return
+        except (OSError, zipfile.BadZipFile) as exc:
+            logger.debug("Not reusing the previous package %r: %r", str(zippath), exc)
+            self.entries = {}
+
+    def get_data(self, info: zipfile.ZipInfo) -> Optional[bytes]:
+        """Return the compressed data of the same entry in the previous package, if any.
+
+        The entry is the same if it has the same name, content size and CRC, and is
+        compressed in the same way. It's safe to call this from different threads.
+        """
+        previous = self.entries.get(info.filename)
+        if (
+            previous is None
+            or previous.file_size != info.file_size
+            or previous.CRC != info.CRC
+            or previous.compress_type != info.compress_type
+        ):
+            return None
+        header = self._read(previous.header_offset, _LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size:
+            return None
+        signature, name_size, extra_size = _LOCAL_HEADER.unpack(header)
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            return None
+        data_offset = previous.header_offset + _LOCAL_HEADER.size + name_size + extra_size
+        data = self._read(data_offset, previous.compress_size)
+        if len(data) != previous.compress_size:
+            return None
+        return data
+
+    def _read(self, offset: int, size: int) -> bytes:
+        """Read from the previous package (positioning and reading is not thread-safe)."""
+        with self._lock:
+            self._file.seek(offset)
+            return self._file.read(size)
+
+    def close(self) -> None:
+        """Release the previous package."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _TeeWriter:
+    """A file to write the zip in, that also copies everything written to a stream.
+
+    It can't seek, so the zip is written sequentially from start to end.
+    """
+
+    def __init__(self, fh, stream):
+        self._fh = fh
+        self._stream = stream
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        """Write to the file and the stream."""
+        self._fh.write(data)
+        self._stream.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Return how much was written."""
+        return self._position
+
+    def flush(self) -> None:
+        """Flush the file."""
+        self._fh.flush()
+
+
+def _compress_entry(
+    info: zipfile.ZipInfo,
+    filepath: pathlib.Path,
+    compression_level: int,
+    previous: _PreviousPackage,
+) -> Tuple[zipfile.ZipInfo, bytes, bool, bytes]:
+    """Compress the file's content for the zip entry, completing its information.
+
+    The compressed data is taken from the previous package if the content is the same;
+    return also if that happened, and the original content.
+    """
+    content = filepath.read_bytes()
+    info.file_size = len(content)
+    info.CRC = zlib.crc32(content)
+    data = previous.get_data(info)
+    if data is not None:
+        info.compress_size = len(data)
+        return info, data, True, content
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        # raw deflate stream, as zipfile itself produces it
+        compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+        data = compressor.compress(content) + compressor.flush()
+    else:
+        data = content
+    info.compress_size = len(data)
+    return info, data, False, content
+
+
+def _append_entry(zipfh: zipfile.ZipFile, info: zipfile.ZipInfo, data: bytes) -> None:
+    """Append an already compressed entry to the zip being written."""
+    info.header_offset = zipfh.fp.tell()
+    zipfh.fp.write(info.FileHeader())
+    zipfh.fp.write(data)
+    zipfh.filelist.append(info)
+    zipfh.NameToInfo[info.filename] = info
+    zipfh.start_dir = zipfh.fp.tell()
+
+
+def build_zip(
+    zippath,
+    prime_dir,
+    compression_level: int = COMPRESSION_LEVEL,
+    *,
+    inspector: Optional[Callable[[str, bytes], None]] = None,
+    stream=None,
+) -> None:
+    """Build the final file.
+
+    The result is reproducible: the same content always produces the same zip, as the
+    files are stored in order, all with the same timestamp (SOURCE_DATE_EPOCH if set,
+    else the one of the newest file), only keeping if they are executable or not from
+    their permissions, and compressed with the given level.
+
+    The files are compressed in parallel and appended to the zip in order as they are
+    ready; those in already compressed formats are stored without compressing them again.
+    If the zip already exists (from a previous build), the compressed data of the files
+    that did not change is copied from it instead of compressing them again.
+
+    As every file is read anyway, the inspector (if given) is called with the name and
+    content of each one, in the same order they are stored in the zip. If a stream
+    is given, everything written to the zip is also written to it as the zip grows, so
+    the package can be consumed while it's being built.
+    """
+    prime_dir = pathlib.Path(prime_dir)
+    zippath = pathlib.Path(zippath)
+    files = [(name, filepath, filepath.stat()) for name, filepath in _collect_files(prime_dir)]
+
+    timestamp = get_source_date_epoch()
+    if timestamp is None:
+        timestamp = max((int(filestat.st_mtime) for _, _, filestat in files), default=0)
+    date_time = time.gmtime(max(timestamp, _MIN_ZIP_TIMESTAMP))[:6]
+
+    # the new zip is written aside, as the previous one is read meanwhile
+    temp_zippath = zippath.with_name(zippath.name + ".partial")
+    workers = os.cpu_count() or 1
+    pending = collections.deque()
+    reused = 0
+
+    def _write_next():
+        nonlocal reused
+        info, data, was_reused, content = pending.popleft().result()
+        if inspector is not None:
+            inspector(info.filename, content)
+        _append_entry(zipfh, info, data)
+        reused += was_reused
+
+    try:
+        with contextlib.ExitStack() as stack:
+            previous = _PreviousPackage(zippath, compression_level)
+            stack.callback(previous.close)
+            executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(workers))
+            zipfile_target = stack.enter_context(temp_zippath.open("wb"))
+            if stream is not None:
+                zipfile_target = _TeeWriter(zipfile_target, stream)
+            zipfh = stack.enter_context(zipfile.ZipFile(zipfile_target, "w"))
+            zipfh.comment = _COMMENT_TEMPLATE.format(compression_level).encode()
+            for name, filepath, filestat in files:
+                if filestat.st_mode & stat.S_IXUSR:
+                    mode = _EXECUTABLE_MODE
+                else:
+                    mode = _REGULAR_MODE
+                info = zipfile.ZipInfo(name, date_time=date_time)
+                info.create_system = 3  # Unix, so the permissions are honoured
+                info.external_attr = (stat.S_IFREG | mode) << 16
+                if filepath.suffix.lower() in STORED_SUFFIXES:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                pending.append(
+                    executor.submit(_compress_entry, info, filepath, compression_level, previous)
+                )
+
+                # keep the compressed content not yet written (in memory) bounded
+                while len(pending) >= workers * _PENDING_PER_WORKER:
+                    _write_next()
+            while pending:
+                _write_next()
+        os.replace(temp_zippath, zippath)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            temp_zippath.unlink()
+        raise
+    logger.debug("Reused %d of %d entries from the previous package.", reused, len(files))
+
+
+def get_file_sha256(filepath) -> str:
+    """Return the SHA-256 hex digest of the file's content."""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as fh:
+        for chunk in iter(lambda: fh.read(2 ** 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
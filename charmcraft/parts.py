@@ -28,7 +28,7 @@ from craft_parts.errors import PartsError
 from craft_parts.parts import PartSpec
 from xdg import BaseDirectory  # type: ignore
 
-from charmcraft import charm_builder
+from charmcraft import charm_builder, env
 from charmcraft.cmdbase import CommandError
 
 logger = logging.getLogger(__name__)
@@ -41,6 +41,15 @@ class CharmPluginProperties(plugins.PluginProperties, plugins.PluginModel):
     charm_entrypoint: str = ""  # TODO: add default after removing --entrypoint
     charm_python_packages: List[str] = []
     charm_requirements: List[str] = []
+    charm_dependencies_cache: bool = True
+    charm_compile_bytecode: bool = False
+    charm_prune: bool = False
+    charm_prune_keep: List[str] = []
+    charm_prune_remove: List[str] = []
+    charm_tree_shake: bool = False
+    charm_tree_shake_keep: List[str] = []
+    charm_ignore_stats: bool = False
+    charm_build_report: str = ""
 
     @classmethod
     def unmarshal(cls, data: Dict[str, Any]):
@@ -77,6 +86,51 @@ class CharmPlugin(plugins.Plugin):
         (list of strings)
         List of paths to requirements files.
 
+      - ``charm-dependencies-cache``
+        (boolean)
+        Whether to reuse the dependencies installed (and the wheels built) in
+        previous builds. Defaults to true; disabled by ``charmcraft pack --no-cache``.
+
+      - ``charm-compile-bytecode``
+        (boolean)
+        Whether to include the bytecode of the charm code and its dependencies,
+        so the units don't need to compile them when running hooks.
+
+      - ``charm-prune``
+        (boolean)
+        Whether to remove from the dependencies what is not needed to run the
+        charm (test suites, documentation, bytecode, installation records and
+        debug symbols).
+
+      - ``charm-prune-keep``
+        (list of strings)
+        Paths in the dependencies to never remove, in .jujuignore format.
+
+      - ``charm-prune-remove``
+        (list of strings)
+        Paths in the dependencies to also remove, in .jujuignore format.
+
+      - ``charm-tree-shake``
+        (boolean)
+        Whether to remove from the dependencies the modules that can not be
+        reached following the imports from the entrypoint and charm libraries.
+
+      - ``charm-tree-shake-keep``
+        (list of strings)
+        Modules (with everything under them) to always keep when tree shaking,
+        as they are imported dynamically.
+
+      - ``charm-ignore-stats``
+        (boolean)
+        Whether to report how much time each ignore rule took and which ones never
+        matched anything (shown when verbose). Defaults to false; enabled by
+        ``charmcraft pack --ignore-stats``.
+
+      - ``charm-build-report``
+        (string)
+        Where to write the report of the build phases; defaults to
+        ``charm-build-report.json`` in the part's directory.
+
     Extra files to be included in the charm payload must be listed under
     the ``prime`` file filter.
     """
@@ -136,6 +190,13 @@ class CharmPlugin(plugins.Plugin):
             str(self._part_info.part_install_dir),
         ]
 
+        if options.charm_dependencies_cache:
+            build_cmd.extend(["--cache-dir", str(self._part_info.cache_dir)])
+            if env.is_charmcraft_running_in_managed_mode():
+                # the host's wheelhouse is mounted there, shared by all the instances
+                wheelhouse_dir = env.get_managed_environment_wheelhouse_path()
+                build_cmd.extend(["--wheelhouse-dir", str(wheelhouse_dir)])
+
         if options.charm_entrypoint:
             entrypoint = self._part_info.part_build_dir / options.charm_entrypoint
             build_cmd.extend(["--entrypoint", str(entrypoint)])
@@ -146,6 +207,30 @@ class CharmPlugin(plugins.Plugin):
         for req in options.charm_requirements:
             build_cmd.extend(["-r", req])
 
+        if options.charm_compile_bytecode:
+            build_cmd.append("--compile-bytecode")
+
+        if options.charm_prune:
+            build_cmd.append("--prune")
+
+        for pattern in options.charm_prune_keep:
+            build_cmd.extend(["--prune-keep", pattern])
+
+        for pattern in options.charm_prune_remove:
+            build_cmd.extend(["--prune-remove", pattern])
+
+        if options.charm_tree_shake:
+            build_cmd.append("--tree-shake")
+
+        for module in options.charm_tree_shake_keep:
+            build_cmd.extend(["--tree-shake-keep", module])
+
+        if options.charm_ignore_stats:
+            build_cmd.append("--ignore-stats")
+
+        if options.charm_build_report:
+            build_cmd.extend(["--build-report", options.charm_build_report])
+
         commands = [" ".join(shlex.quote(i) for i in build_cmd)]
 
         return commands
@@ -278,6 +363,11 @@ class PartsLifecycle:
         """Return the parts prime directory path."""
         return self._lcm.project_info.prime_dir
 
+    @property
+    def parts_dir(self) -> pathlib.Path:
+        """Return the directory with the work directories of each part."""
+        return self._lcm.project_info.parts_dir
+
     def run(self, target_step: Step) -> None:
         """Run the parts lifecycle.
 
@@ -17,8 +17,9 @@
 """Provider support."""
 
 from ._buildd import CharmcraftBuilddBaseConfiguration  # noqa: F401
-from ._get_provider import get_provider  # noqa: F401
+from ._get_provider import get_keep_alive, get_lxd_remotes, get_provider  # noqa: F401
 from ._logs import capture_logs_from_instance  # noqa: F401
 from ._lxd import LXDProvider  # noqa: F401
 from ._multipass import MultipassProvider  # noqa: F401
-from ._provider import Provider  # noqa: F401
+from ._provider import Provider, parse_keep_alive  # noqa: F401
+from ._remotes import LXDRemote, RemoteScheduler, parse_lxd_remotes  # noqa: F401
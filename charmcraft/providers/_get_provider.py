@@ -19,6 +19,7 @@
 import logging
 import os
 import sys
+from typing import List
 
 from charmcraft.cmdbase import CommandError
 from charmcraft.env import is_charmcraft_running_from_snap, is_charmcraft_running_in_developer_mode
@@ -26,6 +27,8 @@ from charmcraft.snap import get_snap_configuration
 
 from ._lxd import LXDProvider
 from ._multipass import MultipassProvider
+from ._provider import parse_keep_alive
+from ._remotes import LXDRemote, parse_lxd_remotes
 
 logger = logging.getLogger(__name__)
 
@@ -64,8 +67,68 @@ def get_provider():
         provider = _get_platform_default_provider()
 
     if provider == "lxd":
-        return LXDProvider()
+        return LXDProvider(keep_alive=get_keep_alive())
     elif provider == "multipass":
-        return MultipassProvider()
+        return MultipassProvider(keep_alive=get_keep_alive())
 
     raise CommandError(f"Unsupported provider specified {provider!r}.")
+
+
+def get_lxd_remotes() -> List[LXDRemote]:
+    """Get the LXD remotes configured to distribute the builds in, if any.
+
+    (1) use the remotes specified with CHARMCRAFT_LXD_REMOTES if running
+        in developer mode,
+    (2) use the remotes specified with snap configuration if running
+        as snap,
+    (3) default to none (all builds are done locally).
+
+    :return: List of remotes, with their capacity.
+
+    :raises CommandError: if the configuration is not valid.
+    """
+    lxd_remotes = None
+
+    if is_charmcraft_running_in_developer_mode():
+        lxd_remotes = os.getenv("CHARMCRAFT_LXD_REMOTES")
+
+    if lxd_remotes is None and is_charmcraft_running_from_snap():
+        snap_config = get_snap_configuration()
+        lxd_remotes = snap_config.lxd_remotes if snap_config else None
+
+    if not lxd_remotes:
+        return []
+
+    try:
+        return parse_lxd_remotes(lxd_remotes)
+    except ValueError as error:
+        raise CommandError(f"Invalid LXD remotes configuration: {error}.")
+
+
+def get_keep_alive() -> int:
+    """Get how many minutes the instances are kept running after used.
+
+    (1) use the value specified with CHARMCRAFT_KEEP_ALIVE if running
+        in developer mode,
+    (2) use the value specified with snap configuration if running
+        as snap,
+    (3) default to zero (the instances are stopped right away).
+
+    :raises CommandError: if the configuration is not valid.
+    """
+    keep_alive = None
+
+    if is_charmcraft_running_in_developer_mode():
+        keep_alive = os.getenv("CHARMCRAFT_KEEP_ALIVE")
+
+    if keep_alive is None and is_charmcraft_running_from_snap():
+        snap_config = get_snap_configuration()
+        keep_alive = snap_config.keep_alive if snap_config else None
+
+    if keep_alive is None:
+        return 0
+
+    try:
+        return parse_keep_alive(keep_alive)
+    except ValueError as error:
+        raise CommandError(f"Invalid keep alive configuration: {error}.")
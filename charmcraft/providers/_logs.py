@@ -19,6 +19,7 @@
 import logging
 import pathlib
 import tempfile
+from typing import Optional
 
 from craft_providers import Executor
 
@@ -27,13 +28,32 @@ from charmcraft.env import get_managed_environment_log_path
 logger = logging.getLogger(__name__)
 
 
-def capture_logs_from_instance(instance: Executor) -> None:
+def _show_log(log_path: pathlib.Path) -> None:
+    """Log the content of the log captured from the instance."""
+    logger.debug("Logs captured from managed instance:")
+    with open(log_path, "rt", encoding="utf8") as fh:
+        for line in fh:
+            logger.debug(":: %s", line.rstrip())
+
+
+def capture_logs_from_instance(
+    instance: Executor, *, host_log_path: Optional[pathlib.Path] = None
+) -> None:
     """Retrieve logs from instance.
 
     :param instance: Instance to retrieve logs from.
+    :param host_log_path: Where the log is in the host, if it was written in a directory
+        mounted from it; then it's read there instead of being pulled from the instance.
 
     :returns: String of logs.
     """
+    if host_log_path is not None:
+        if not host_log_path.exists():
+            logger.debug("No logs found in instance.")
+            return
+        _show_log(host_log_path)
+        return
+
     # Get a temporary file path.
     tmp_file = tempfile.NamedTemporaryFile(delete=False, prefix="charmcraft-")
     tmp_file.close()
@@ -47,8 +67,5 @@ def capture_logs_from_instance(instance: Executor) -> None:
         logger.debug("No logs found in instance.")
         return
 
-    logger.debug("Logs captured from managed instance:")
-    with open(local_log_path, "rt", encoding="utf8") as fh:
-        for line in fh:
-            logger.debug(":: %s", line.rstrip())
+    _show_log(local_log_path)
     local_log_path.unlink()
@@ -18,15 +18,25 @@
 
 import contextlib
 import logging
+import os
 import pathlib
 import re
-from typing import List
+import subprocess
+import tarfile
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
 
 from craft_providers import bases, lxd
 
 from charmcraft.cmdbase import CommandError
 from charmcraft.config import Base
-from charmcraft.env import get_managed_environment_project_path
+from charmcraft.env import (
+    get_managed_environment_output_path,
+    get_managed_environment_project_path,
+    get_managed_environment_wheelhouse_path,
+)
+from charmcraft.jujuignore import JujuIgnore, default_juju_ignore
 from charmcraft.utils import confirm_with_user, get_host_architecture
 
 from ._buildd import BASE_CHANNEL_TO_BUILDD_IMAGE_ALIAS, CharmcraftBuilddBaseConfiguration
@@ -34,6 +44,92 @@ from ._provider import Provider
 
 logger = logging.getLogger(__name__)
 
+# What is not transferred from the project to instances in remotes (where it can not be
+# mounted): the build directory and the charms built (besides what the ignore rules exclude)
+_NOT_TRANSFERRED_DIRNAME = "build"
+_NOT_TRANSFERRED_SUFFIX = ".charm"
+
+# Instances may be launched from different threads (when packing for several bases at
+# the same time), but the image remote must be configured only once, the LXD project
+# created only once in each remote, and the instances for the same base launched one at a
+# time in each remote (as the first one publishes the snapshot the rest are created from)
+_image_remote_lock = threading.Lock()
+_launch_locks: Dict[Tuple[str, ...], threading.Lock] = {}
+_launch_locks_lock = threading.Lock()
+
+
+def _get_launch_lock(*key: str) -> threading.Lock:
+    """Get the lock to serialize what is done in LXD for the given key."""
+    with _launch_locks_lock:
+        return _launch_locks.setdefault(key, threading.Lock())
+
+
+def _ensure_project_exists(lxc: lxd.LXC, project: str, remote: str) -> None:
+    """Create the LXD project in the remote if it does not exist yet.
+
+    :raises LXDError: if the project can not be listed or created.
+    """
+    with _get_launch_lock("project", remote, project):
+        if project not in lxc.project_list(remote):
+            logger.debug("Creating LXD project %r in remote %r.", project, remote)
+            lxd.project.create_with_default_profile(lxc=lxc, project=project, remote=remote)
+
+
+def _get_transfer_filter(project_path: pathlib.Path):
+    """Get the filter for the project's tarball.
+
+    It excludes what is built in the project, and what the charm builder would ignore
+    anyway (following the default rules and the project's `.jujuignore`), except the
+    files in the project's root: those are the configuration the build itself needs
+    (`charmcraft.yaml`, `metadata.yaml`, requirements, the `.jujuignore` itself...).
+    """
+    ignore = JujuIgnore(default_juju_ignore, source="defaults")
+    jujuignore_path = project_path / ".jujuignore"
+    if jujuignore_path.exists():
+        with jujuignore_path.open("r", encoding="utf-8") as ignores:
+            ignore.extend_patterns(ignores, source=".jujuignore")
+
+    def _is_transferred(tarinfo):
+        name = os.path.normpath(tarinfo.name)
+        if name == ".":
+            return tarinfo
+        if name == _NOT_TRANSFERRED_DIRNAME or name.startswith(_NOT_TRANSFERRED_DIRNAME + "/"):
+            return None
+        if "/" not in name and tarinfo.isfile():
+            return None if name.endswith(_NOT_TRANSFERRED_SUFFIX) else tarinfo
+        if ignore.match(name, is_dir=tarinfo.isdir()):
+            return None
+        return tarinfo
+
+    return _is_transferred
+
+
+def _push_project(instance: lxd.LXDInstance, project_path: pathlib.Path) -> None:
+    """Transfer the project into the instance, replacing what may be there from before.
+
+    :raises CommandError: if the project can not be transferred.
+    """
+    target = get_managed_environment_project_path()
+    tarball_target = target.with_suffix(".tar")
+    with tempfile.TemporaryDirectory(prefix="charmcraft-") as tmpdir:
+        tarball = pathlib.Path(tmpdir) / "project.tar"
+        with tarfile.open(tarball, "w") as tar:
+            tar.add(project_path, arcname=".", filter=_get_transfer_filter(project_path))
+
+        logger.debug("Transferring project to instance %r.", instance.name)
+        try:
+            instance.execute_run(["rm", "-rf", target.as_posix()], check=True)
+            instance.execute_run(["mkdir", "-p", target.as_posix()], check=True)
+            instance.push_file(source=tarball, destination=tarball_target)
+            instance.execute_run(
+                ["tar", "-xf", tarball_target.as_posix(), "-C", target.as_posix()], check=True
+            )
+            instance.execute_run(["rm", tarball_target.as_posix()], check=True)
+        except (subprocess.CalledProcessError, FileNotFoundError, lxd.LXDError) as error:
+            raise CommandError(
+                f"Failed to transfer the project to the instance: {error}"
+            ) from error
+
 
 class LXDProvider(Provider):
     """Charmcraft's build environment provider.
@@ -41,6 +137,7 @@ class LXDProvider(Provider):
     :param lxc: Optional lxc client to use.
     :param lxd_project: LXD project to use (default is charmcraft).
     :param lxd_remote: LXD remote to use (default is local).
+    :param keep_alive: Minutes to keep the instances running after used (default none).
     """
 
     def __init__(
@@ -49,10 +146,17 @@ class LXDProvider(Provider):
         lxc: lxd.LXC = lxd.LXC(),
         lxd_project: str = "charmcraft",
         lxd_remote: str = "local",
+        keep_alive: int = 0,
     ) -> None:
         self.lxc = lxc
         self.lxd_project = lxd_project
         self.lxd_remote = lxd_remote
+        self.keep_alive = keep_alive
+
+    @property
+    def mounts_project(self) -> bool:
+        """Tell if the project is mounted in the instances (only possible if local)."""
+        return self.lxd_remote == "local"
 
     def clean_project_environments(
         self,
@@ -146,6 +250,8 @@ class LXDProvider(Provider):
         base: Base,
         bases_index: int,
         build_on_index: int,
+        output_path: Optional[pathlib.Path] = None,
+        wheelhouse_path: Optional[pathlib.Path] = None,
     ):
         """Launch environment for specified base.
 
@@ -154,6 +260,10 @@ class LXDProvider(Provider):
         :param base: Base to create.
         :param bases_index: Index of `bases:` entry.
         :param build_on_index: Index of `build-on` within bases entry.
+        :param output_path: Host directory to also mount in the instance, for the results
+            to be written there directly, if any.
+        :param wheelhouse_path: Host wheelhouse to also mount in the instance, for the wheels
+            built from source to be shared between instances, if any.
         """
         alias = BASE_CHANNEL_TO_BUILDD_IMAGE_ALIAS[base.channel]
         target_arch = get_host_architecture()
@@ -168,7 +278,8 @@ class LXDProvider(Provider):
 
         environment = self.get_command_environment()
         try:
-            image_remote = lxd.configure_buildd_image_remote()
+            with _image_remote_lock:
+                image_remote = lxd.configure_buildd_image_remote()
         except lxd.LXDError as error:
             raise CommandError(str(error)) from error
 
@@ -176,30 +287,50 @@ class LXDProvider(Provider):
             alias=alias, environment=environment, hostname=instance_name
         )
         try:
-            instance = lxd.launch(
-                name=instance_name,
-                base_configuration=base_configuration,
-                image_name=base.channel,
-                image_remote=image_remote,
-                auto_clean=True,
-                auto_create_project=True,
-                map_user_uid=True,
-                use_snapshots=True,
-                project=self.lxd_project,
-                remote=self.lxd_remote,
-            )
+            _ensure_project_exists(self.lxc, self.lxd_project, self.lxd_remote)
+            with _get_launch_lock("launch", self.lxd_remote, self.lxd_project, base.channel):
+                instance = lxd.launch(
+                    name=instance_name,
+                    base_configuration=base_configuration,
+                    image_name=base.channel,
+                    image_remote=image_remote,
+                    auto_clean=True,
+                    auto_create_project=True,
+                    # the host's user only exists (and owns the mounted files) if local
+                    map_user_uid=self.mounts_project,
+                    use_snapshots=True,
+                    project=self.lxd_project,
+                    remote=self.lxd_remote,
+                )
         except (bases.BaseConfigurationError, lxd.LXDError) as error:
             raise CommandError(str(error)) from error
-
-        # Mount project.
-        instance.mount(host_source=project_path, target=get_managed_environment_project_path())
+        self.resume_kept_alive(instance)
 
         try:
+            # Mount project (or transfer it, as a remote can not reach the host's files).
+            if self.mounts_project:
+                instance.mount(
+                    host_source=project_path, target=get_managed_environment_project_path()
+                )
+                if output_path is not None:
+                    instance.mount(
+                        host_source=output_path, target=get_managed_environment_output_path()
+                    )
+                if wheelhouse_path is not None:
+                    instance.mount(
+                        host_source=wheelhouse_path,
+                        target=get_managed_environment_wheelhouse_path(),
+                    )
+            else:
+                _push_project(instance, project_path)
+
             yield instance
         finally:
-            # Ensure to unmount everything and stop instance upon completion.
+            # Ensure to unmount everything and stop instance upon completion (unless
+            # it's kept running for the next packs).
             try:
                 instance.unmount_all()
-                instance.stop()
+                if not self.schedule_stop(instance):
+                    instance.stop()
             except lxd.LXDError as error:
                 raise CommandError(str(error)) from error
@@ -20,14 +20,18 @@ import contextlib
 import logging
 import pathlib
 import re
-from typing import List
+from typing import List, Optional
 
 from craft_providers import bases, multipass
 from craft_providers.multipass.errors import MultipassError
 
 from charmcraft.cmdbase import CommandError
 from charmcraft.config import Base
-from charmcraft.env import get_managed_environment_project_path
+from charmcraft.env import (
+    get_managed_environment_output_path,
+    get_managed_environment_project_path,
+    get_managed_environment_wheelhouse_path,
+)
 from charmcraft.utils import confirm_with_user, get_host_architecture
 
 from ._buildd import BASE_CHANNEL_TO_BUILDD_IMAGE_ALIAS, CharmcraftBuilddBaseConfiguration
@@ -40,14 +44,17 @@ class MultipassProvider(Provider):
     """Charmcraft's build environment provider.
 
     :param multipass: Optional Multipass client to use.
+    :param keep_alive: Minutes to keep the instances running after used (default none).
     """
 
     def __init__(
         self,
         *,
         multipass: multipass.Multipass = multipass.Multipass(),
+        keep_alive: int = 0,
     ) -> None:
         self.multipass = multipass
+        self.keep_alive = keep_alive
 
     def clean_project_environments(
         self,
@@ -140,6 +147,8 @@ class MultipassProvider(Provider):
         base: Base,
         bases_index: int,
         build_on_index: int,
+        output_path: Optional[pathlib.Path] = None,
+        wheelhouse_path: Optional[pathlib.Path] = None,
     ):
         """Launch environment for specified base.
 
@@ -148,6 +157,10 @@ class MultipassProvider(Provider):
         :param base: Base to create.
         :param bases_index: Index of `bases:` entry.
         :param build_on_index: Index of `build-on` within bases entry.
+        :param output_path: Host directory to also mount in the instance, for the results
+            to be written there directly, if any.
+        :param wheelhouse_path: Host wheelhouse to also mount in the instance, for the wheels
+            built from source to be shared between instances, if any.
         """
         alias = BASE_CHANNEL_TO_BUILDD_IMAGE_ALIAS[base.channel]
         target_arch = get_host_architecture()
@@ -177,19 +190,30 @@ class MultipassProvider(Provider):
             )
         except (bases.BaseConfigurationError, MultipassError) as error:
             raise CommandError(str(error)) from error
+        self.resume_kept_alive(instance)
 
         try:
-            # Mount project.
+            # Mount project, and the output directory and wheelhouse if any.
             instance.mount(host_source=project_path, target=get_managed_environment_project_path())
+            if output_path is not None:
+                instance.mount(
+                    host_source=output_path, target=get_managed_environment_output_path()
+                )
+            if wheelhouse_path is not None:
+                instance.mount(
+                    host_source=wheelhouse_path, target=get_managed_environment_wheelhouse_path()
+                )
         except MultipassError as error:
             raise CommandError(str(error)) from error
 
         try:
             yield instance
         finally:
-            # Ensure to unmount everything and stop instance upon completion.
+            # Ensure to unmount everything and stop instance upon completion (unless
+            # it's kept running for the next packs).
             try:
                 instance.unmount_all()
-                instance.stop()
+                if not self.schedule_stop(instance):
+                    instance.stop()
             except MultipassError as error:
                 raise CommandError(str(error)) from error
@@ -20,10 +20,11 @@ import contextlib
 import logging
 import os
 import pathlib
+import subprocess
 from abc import ABC, abstractmethod
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-from craft_providers import bases
+from craft_providers import Executor, bases
 
 from charmcraft.config import Base
 from charmcraft.utils import get_host_architecture
@@ -36,9 +37,63 @@ BASE_CHANNEL_TO_BUILDD_IMAGE_ALIAS = {
 }
 
 
+def parse_keep_alive(value) -> int:
+    """Parse the configuration of how many minutes the instances are kept running.
+
+    :raises ValueError: if the configuration is not valid.
+    """
+    try:
+        keep_alive = int(value)
+    except (TypeError, ValueError):
+        keep_alive = -1
+    if keep_alive < 0:
+        raise ValueError(f"{value!r} is not a number of minutes")
+    return keep_alive
+
+
 class Provider(ABC):
     """Charmcraft's build environment provider."""
 
+    # if the project is mounted in the instances (otherwise it's transferred into them,
+    # and what is built there needs to be always retrieved)
+    mounts_project = True
+
+    # how many minutes the instances are kept running after being used, so the next packs
+    # do not need to start them again (they stop by themselves if not used meanwhile);
+    # if zero, they are stopped right away
+    keep_alive = 0
+
+    def resume_kept_alive(self, instance: Executor) -> None:
+        """Cancel the scheduled stop of the instance, if it was kept running from before."""
+        if not self.keep_alive:
+            return
+        instance.execute_run(
+            ["shutdown", "-c"],
+            check=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+    def schedule_stop(self, instance: Executor) -> bool:
+        """Keep the instance running, scheduling it to stop if not used again meanwhile.
+
+        :returns: If it's kept running (otherwise it needs to be stopped now).
+        """
+        if not self.keep_alive:
+            return False
+        try:
+            instance.execute_run(
+                ["shutdown", "--poweroff", f"+{self.keep_alive}"],
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError as error:
+            logger.debug("Cannot keep the instance running: %r", error)
+            return False
+        logger.debug("Instance kept running for %d minutes.", self.keep_alive)
+        return True
+
     @abstractmethod
     def clean_project_environments(
         self,
@@ -68,7 +123,7 @@ class Provider(ABC):
         env["CHARMCRAFT_MANAGED_MODE"] = "1"
 
         # Pass-through host environment that target may need.
-        for env_key in ["http_proxy", "https_proxy", "no_proxy"]:
+        for env_key in ["http_proxy", "https_proxy", "no_proxy", "SOURCE_DATE_EPOCH"]:
             if env_key in os.environ:
                 env[env_key] = os.environ[env_key]
 
@@ -156,6 +211,8 @@ class Provider(ABC):
         base: Base,
         bases_index: int,
         build_on_index: int,
+        output_path: Optional[pathlib.Path] = None,
+        wheelhouse_path: Optional[pathlib.Path] = None,
     ):
         """Launch environment for specified base.
 
@@ -164,4 +221,8 @@ class Provider(ABC):
         :param base: Base to create.
         :param bases_index: Index of `bases:` entry.
         :param build_on_index: Index of `build-on` within bases entry.
+        :param output_path: Host directory to also mount in the instance, for the results
+            to be written there directly, if any.
+        :param wheelhouse_path: Host wheelhouse to also mount in the instance, for the wheels
+            built from source to be shared between instances, if any.
         """
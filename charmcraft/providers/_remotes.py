@@ -0,0 +1,109 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+"""Distribution of the builds across LXD remotes."""
+
+import contextlib
+import logging
+import threading
+from collections import namedtuple
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+LXDRemote = namedtuple("LXDRemote", "name capacity")
+
+
+def parse_lxd_remotes(value: str) -> List[LXDRemote]:
+    """Parse the configuration of the LXD remotes to build in.
+
+    It's a comma separated list of remote names (as known by the `lxc` client), each
+    optionally followed by a colon and its capacity: how many builds can run there at
+    the same time (one by default). E.g.: "buildhost1:4,buildhost2".
+
+    :raises ValueError: if the configuration is not valid.
+    """
+    remotes = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, capacity = item.partition(":")
+        name = name.strip()
+        if not name:
+            raise ValueError(f"missing LXD remote name in {item!r}")
+        if any(remote.name == name for remote in remotes):
+            raise ValueError(f"LXD remote {name!r} is duplicated")
+        if capacity:
+            try:
+                capacity = int(capacity)
+            except ValueError:
+                capacity = 0
+            if capacity < 1:
+                raise ValueError(f"invalid capacity for LXD remote {name!r} (must be >= 1)")
+        else:
+            capacity = 1
+        remotes.append(LXDRemote(name, capacity))
+    return remotes
+
+
+class RemoteScheduler:
+    """Assign the builds to the LXD remotes, the least loaded first.
+
+    The load of a remote is how many builds it's running relative to its capacity (ties
+    are resolved in the configured order); when all of them are at full capacity it waits
+    for one to be released. It's safe to use it from different threads.
+
+    :param remotes: The remotes to distribute the builds in.
+    """
+
+    def __init__(self, remotes: List[LXDRemote]):
+        self.remotes = remotes
+        self.running = {remote.name: 0 for remote in remotes}
+        self._condition = threading.Condition()
+
+    def acquire(self) -> LXDRemote:
+        """Return the remote to run a build in, waiting if all of them are busy."""
+        with self._condition:
+            while True:
+                available = [
+                    remote
+                    for remote in self.remotes
+                    if self.running[remote.name] < remote.capacity
+                ]
+                if available:
+                    remote = min(
+                        available, key=lambda remote: self.running[remote.name] / remote.capacity
+                    )
+                    self.running[remote.name] += 1
+                    logger.debug("Building in LXD remote %r.", remote.name)
+                    return remote
+                self._condition.wait()
+
+    def release(self, remote: LXDRemote) -> None:
+        """Indicate that a build in the remote finished."""
+        with self._condition:
+            self.running[remote.name] -= 1
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def reserved(self):
+        """Provide a remote to run a build in, for the duration of the context."""
+        remote = self.acquire()
+        try:
+            yield remote
+        finally:
+            self.release(remote)
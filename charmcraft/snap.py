@@ -18,7 +18,7 @@
 
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Union
 
 import snaphelpers
 
@@ -30,6 +30,10 @@ class CharmcraftSnapConfiguration:
     """Charmcraft's snap configuration options."""
 
     provider: Optional[str] = None
+    lxd_remotes: Optional[str] = None
+    shared_cache: Optional[str] = None
+    build_agent: Optional[Union[bool, str]] = None
+    keep_alive: Optional[Union[int, str]] = None
 
 
 def _get_config_key(*, snap_config: snaphelpers.SnapConfig, key: str, default=None):
@@ -50,8 +54,18 @@ def get_snap_configuration() -> CharmcraftSnapConfiguration:
     """
     snap_config = snaphelpers.SnapConfig()
     provider = _get_config_key(snap_config=snap_config, key="provider")
+    lxd_remotes = _get_config_key(snap_config=snap_config, key="lxd-remotes")
+    shared_cache = _get_config_key(snap_config=snap_config, key="shared-cache")
+    build_agent = _get_config_key(snap_config=snap_config, key="build-agent")
+    keep_alive = _get_config_key(snap_config=snap_config, key="keep-alive")
 
-    return CharmcraftSnapConfiguration(provider=provider)
+    return CharmcraftSnapConfiguration(
+        provider=provider,
+        lxd_remotes=lxd_remotes,
+        shared_cache=shared_cache,
+        build_agent=build_agent,
+        keep_alive=keep_alive,
+    )
 
 
 def validate_snap_configuration(cfg: CharmcraftSnapConfiguration):
@@ -61,3 +75,23 @@ def validate_snap_configuration(cfg: CharmcraftSnapConfiguration):
     """
     if cfg.provider is not None and cfg.provider not in ["lxd", "multipass"]:
         raise ValueError(f"provider {cfg.provider!r} is not supported")
+
+    if cfg.lxd_remotes is not None:
+        from charmcraft.providers import parse_lxd_remotes  # import here to avoid cyclic imports
+
+        parse_lxd_remotes(cfg.lxd_remotes)
+
+    if cfg.shared_cache is not None:
+        from charmcraft.buildcache import parse_shared_cache  # import here to avoid cyclic imports
+
+        parse_shared_cache(cfg.shared_cache)
+
+    if cfg.build_agent is not None:
+        from charmcraft.agent import parse_build_agent  # import here to avoid cyclic imports
+
+        parse_build_agent(cfg.build_agent)
+
+    if cfg.keep_alive is not None:
+        from charmcraft.providers import parse_keep_alive  # import here to avoid cyclic imports
+
+        parse_keep_alive(cfg.keep_alive)
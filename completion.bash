@@ -43,6 +43,7 @@ _charmcraft()
         upload 
         upload-resource
         version 
+        wheelhouse
         whoami
     )
     _init_completion || return
@@ -108,7 +109,7 @@ _charmcraft()
                     _filedir py
                     ;;
                 *)
-                    COMPREPLY=( $(compgen -W "${globals[*]} --entrypoint --requirement --force" -- "$cur") )
+                    COMPREPLY=( $(compgen -W "${globals[*]} --entrypoint --requirement --force --jobs --compression-level --no-cache --ignore-stats --upload --release" -- "$cur") )
                     ;;
             esac
             ;;
@@ -121,6 +122,9 @@ _charmcraft()
         upload)
             COMPREPLY=( $(compgen -W "${globals[*]} --release --resource" -- "$cur") )
             ;;
+        wheelhouse)
+            COMPREPLY=( $(compgen -W "${globals[*]} --prune --older-than" -- "$cur") )
+            ;;
         upload-resource)
             case "$prev" in
                 --filepath)
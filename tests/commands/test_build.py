@@ -14,24 +14,29 @@
 #
 # For further info, check https://github.com/canonical/charmcraft
 
+import json
 import logging
 import os
 import pathlib
 import re
+import shutil
 import subprocess
 import sys
+import threading
 import zipfile
 from collections import namedtuple
 from textwrap import dedent
 from typing import List
 from unittest import mock
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
 
 import pytest
 import yaml
 
 from charmcraft import linters
+from charmcraft.agent import get_agent_client_command
 from charmcraft.bases import get_host_as_base
+from charmcraft.buildcache import FilesystemSharedCache, hash_project_tree
 from charmcraft.cmdbase import CommandError
 from charmcraft.commands.build import (
     BUILD_DIRNAME,
@@ -39,12 +44,31 @@ from charmcraft.commands.build import (
     Builder,
     Validator,
     format_charm_file_name,
+    get_concurrent_jobs,
     launch_shell,
     relativise,
 )
 from charmcraft.config import Base, BasesConfiguration, load
 from charmcraft.logsetup import message_handler
 from charmcraft.metadata import CHARM_METADATA
+from charmcraft.package import COMPRESSION_LEVEL
+from charmcraft.providers import LXDProvider, LXDRemote
+
+
+def get_instance_env(channel="18.04"):
+    """Return the environment of the pack in the instance, to leave its log in the project."""
+    host_arch = get_host_as_base().architectures[0]
+    charm_name = f"name-from-metadata_ubuntu-{channel}-{host_arch}.charm"
+    return {"CHARMCRAFT_MANAGED_LOG_PATH": f"/root/project/build/{charm_name}.log"}
+
+
+def get_instance_report_path(project_dir):
+    """Return where the build in the instance leaves its report, for the host base."""
+    host_base = get_host_as_base()
+    charm_name = "name-from-metadata_{}-{}-{}.charm".format(
+        host_base.name, host_base.channel, host_base.architectures[0]
+    )
+    return str(project_dir / "build" / f"{charm_name}.build-report.json")
 
 
 def get_builder(
@@ -57,6 +81,10 @@ def get_builder(
     debug=False,
     shell=False,
     shell_after=False,
+    jobs=1,
+    compression_level=COMPRESSION_LEVEL,
+    no_cache=False,
+    ignore_stats=False,
 ):
     if project_dir is None:
         project_dir = config.project.dirpath
@@ -76,6 +104,10 @@ def get_builder(
             "requirement": requirement,
             "shell": shell,
             "shell_after": shell_after,
+            "jobs": jobs,
+            "compression_level": compression_level,
+            "no_cache": no_cache,
+            "ignore_stats": ignore_stats,
         },
         config,
     )
@@ -495,6 +527,38 @@ def test_validator_force(config, inp_value, out_value):
     assert result == out_value
 
 
+@pytest.mark.parametrize("inp_value,out_value", [(None, 1), (1, 1), (4, 4)])
+def test_validator_jobs(config, inp_value, out_value):
+    """'jobs' param: one by default."""
+    validator = Validator(config)
+    assert validator.validate_jobs(inp_value) == out_value
+
+
+@pytest.mark.parametrize("value", [0, -2])
+def test_validator_jobs_invalid(config, value):
+    """'jobs' param: needs to be positive."""
+    validator = Validator(config)
+    with pytest.raises(CommandError) as cm:
+        validator.validate_jobs(value)
+    assert str(cm.value) == f"The number of jobs '{value}' is invalid (must be >= 1)."
+
+
+@pytest.mark.parametrize("inp_value,out_value", [(None, 6), (0, 0), (9, 9)])
+def test_validator_compression_level(config, inp_value, out_value):
+    """'compression_level' param: the default one if not specified."""
+    validator = Validator(config)
+    assert validator.validate_compression_level(inp_value) == out_value
+
+
+@pytest.mark.parametrize("value", [-1, 10])
+def test_validator_compression_level_invalid(config, value):
+    """'compression_level' param: needs to be in the zlib range."""
+    validator = Validator(config)
+    with pytest.raises(CommandError) as cm:
+        validator.validate_compression_level(value)
+    assert str(cm.value) == f"The compression level '{value}' is invalid (must be 0 to 9)."
+
+
 # --- (real) build tests
 
 
@@ -604,11 +668,14 @@ def test_build_checks_provider(basic_project, mock_provider):
 
 
 def test_build_with_debug_no_error(
+    basic_project,
     basic_project_builder,
     mock_linters,
     mock_parts,
     mock_launch_shell,
+    monkeypatch,
 ):
+    monkeypatch.chdir(basic_project)  # not leave the built charm around
     host_base = get_host_as_base()
     builder = basic_project_builder(
         [BasesConfiguration(**{"build-on": [host_base], "run-on": [host_base]})],
@@ -654,11 +721,14 @@ def test_build_with_shell(basic_project_builder, mock_parts, mock_provider, mock
 
 
 def test_build_with_shell_after(
+    basic_project,
     basic_project_builder,
     mock_linters,
     mock_parts,
     mock_launch_shell,
+    monkeypatch,
 ):
+    monkeypatch.chdir(basic_project)  # not leave the built charm around
     host_base = get_host_as_base()
     builder = basic_project_builder(
         [BasesConfiguration(**{"build-on": [host_base], "run-on": [host_base]})],
@@ -782,6 +852,7 @@ def test_build_project_is_cwd(
     mock_instance,
     mock_provider,
     monkeypatch,
+    wheelhouse_dir,
 ):
     """Test cases for base-index parameter."""
     mode = message_handler.NORMAL
@@ -820,6 +891,8 @@ def test_build_project_is_cwd(
             base=Base(name="ubuntu", channel="18.04", architectures=[host_arch]),
             bases_index=0,
             build_on_index=0,
+            output_path=None,
+            wheelhouse_path=wheelhouse_dir,
         ),
     ]
     assert mock_instance.mock_calls == [
@@ -827,6 +900,7 @@ def test_build_project_is_cwd(
             ["charmcraft", "pack", "--bases-index", "0"],
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env(),
         ),
     ]
 
@@ -838,8 +912,9 @@ def test_build_project_is_not_cwd(
     mock_instance,
     mock_provider,
     monkeypatch,
+    wheelhouse_dir,
 ):
-    """Test cases for base-index parameter."""
+    """The charm is written in the current directory, mounted in the instance."""
     mode = message_handler.NORMAL
     monkeypatch.setattr(message_handler, "mode", mode)
     host_base = get_host_as_base()
@@ -875,17 +950,16 @@ def test_build_project_is_not_cwd(
             base=Base(name="ubuntu", channel="18.04", architectures=[host_arch]),
             bases_index=0,
             build_on_index=0,
+            output_path=pathlib.Path.cwd(),
+            wheelhouse_path=wheelhouse_dir,
         ),
     ]
     assert mock_instance.mock_calls == [
         call.execute_run(
             ["charmcraft", "pack", "--bases-index", "0"],
             check=True,
-            cwd=pathlib.Path("/root"),
-        ),
-        call.pull_file(
-            source=pathlib.Path("/root") / zipnames[0],
-            destination=pathlib.Path.cwd() / zipnames[0],
+            cwd=pathlib.Path("/root/output"),
+            env=get_instance_env(),
         ),
     ]
 
@@ -908,6 +982,7 @@ def test_build_bases_index_scenarios_provider(
     mock_instance,
     mock_provider,
     monkeypatch,
+    wheelhouse_dir,
 ):
     """Test cases for base-index parameter."""
     monkeypatch.setattr(message_handler, "mode", mode)
@@ -951,6 +1026,8 @@ def test_build_bases_index_scenarios_provider(
             base=Base(name="ubuntu", channel="18.04", architectures=[host_arch]),
             bases_index=0,
             build_on_index=0,
+            output_path=None,
+            wheelhouse_path=wheelhouse_dir,
         ),
     ]
     assert mock_instance.mock_calls == [
@@ -958,6 +1035,7 @@ def test_build_bases_index_scenarios_provider(
             ["charmcraft", "pack", "--bases-index", "0"] + cmd_flags,
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env(),
         ),
     ]
     assert f"Packing charm 'name-from-metadata_ubuntu-18.04-{host_arch}.charm'..." in [
@@ -981,6 +1059,8 @@ def test_build_bases_index_scenarios_provider(
             base=Base(name="ubuntu", channel="20.04", architectures=[host_arch]),
             bases_index=1,
             build_on_index=0,
+            output_path=None,
+            wheelhouse_path=wheelhouse_dir,
         ),
     ]
     assert mock_instance.mock_calls == [
@@ -988,6 +1068,7 @@ def test_build_bases_index_scenarios_provider(
             ["charmcraft", "pack", "--bases-index", "1"] + cmd_flags,
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env("20.04"),
         ),
     ]
     mock_provider.reset_mock()
@@ -1012,6 +1093,8 @@ def test_build_bases_index_scenarios_provider(
             base=Base(name="ubuntu", channel="18.04", architectures=[host_arch]),
             bases_index=0,
             build_on_index=0,
+            output_path=None,
+            wheelhouse_path=wheelhouse_dir,
         ),
         call.launched_environment(
             charm_name="name-from-metadata",
@@ -1019,6 +1102,8 @@ def test_build_bases_index_scenarios_provider(
             base=Base(name="ubuntu", channel="20.04", architectures=[host_arch]),
             bases_index=1,
             build_on_index=0,
+            output_path=None,
+            wheelhouse_path=wheelhouse_dir,
         ),
     ]
     assert mock_instance.mock_calls == [
@@ -1026,11 +1111,13 @@ def test_build_bases_index_scenarios_provider(
             ["charmcraft", "pack", "--bases-index", "0"] + cmd_flags,
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env(),
         ),
         call.execute_run(
             ["charmcraft", "pack", "--bases-index", "1"] + cmd_flags,
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env("20.04"),
         ),
     ]
     mock_provider.reset_mock()
@@ -1063,9 +1150,17 @@ def test_build_bases_index_scenarios_provider(
             ["charmcraft", "pack", "--bases-index", "0"] + cmd_flags,
             check=True,
             cwd=pathlib.Path("/root/project"),
+            env=get_instance_env(),
         ),
     ]
-    assert mock_capture_logs_from_instance.mock_calls == [call(mock_instance)]
+    assert mock_capture_logs_from_instance.mock_calls == [
+        call(
+            mock_instance,
+            host_log_path=(
+                basic_project / "build" / f"name-from-metadata_ubuntu-18.04-{host_arch}.charm.log"
+            ),
+        )
+    ]
 
 
 @pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
@@ -1270,6 +1365,284 @@ def test_build_package_name(tmp_path, monkeypatch, config):
     assert zipname == "name-from-metadata.charm"
 
 
+def test_build_package_compression_level(tmp_path, monkeypatch, config):
+    """The package is compressed with the indicated level."""
+    to_be_zipped_dir = tmp_path / BUILD_DIRNAME
+    to_be_zipped_dir.mkdir()
+    metadata_file = tmp_path / "metadata.yaml"
+    metadata_file.write_text("name: name-from-metadata")
+
+    monkeypatch.chdir(tmp_path)
+    builder = get_builder(config, entrypoint="whatever", compression_level=9)
+    with patch("charmcraft.commands.build.build_zip") as mock_build_zip:
+        zipname = builder.handle_package(to_be_zipped_dir)
+
+    mock_build_zip.assert_called_once_with(zipname, to_be_zipped_dir, 9)
+
+
+def test_build_package_streamed_upload(tmp_path, monkeypatch, config):
+    """When uploading while packing, the package is written and inspected for the upload."""
+    to_be_zipped_dir = tmp_path / BUILD_DIRNAME
+    to_be_zipped_dir.mkdir()
+    (to_be_zipped_dir / "metadata.yaml").write_text("name: name-from-metadata")
+    metadata_file = tmp_path / "metadata.yaml"
+    metadata_file.write_text("name: name-from-metadata")
+
+    monkeypatch.chdir(tmp_path)
+    builder = get_builder(config, entrypoint="whatever")
+    builder.uploads = MagicMock()
+    upload = builder.uploads.stream.return_value.__enter__.return_value
+    zipname = builder.handle_package(to_be_zipped_dir)
+
+    builder.uploads.stream.assert_called_once_with(zipname)
+    assert upload.inspector.mock_calls == [call("metadata.yaml", b"name: name-from-metadata")]
+    written = b"".join(write_call.args[0] for write_call in upload.write.mock_calls)
+    assert written == (tmp_path / zipname).read_bytes()
+
+
+def test_build_compression_level_in_instance(
+    basic_project, mock_instance, mock_provider, monkeypatch
+):
+    """A non default compression level is passed to the packing in the instance."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    builder = get_builder(config, compression_level=1)
+
+    builder.run([0])
+
+    assert mock_instance.execute_run.mock_calls[0] == call(
+        ["charmcraft", "pack", "--bases-index", "0", "--compression-level", "1"],
+        check=True,
+        cwd=pathlib.Path("/root/project"),
+        env=get_instance_env("20.04"),
+    )
+
+
+def test_build_no_cache_in_instance(basic_project, mock_instance, mock_provider, monkeypatch):
+    """Not using the caches is also requested to the packing in the instance."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    builder = get_builder(config, no_cache=True)
+
+    builder.run([0])
+
+    assert mock_instance.execute_run.mock_calls[0] == call(
+        ["charmcraft", "pack", "--bases-index", "0", "--no-cache"],
+        check=True,
+        cwd=pathlib.Path("/root/project"),
+        env=get_instance_env("20.04"),
+    )
+    # neither the host's wheelhouse is shared with the instance
+    assert mock_provider.launched_environment.call_args.kwargs["wheelhouse_path"] is None
+
+
+def test_build_wheelhouse_shared(
+    basic_project, mock_instance, mock_provider, monkeypatch, wheelhouse_dir
+):
+    """The host's wheelhouse is created if needed and shared with the instance."""
+    monkeypatch.chdir(basic_project)
+    wheelhouse_dir.rmdir()
+    config = load(basic_project)
+    builder = get_builder(config)
+
+    builder.run([0])
+
+    assert wheelhouse_dir.is_dir()
+    assert mock_provider.launched_environment.call_args.kwargs["wheelhouse_path"] == wheelhouse_dir
+
+
+def test_build_wheelhouse_not_shared_in_remote(
+    basic_project, mock_instance, mock_provider, monkeypatch
+):
+    """The host's wheelhouse is not shared with instances that can not mount it."""
+    monkeypatch.chdir(basic_project)
+    mock_provider.mounts_project = False
+    config = load(basic_project)
+    builder = get_builder(config)
+
+    builder.run([0])
+
+    assert mock_provider.launched_environment.call_args.kwargs["wheelhouse_path"] is None
+
+
+def test_build_instance_log_in_project(
+    basic_project, mock_capture_logs_from_instance, mock_instance, mock_provider, monkeypatch
+):
+    """The log of the pack in the instance is left in the mounted project's build directory."""
+    monkeypatch.chdir(basic_project)
+    config = load(basic_project)
+    builder = get_builder(config)
+    mock_instance.execute_run.side_effect = subprocess.CalledProcessError(-1, ["charmcraft"])
+
+    with pytest.raises(CommandError):
+        builder.run([0])
+
+    assert (basic_project / "build").is_dir()
+    assert mock_instance.execute_run.call_args.kwargs["env"] == get_instance_env("20.04")
+    log_name = pathlib.Path(get_instance_env("20.04")["CHARMCRAFT_MANAGED_LOG_PATH"]).name
+    assert mock_capture_logs_from_instance.mock_calls == [
+        call(mock_instance, host_log_path=basic_project / "build" / log_name)
+    ]
+
+
+def test_build_instance_log_not_in_remote(
+    basic_project, mock_capture_logs_from_instance, mock_instance, mock_provider, monkeypatch
+):
+    """The log of the pack in instances that can not mount the project is left there."""
+    monkeypatch.chdir(basic_project)
+    mock_provider.mounts_project = False
+    config = load(basic_project)
+    builder = get_builder(config)
+    mock_instance.execute_run.side_effect = subprocess.CalledProcessError(-1, ["charmcraft"])
+
+    with pytest.raises(CommandError):
+        builder.run([0])
+
+    assert mock_instance.execute_run.call_args.kwargs["env"] is None
+    assert mock_capture_logs_from_instance.mock_calls == [call(mock_instance, host_log_path=None)]
+
+
+def test_build_report_in_project_managed_mode(basic_project, monkeypatch):
+    """In a managed environment the report is left (and shown) in the project's build dir."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+    config = load(basic_project)
+    builder = get_builder(config)
+    bases_config = config.bases[0]
+
+    with patch("charmcraft.parts.PartsLifecycle", autospec=True):
+        with patch.object(builder, "show_build_report") as mock_show:
+            with patch.object(builder, "handle_package", return_value="test.charm"):
+                with patch("charmcraft.commands.build.linters.analyze", return_value=[]):
+                    with patch("charmcraft.commands.build.create_manifest"):
+                        with patch("charmcraft.commands.build.get_file_sha256"):
+                            builder.build_charm(bases_config)
+
+    charm_name = format_charm_file_name("name-from-metadata", bases_config)
+    report_path = basic_project / "build" / f"{charm_name}.build-report.json"
+    assert builder._charm_part["charm-build-report"] == str(report_path)
+    assert mock_show.call_args.args[0] == report_path
+
+
+def test_build_no_cache_dependencies(basic_project, monkeypatch):
+    """Not using the caches disables the charm dependencies cache."""
+    host_base = get_host_as_base()
+    charmcraft_file = basic_project / "charmcraft.yaml"
+    charmcraft_file.write_text(
+        dedent(
+            f"""\
+                type: charm
+                bases:
+                  - build-on:
+                      - name: {host_base.name!r}
+                        channel: {host_base.channel!r}
+                    run-on:
+                      - name: {host_base.name!r}
+                        channel: {host_base.channel!r}
+                """
+        )
+    )
+    config = load(basic_project)
+    monkeypatch.chdir(basic_project)
+    builder = get_builder(config, no_cache=True)
+
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+    with patch("charmcraft.parts.PartsLifecycle", autospec=True) as mock_lifecycle:
+        mock_lifecycle.side_effect = SystemExit()
+        with pytest.raises(SystemExit):
+            builder.run([0])
+    (parts_config,) = mock_lifecycle.call_args[0]
+    assert parts_config["charm"]["charm-dependencies-cache"] is False
+
+
+def test_build_ignore_stats_in_instance(basic_project, mock_instance, mock_provider, monkeypatch):
+    """The ignore rules statistics are also requested to the packing in the instance."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    builder = get_builder(config, ignore_stats=True)
+
+    builder.run([0])
+
+    assert mock_instance.execute_run.mock_calls[0] == call(
+        ["charmcraft", "pack", "--bases-index", "0", "--ignore-stats"],
+        check=True,
+        cwd=pathlib.Path("/root/project"),
+        env=get_instance_env("20.04"),
+    )
+
+
+@pytest.mark.parametrize("ignore_stats", [False, True])
+def test_build_ignore_stats_part(basic_project, monkeypatch, ignore_stats):
+    """The ignore rules statistics are only enabled in the charm part if requested."""
+    host_base = get_host_as_base()
+    charmcraft_file = basic_project / "charmcraft.yaml"
+    charmcraft_file.write_text(
+        dedent(
+            f"""\
+                type: charm
+                bases:
+                  - build-on:
+                      - name: {host_base.name!r}
+                        channel: {host_base.channel!r}
+                    run-on:
+                      - name: {host_base.name!r}
+                        channel: {host_base.channel!r}
+                """
+        )
+    )
+    config = load(basic_project)
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.VERBOSE)
+    builder = get_builder(config, ignore_stats=ignore_stats)
+
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+    with patch("charmcraft.parts.PartsLifecycle", autospec=True) as mock_lifecycle:
+        mock_lifecycle.side_effect = SystemExit()
+        with pytest.raises(SystemExit):
+            builder.run([0])
+    (parts_config,) = mock_lifecycle.call_args[0]
+    assert parts_config["charm"].get("charm-ignore-stats", False) is ignore_stats
+
+
+def test_build_agent_in_instance(basic_project, mock_instance, mock_provider, monkeypatch):
+    """With the build agent enabled, the packing is requested through its client."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    builder = get_builder(config)
+
+    with patch("charmcraft.commands.build.is_build_agent_enabled", return_value=True):
+        builder.run([0])
+
+    assert mock_instance.execute_run.mock_calls[0] == call(
+        get_agent_client_command(["charmcraft", "pack", "--bases-index", "0"]),
+        check=True,
+        cwd=pathlib.Path("/root/project"),
+        env=get_instance_env("20.04"),
+    )
+
+
+def test_build_agent_not_for_interactive(basic_project, mock_instance, mock_provider, monkeypatch):
+    """The build agent is never used for interactive builds."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    builder = get_builder(config, debug=True)
+
+    with patch("charmcraft.commands.build.is_build_agent_enabled", return_value=True):
+        builder.run([0])
+
+    assert mock_instance.execute_run.mock_calls[0] == call(
+        ["charmcraft", "pack", "--bases-index", "0", "--debug"],
+        check=True,
+        cwd=pathlib.Path("/root/project"),
+        env=get_instance_env("20.04"),
+    )
+
+
 def test_build_with_entrypoint_argument_issues_dn04(basic_project, caplog, monkeypatch):
     """Test cases for base-index parameter."""
     config = load(basic_project)
@@ -1337,6 +1710,7 @@ def test_build_entrypoint_from_parts(basic_project, monkeypatch, caplog):
                         ],
                         "charm-entrypoint": "my_entrypoint.py",
                         "charm-requirements": ["reqs.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1401,6 +1775,7 @@ def test_build_entrypoint_from_commandline(basic_project, monkeypatch, caplog):
                         ],
                         "charm-entrypoint": "my_entrypoint.py",
                         "charm-requirements": ["reqs.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1461,6 +1836,7 @@ def test_build_entrypoint_default(basic_project, monkeypatch, caplog):
                         ],
                         "charm-entrypoint": "src/charm.py",
                         "charm-requirements": ["reqs.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1579,6 +1955,7 @@ def test_build_requirements_from_parts(basic_project, monkeypatch, caplog):
                         ],
                         "charm-entrypoint": "src/charm.py",
                         "charm-requirements": ["reqs.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1643,6 +2020,7 @@ def test_build_requirements_from_commandline(basic_project, monkeypatch, caplog)
                         ],
                         "charm-entrypoint": "src/charm.py",
                         "charm-requirements": ["reqs.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1707,6 +2085,7 @@ def test_build_requirements_default(basic_project, monkeypatch, caplog):
                         ],
                         "charm-entrypoint": "src/charm.py",
                         "charm-requirements": ["requirements.txt"],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1767,6 +2146,7 @@ def test_build_requirements_no_requirements_txt(basic_project, monkeypatch, capl
                         ],
                         "charm-entrypoint": "src/charm.py",
                         "charm-requirements": [],
+                        "charm-build-report": get_instance_report_path(basic_project),
                         "source": str(basic_project),
                     }
                 },
@@ -1987,6 +2367,526 @@ def test_show_linters_lint_errors_forced(basic_project, caplog, config):
     assert not any(rec for rec in caplog.records if rec.levelno == logging.DEBUG)
 
 
+# --- tests for packing in several instances at the same time
+
+
+@pytest.fixture
+def two_bases_builder(basic_project, monkeypatch):
+    """Provide a builder for a project with two bases, packing in two instances."""
+    host_arch = get_host_as_base().architectures[0]
+    charmcraft_file = basic_project / "charmcraft.yaml"
+    charmcraft_file.write_text(
+        dedent(
+            f"""\
+                type: charm
+                bases:
+                  - name: ubuntu
+                    channel: "18.04"
+                    architectures: [{host_arch!r}]
+                  - name: ubuntu
+                    channel: "20.04"
+                    architectures: [{host_arch!r}]
+                """
+        )
+    )
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(message_handler, "mode", message_handler.NORMAL)
+    config = load(basic_project)
+    with patch("charmcraft.commands.build.get_concurrent_jobs", return_value=2):
+        yield get_builder(config, jobs=2)
+
+
+def _fake_popen(outputs, retcodes):
+    """Return an execute_popen replacement, with output and retcode by bases index."""
+
+    def fake_popen(cmd, **kwargs):
+        bases_index = int(cmd[cmd.index("--bases-index") + 1])
+        proc = mock.Mock()
+        proc.stdout = [line + "\n" for line in outputs[bases_index]]
+        proc.wait.return_value = retcodes[bases_index]
+        return proc
+
+    return fake_popen
+
+
+def test_build_jobs_concurrent(two_bases_builder, mock_instance, caplog):
+    """The bases are packed each in its instance, with prefixed output, in order."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    host_arch = get_host_as_base().architectures[0]
+    outputs = {0: ["Packing 0...", "Done 0"], 1: ["Packing 1..."]}
+    mock_instance.execute_popen.side_effect = _fake_popen(outputs, {0: 0, 1: 0})
+
+    zipnames = two_bases_builder.run()
+
+    assert zipnames == [
+        f"name-from-metadata_ubuntu-18.04-{host_arch}.charm",
+        f"name-from-metadata_ubuntu-20.04-{host_arch}.charm",
+    ]
+    cmds = sorted(call_args[0][0] for call_args in mock_instance.execute_popen.call_args_list)
+    assert cmds == [
+        ["charmcraft", "pack", "--bases-index", "0"],
+        ["charmcraft", "pack", "--bases-index", "1"],
+    ]
+    mock_instance.execute_run.assert_not_called()
+
+    # each instance's output is complete and in order, even if mixed with the other's
+    for bases_index, lines in outputs.items():
+        prefix = f"[bases {bases_index}] "
+        logged = [msg[len(prefix) :] for msg in caplog.messages if msg.startswith(prefix)]
+        assert logged == lines
+
+
+def test_build_jobs_errors_aggregated(
+    two_bases_builder, mock_instance, mock_capture_logs_from_instance
+):
+    """All the bases are packed even if some fail, reporting all the failures in order."""
+    mock_instance.execute_popen.side_effect = _fake_popen({0: [], 1: []}, {0: 1, 1: 2})
+
+    with pytest.raises(CommandError) as cm:
+        two_bases_builder.run()
+
+    assert str(cm.value) == (
+        "Failed to build charm for bases index '0'.\n" "Failed to build charm for bases index '1'."
+    )
+    assert mock_capture_logs_from_instance.call_count == 2
+
+
+@pytest.mark.parametrize("option", ["debug", "shell", "shell_after"])
+def test_build_jobs_interactive_options(basic_project, option):
+    """Packing in several instances at the same time can not be interactive."""
+    config = load(basic_project)
+    builder = get_builder(config, jobs=2, **{option: True})
+    with pytest.raises(CommandError) as cm:
+        builder.run()
+    assert str(cm.value) == (
+        "The --jobs option can not be used with --debug, --shell or --shell-after."
+    )
+
+
+def test_build_jobs_limited_to_one(two_bases_builder, mock_instance):
+    """If the host can only afford one instance, the bases are packed one by one."""
+    with patch("charmcraft.commands.build.get_concurrent_jobs", return_value=1):
+        two_bases_builder.run()
+    mock_instance.execute_popen.assert_not_called()
+    assert len(mock_instance.execute_run.mock_calls) == 2
+
+
+# --- tests for packing in LXD remotes
+
+
+@pytest.fixture
+def remotes_builder(two_bases_builder):
+    """Provide a builder with the LXD provider, recording where each base is packed."""
+    two_bases_builder.provider = LXDProvider()
+    packed = []
+
+    def fake_pack(*, bases_index, build_on, build_on_index, output_prefix=None, provider=None):
+        lxd_remote = "default" if provider is None else provider.lxd_remote
+        packed.append((bases_index, lxd_remote, output_prefix))
+        if provider is not None and two_bases_builder.barrier is not None:
+            two_bases_builder.barrier.wait()
+        if lxd_remote == "broken":
+            raise CommandError("remote is broken")
+        return f"charm-{bases_index}.charm"
+
+    with patch.object(LXDProvider, "ensure_provider_is_available"):
+        with patch.object(LXDProvider, "is_base_available", return_value=(True, None)):
+            with patch.object(Builder, "pack_charm_in_instance", side_effect=fake_pack):
+                two_bases_builder.packed = packed
+                two_bases_builder.barrier = None
+                yield two_bases_builder
+
+
+def test_build_remotes_distributed(remotes_builder):
+    """Each base is packed in a different remote, keeping the order of the results."""
+    remotes = [LXDRemote("host1", 1), LXDRemote("host2", 1)]
+    # both builds must be running at the same time to finish
+    remotes_builder.barrier = threading.Barrier(2, timeout=5)
+    with patch("charmcraft.commands.build.get_lxd_remotes", return_value=remotes):
+        zipnames = remotes_builder.run()
+
+    assert zipnames == ["charm-0.charm", "charm-1.charm"]
+    assert sorted(remote for _, remote, _ in remotes_builder.packed) == ["host1", "host2"]
+    for bases_index, remote, prefix in remotes_builder.packed:
+        assert prefix == f"[bases {bases_index} @ {remote}]"
+
+
+def test_build_remotes_fallback_local(remotes_builder, caplog):
+    """If packing in a remote fails, it's packed locally instead."""
+    caplog.set_level(logging.WARNING, logger="charmcraft.commands")
+    remotes = [LXDRemote("broken", 2)]
+    with patch("charmcraft.commands.build.get_lxd_remotes", return_value=remotes):
+        zipnames = remotes_builder.run()
+
+    assert zipnames == ["charm-0.charm", "charm-1.charm"]
+    assert sorted(remotes_builder.packed) == [
+        (0, "broken", "[bases 0 @ broken]"),
+        (0, "default", "[bases 0]"),
+        (1, "broken", "[bases 1 @ broken]"),
+        (1, "default", "[bases 1]"),
+    ]
+    warnings = [rec.message for rec in caplog.records if rec.name == "charmcraft.commands.build"]
+    assert sorted(warnings) == [
+        "Packing for bases index '0' in LXD remote 'broken' failed, packing locally: "
+        "remote is broken",
+        "Packing for bases index '1' in LXD remote 'broken' failed, packing locally: "
+        "remote is broken",
+    ]
+
+
+def test_build_remotes_not_configured(remotes_builder):
+    """Without remotes, the bases are packed locally."""
+    with patch("charmcraft.commands.build.get_lxd_remotes", return_value=[]):
+        remotes_builder.run()
+
+    assert sorted(remotes_builder.packed) == [
+        (0, "default", "[bases 0]"),
+        (1, "default", "[bases 1]"),
+    ]
+
+
+def test_build_remotes_interactive(remotes_builder, caplog):
+    """Interactive builds are not distributed in the remotes."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft.commands")
+    remotes_builder.jobs = 1
+    remotes_builder.debug = True
+    remotes = [LXDRemote("host1", 1)]
+    with patch("charmcraft.commands.build.get_lxd_remotes", return_value=remotes):
+        remotes_builder.run()
+
+    assert sorted(remotes_builder.packed) == [(0, "default", None), (1, "default", None)]
+    assert "Not using LXD remotes as the build needs to be interactive." in caplog.messages
+
+
+def test_build_remotes_not_lxd(two_bases_builder, mock_instance):
+    """The remotes are only used with the LXD provider."""
+    mock_instance.execute_popen.side_effect = _fake_popen({0: [], 1: []}, {0: 0, 1: 0})
+    with patch("charmcraft.commands.build.get_lxd_remotes") as mock_get_remotes:
+        two_bases_builder.run()
+    mock_get_remotes.assert_not_called()
+
+
+def test_build_project_not_mounted_pulls_charm(
+    basic_project, mock_instance, mock_provider, monkeypatch
+):
+    """If the project is not mounted in the instance, the charm is always retrieved."""
+    monkeypatch.chdir(basic_project)
+    monkeypatch.setattr(mock_provider, "mounts_project", False)
+    host_arch = get_host_as_base().architectures[0]
+    config = load(basic_project)
+    builder = get_builder(config)
+
+    zipnames = builder.run([0])
+
+    assert mock_instance.mock_calls[-1] == call.pull_file(
+        source=pathlib.Path("/root") / zipnames[0],
+        destination=basic_project / zipnames[0],
+    )
+    assert zipnames[0].endswith(f"-{host_arch}.charm")
+
+
+# --- tests for the build cache
+
+
+@pytest.fixture
+def cache_builder(two_bases_builder):
+    """Provide a builder whose packing in instances just writes the charms, counting them."""
+    packed = []
+
+    def fake_pack(*, bases_index, build_on, build_on_index, **kwargs):
+        charm_name = format_charm_file_name(
+            "name-from-metadata", two_bases_builder.config.bases[bases_index]
+        )
+        packed.append(bases_index)
+        with zipfile.ZipFile(charm_name, "w") as zipfh:
+            zipfh.writestr("build.txt", f"charm {bases_index}, build {len(packed)}")
+        return charm_name
+
+    with patch.object(Builder, "pack_charm_in_instance", side_effect=fake_pack):
+        two_bases_builder.packed = packed
+        yield two_bases_builder
+
+
+def test_build_cache_hit(cache_builder, caplog):
+    """Nothing is packed again if nothing changed, the cached charms are used."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    zipnames = cache_builder.run()
+    assert sorted(cache_builder.packed) == [0, 1]
+    built_contents = [pathlib.Path(zipname).read_bytes() for zipname in zipnames]
+    for zipname in zipnames:
+        pathlib.Path(zipname).unlink()
+
+    caplog.clear()
+    assert cache_builder.run() == zipnames
+    assert sorted(cache_builder.packed) == [0, 1]
+    assert [pathlib.Path(zipname).read_bytes() for zipname in zipnames] == built_contents
+    assert caplog.messages == [
+        f"Reusing {zipname!r} from the build cache, nothing changed for bases index "
+        f"'{bases_index}' (use --no-cache to build it anyway)."
+        for bases_index, zipname in enumerate(zipnames)
+    ] + ["Build cache: 2 reused, 0 built."]
+
+
+def test_build_cache_project_hashed_once(cache_builder):
+    """The project sources are hashed once for all the bases."""
+    with patch(
+        "charmcraft.commands.build.hash_project_tree", wraps=hash_project_tree
+    ) as mock_hash:
+        cache_builder.run()
+    assert len(mock_hash.mock_calls) == 1
+
+
+def test_build_cache_miss_on_change(cache_builder, basic_project):
+    """The charms are packed again if the project changed."""
+    cache_builder.run()
+    (basic_project / "src" / "charm.py").write_text("new code")
+
+    cache_builder.run()
+    assert sorted(cache_builder.packed) == [0, 0, 1, 1]
+
+
+def test_build_cache_only_missing(cache_builder, build_cache_dir):
+    """Only the charms not in the cache are packed."""
+    zipnames = cache_builder.run()
+    for path in (build_cache_dir / zipnames[1]).iterdir():
+        path.unlink()
+
+    assert cache_builder.run() == zipnames
+    assert cache_builder.packed[2:] == [1]
+
+
+def test_build_cache_no_cache(cache_builder):
+    """With --no-cache the charms are always packed, and stored anyway."""
+    zipnames = cache_builder.run()
+
+    cache_builder.no_cache = True
+    cache_builder.run()
+    assert sorted(cache_builder.packed) == [0, 0, 1, 1]
+    latest_contents = [pathlib.Path(zipname).read_bytes() for zipname in zipnames]
+
+    cache_builder.no_cache = False
+    cache_builder.run()
+    assert len(cache_builder.packed) == 4
+    assert [pathlib.Path(zipname).read_bytes() for zipname in zipnames] == latest_contents
+
+
+@pytest.mark.parametrize("option", ["debug", "shell", "shell_after"])
+def test_build_cache_interactive(cache_builder, build_cache_dir, option):
+    """Interactive builds do not use the cache."""
+    cache_builder.jobs = 1
+    setattr(cache_builder, option, True)
+    cache_builder.run()
+    cache_builder.run()
+    assert sorted(cache_builder.packed) == [0, 0, 1, 1]
+    assert list(build_cache_dir.iterdir()) == []
+
+
+@pytest.fixture
+def shared_cache_dir(tmp_path_factory):
+    """Provide a directory working as a cache shared between machines."""
+    shared_cache_dir = tmp_path_factory.mktemp("shared-cache")
+    shared_cache = FilesystemSharedCache(shared_cache_dir)
+    with patch("charmcraft.commands.build.get_shared_cache", return_value=shared_cache):
+        yield shared_cache_dir
+
+
+def test_build_shared_cache_hit(cache_builder, build_cache_dir, shared_cache_dir, caplog):
+    """The charms built in other machine are reused, and kept in the local cache."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    zipnames = cache_builder.run()
+    built_contents = [pathlib.Path(zipname).read_bytes() for zipname in zipnames]
+    assert caplog.messages[-1] == (
+        f"Build cache: 0 reused locally, 0 reused from {shared_cache_dir}, "
+        "2 built (2 shared, 0 errors)."
+    )
+
+    # other machine: no local cache nor charms
+    for zipname in zipnames:
+        pathlib.Path(zipname).unlink()
+        shutil.rmtree(build_cache_dir / zipname)
+
+    caplog.clear()
+    assert cache_builder.run() == zipnames
+    assert sorted(cache_builder.packed) == [0, 1]
+    assert [pathlib.Path(zipname).read_bytes() for zipname in zipnames] == built_contents
+    assert caplog.messages == [
+        f"Reusing {zipname!r} from the shared build cache, nothing changed for bases index "
+        f"'{bases_index}' (use --no-cache to build it anyway)."
+        for bases_index, zipname in enumerate(zipnames)
+    ] + [
+        f"Build cache: 0 reused locally, 2 reused from {shared_cache_dir}, "
+        "0 built (0 shared, 0 errors)."
+    ]
+    assert sorted(path.name for path in build_cache_dir.iterdir()) == sorted(zipnames)
+
+
+def test_build_shared_cache_broken(cache_builder, build_cache_dir, shared_cache_dir, caplog):
+    """Broken charms in the shared cache are ignored."""
+    zipnames = cache_builder.run()
+    for path in shared_cache_dir.glob("*/*"):
+        path.write_bytes(b"truncated")
+    for zipname in zipnames:
+        shutil.rmtree(build_cache_dir / zipname)
+
+    cache_builder.run()
+    assert sorted(cache_builder.packed) == [0, 0, 1, 1]
+    assert "Ignoring broken charm" in caplog.text
+    assert not list(pathlib.Path.cwd().glob("*.partial"))
+
+
+def test_build_shared_cache_errors(cache_builder, caplog):
+    """Problems with the shared cache do not break the build."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    shared_cache = mock.Mock()
+    shared_cache.__str__ = lambda self: "http://cache"
+    shared_cache.fetch.side_effect = OSError("cannot get: boom")
+    shared_cache.store.side_effect = OSError("cannot put: boom")
+    with patch("charmcraft.commands.build.get_shared_cache", return_value=shared_cache):
+        zipnames = cache_builder.run()
+
+    assert len(zipnames) == 2
+    assert caplog.messages.count("Cannot get from the shared build cache: cannot get: boom") == 2
+    assert caplog.messages.count("Cannot store in the shared build cache: cannot put: boom") == 2
+    assert caplog.messages[-1] == (
+        "Build cache: 0 reused locally, 0 reused from http://cache, 2 built (0 shared, 4 errors)."
+    )
+
+
+def test_build_key(basic_project, config):
+    """The build key changes with what may produce a different charm."""
+    builder = get_builder(config)
+    bases_config = BasesConfiguration(
+        **{
+            "build-on": [Base(name="ubuntu", channel="20.04", architectures=["amd64"])],
+            "run-on": [Base(name="ubuntu", channel="20.04", architectures=["amd64"])],
+        }
+    )
+    other_bases_config = BasesConfiguration(
+        **{
+            "build-on": [Base(name="ubuntu", channel="20.04", architectures=["amd64"])],
+            "run-on": [Base(name="ubuntu", channel="22.04", architectures=["amd64"])],
+        }
+    )
+    key = builder.get_build_key(bases_config)
+    assert builder.get_build_key(bases_config) == key
+    assert builder.get_build_key(other_bases_config) != key
+
+    builder.compression_level = 1
+    assert builder.get_build_key(bases_config) != key
+    builder.compression_level = COMPRESSION_LEVEL
+
+    requirement = basic_project.parent / "reqs.txt"  # outside the project
+    requirement.write_text("ops")
+    builder.requirement_paths = [requirement]
+    with_requirements = builder.get_build_key(bases_config)
+    assert with_requirements != key
+    requirement.write_text("ops==1.2")
+    assert builder.get_build_key(bases_config) != with_requirements
+
+
+def test_build_key_with_project_key(basic_project, config):
+    """The build key is the given project key combined with the bases."""
+    builder = get_builder(config)
+    bases_config = BasesConfiguration(
+        **{
+            "build-on": [Base(name="ubuntu", channel="20.04", architectures=["amd64"])],
+            "run-on": [Base(name="ubuntu", channel="20.04", architectures=["amd64"])],
+        }
+    )
+    project_key = builder.get_project_key()
+    with patch("charmcraft.commands.build.hash_project_tree") as mock_hash:
+        key = builder.get_build_key(bases_config, project_key)
+    mock_hash.assert_not_called()
+    assert key == builder.get_build_key(bases_config)
+    assert builder.get_build_key(bases_config, "other-project-key") != key
+
+
+@pytest.mark.parametrize(
+    "requested, builds, cpus, memory_gb, expected",
+    [
+        (4, 2, 8, 64, 2),
+        (2, 4, 8, 64, 2),
+        (8, 8, 3, 64, 3),
+        (8, 8, 8, 5, 2),
+        (8, 8, 8, None, 8),
+        (8, 8, 8, 1, 1),
+    ],
+)
+def test_get_concurrent_jobs(monkeypatch, requested, builds, cpus, memory_gb, expected):
+    """The concurrent jobs are limited by the builds and the host resources."""
+    memory = None if memory_gb is None else memory_gb * 1024 ** 3
+    monkeypatch.setattr(os, "cpu_count", lambda: cpus)
+    with patch("charmcraft.commands.build._get_available_memory", return_value=memory):
+        assert get_concurrent_jobs(requested, builds) == expected
+
+
+# --- tests for the build report
+
+
+def test_show_build_report(basic_project, caplog, config, tmp_path):
+    """The phases of a fresh charm build are shown."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    builder = get_builder(config)
+    report_path = tmp_path / "charm-build-report.json"
+    report = {
+        "phases": [
+            {"name": "link", "wall_time": 0.25, "cpu_time": 0.1, "files": 3, "bytes": 2000},
+            {"name": "pip", "wall_time": 12.5, "cpu_time": 8.0, "files": 0, "bytes": 0},
+        ],
+        "staged": {"hardlink": 3},
+    }
+    report_path.write_text(json.dumps(report))
+
+    caplog.records.clear()
+    builder.show_build_report(report_path, 0)
+
+    messages = [rec.message for rec in caplog.records]
+    assert messages[0] == f"Charm build phases (report in {str(report_path)!r}):"
+    assert messages[1].split() == ["Phase", "Wall", "time", "CPU", "time", "Files", "Size"]
+    assert messages[2].split() == ["link", "0.250s", "0.100s", "3", "2.0", "kB"]
+    assert messages[3].split() == ["pip", "12.500s", "8.000s", "0", "0", "Bytes"]
+    assert all(rec.levelno == logging.DEBUG for rec in caplog.records)
+
+
+def test_show_build_report_reused(basic_project, caplog, config, tmp_path):
+    """A report from a previous run is not shown."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    builder = get_builder(config)
+    report_path = tmp_path / "charm-build-report.json"
+    report_path.write_text(json.dumps({"phases": []}))
+    os.utime(report_path, (1000, 1000))
+
+    caplog.records.clear()
+    builder.show_build_report(report_path, 2000)
+    assert [rec.message for rec in caplog.records] == [
+        "The charm build was reused, no build report to show"
+    ]
+
+
+def test_show_build_report_missing(basic_project, caplog, config, tmp_path):
+    """Nothing is shown if there is no report."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    builder = get_builder(config)
+
+    caplog.records.clear()
+    builder.show_build_report(tmp_path / "charm-build-report.json", 0)
+    assert caplog.records == []
+
+
+@pytest.mark.parametrize("content", ["not json", '{"no": "phases"}', '{"phases": [{}]}'])
+def test_show_build_report_broken(basic_project, caplog, config, tmp_path, content):
+    """A broken report is not shown."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    builder = get_builder(config)
+    report_path = tmp_path / "charm-build-report.json"
+    report_path.write_text(content)
+
+    caplog.records.clear()
+    builder.show_build_report(report_path, 0)
+    (message,) = [rec.message for rec in caplog.records]
+    assert message.startswith("Cannot read the charm build report")
+
+
 # --- tests for relativise helper
 
 
@@ -20,6 +20,7 @@ from unittest import mock
 import pytest
 
 from charmcraft.commands.clean import CleanCommand
+from charmcraft.providers import LXDProvider, LXDRemote
 
 
 @pytest.fixture(autouse=True)
@@ -47,3 +48,41 @@ def test_clean(caplog, caplog_filter, config, mock_provider, tmp_path):
     assert mock_provider.mock_calls == [
         mock.call.clean_project_environments(charm_name="foo", project_path=tmp_path)
     ]
+
+
+def test_clean_lxd_remotes(config, tmp_path):
+    """With LXD, the project is also cleaned in the configured remotes."""
+    metadata_yaml = tmp_path / "metadata.yaml"
+    metadata_yaml.write_text("name: foo")
+    remotes = [LXDRemote(name="buildhost1", capacity=1), LXDRemote(name="buildhost2", capacity=2)]
+    cleaned = []
+
+    def fake_clean(self, *, charm_name, project_path):
+        cleaned.append((self.lxd_remote, self.lxd_project, charm_name, project_path))
+        return []
+
+    cmd = CleanCommand("config")
+    cmd.config = config
+    with mock.patch("charmcraft.commands.clean.get_provider", return_value=LXDProvider()):
+        with mock.patch("charmcraft.commands.clean.get_lxd_remotes", return_value=remotes):
+            with mock.patch.object(LXDProvider, "clean_project_environments", fake_clean):
+                cmd.run([])
+
+    assert cleaned == [
+        ("local", "charmcraft", "foo", tmp_path),
+        ("buildhost1", "charmcraft", "foo", tmp_path),
+        ("buildhost2", "charmcraft", "foo", tmp_path),
+    ]
+
+
+def test_clean_no_remotes_if_not_lxd(config, mock_provider, tmp_path):
+    """The LXD remotes are not cleaned if not using LXD."""
+    metadata_yaml = tmp_path / "metadata.yaml"
+    metadata_yaml.write_text("name: foo")
+
+    cmd = CleanCommand("config")
+    cmd.config = config
+    with mock.patch("charmcraft.commands.clean.get_lxd_remotes") as mock_get_remotes:
+        cmd.run([])
+
+    mock_get_remotes.assert_not_called()
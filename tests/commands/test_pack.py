@@ -15,20 +15,22 @@
 # For further info, check https://github.com/canonical/charmcraft
 
 import datetime
+import hashlib
 import logging
 import pathlib
 import sys
 import zipfile
 from argparse import ArgumentParser, Namespace
 from unittest import mock
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, call, patch
 
 import pytest
 import yaml
 
 from charmcraft.cmdbase import CommandError
 from charmcraft.commands import pack
-from charmcraft.commands.pack import PackCommand, build_zip
+from charmcraft.commands.pack import PackCommand
+from charmcraft.commands.store.store import Uploaded
 from charmcraft.config import Project
 from charmcraft.utils import SingleOptionEnsurer, useful_filepath
 
@@ -43,6 +45,12 @@ def get_namespace(
     requirement=None,
     shell=False,
     shell_after=False,
+    jobs=None,
+    compression_level=None,
+    no_cache=False,
+    ignore_stats=False,
+    upload=False,
+    release=None,
 ):
     if bases_index is None:
         bases_index = []
@@ -56,6 +64,12 @@ def get_namespace(
         requirement=requirement,
         shell=shell,
         shell_after=shell_after,
+        jobs=jobs,
+        compression_level=compression_level,
+        no_cache=no_cache,
+        ignore_stats=ignore_stats,
+        upload=upload,
+        release=release,
     )
 
 
@@ -101,7 +115,7 @@ def test_resolve_charm_type(config):
 
     with patch.object(cmd, "_pack_charm") as mock:
         cmd.run(noargs)
-    mock.assert_called_with(noargs)
+    mock.assert_called_with(noargs, None)
 
 
 def test_resolve_bundle_type(config):
@@ -111,7 +125,7 @@ def test_resolve_bundle_type(config):
 
     with patch.object(cmd, "_pack_bundle") as mock:
         cmd.run(noargs)
-    mock.assert_called_with(noargs)
+    mock.assert_called_with(noargs, None)
 
 
 def test_resolve_no_config_packs_charm(config, tmp_path):
@@ -127,13 +141,13 @@ def test_resolve_no_config_packs_charm(config, tmp_path):
 
     with patch.object(cmd, "_pack_charm") as mock:
         cmd.run(noargs)
-    mock.assert_called_with(noargs)
+    mock.assert_called_with(noargs, None)
 
 
 def test_resolve_bundle_with_requirement(config):
     """The requirement option is not valid when packing a bundle."""
     config.set(type="bundle")
-    args = Namespace(requirement="reqs.txt", entrypoint=None)
+    args = Namespace(requirement="reqs.txt", entrypoint=None, upload=False, release=None)
 
     with pytest.raises(CommandError) as cm:
         PackCommand(config).run(args)
@@ -143,13 +157,68 @@ def test_resolve_bundle_with_requirement(config):
 def test_resolve_bundle_with_entrypoint(config):
     """The entrypoint option is not valid when packing a bundle."""
     config.set(type="bundle")
-    args = Namespace(requirement=None, entrypoint="mycharm.py")
+    args = Namespace(requirement=None, entrypoint="mycharm.py", upload=False, release=None)
 
     with pytest.raises(CommandError) as cm:
         PackCommand(config).run(args)
     assert str(cm.value) == "The -e/--entry option is valid only when packing a charm"
 
 
+def test_release_without_upload(config):
+    """The release option is only valid when uploading."""
+    config.set(type="charm")
+    cmd = PackCommand(config)
+
+    with patch.object(cmd, "_pack_charm") as mock:
+        with pytest.raises(CommandError) as cm:
+            cmd.run(get_namespace(release=["edge"]))
+    assert str(cm.value) == "The --release option can only be used with --upload."
+    mock.assert_not_called()
+
+
+def test_charm_upload(config, tmp_path):
+    """The packed charms are uploaded (and released) when indicated."""
+    config.set(type="charm")
+    cmd = PackCommand(config)
+    charms = [tmp_path / "mycharm_ubuntu-20.04-amd64.charm", tmp_path / "mycharm_other.charm"]
+
+    with patch.object(cmd, "_pack_charm", return_value=charms):
+        with patch("charmcraft.commands.store.upload_package", return_value=True) as mock_upload:
+            retcode = cmd.run(get_namespace(upload=True, release=["edge"]))
+    assert mock_upload.mock_calls == [
+        call(config.charmhub, charms[0], ["edge"]),
+        call(config.charmhub, charms[1], ["edge"]),
+    ]
+    assert retcode == 0
+
+
+def test_charm_upload_failed(config, tmp_path):
+    """The command fails if any upload fails (but all of them are tried)."""
+    config.set(type="charm")
+    cmd = PackCommand(config)
+    charms = [tmp_path / "mycharm_ubuntu-20.04-amd64.charm", tmp_path / "mycharm_other.charm"]
+
+    with patch.object(cmd, "_pack_charm", return_value=charms):
+        with patch("charmcraft.commands.store.upload_package", side_effect=[False, True]) as mock:
+            retcode = cmd.run(get_namespace(upload=True))
+    assert mock.mock_calls == [
+        call(config.charmhub, charms[0], None),
+        call(config.charmhub, charms[1], None),
+    ]
+    assert retcode == 1
+
+
+def test_charm_no_upload(config, tmp_path):
+    """Nothing is uploaded if not indicated."""
+    config.set(type="charm")
+    cmd = PackCommand(config)
+
+    with patch.object(cmd, "_pack_charm", return_value=[tmp_path / "mycharm.charm"]):
+        with patch("charmcraft.commands.store.upload_package") as mock_upload:
+            cmd.run(noargs)
+    mock_upload.assert_not_called()
+
+
 # -- tests for main bundle building process
 
 
@@ -173,8 +242,11 @@ def test_bundle_simple_succesful_build(tmp_path, caplog, bundle_yaml, bundle_con
     assert zf.read("bundle.yaml") == content.encode("ascii")
     assert zf.read("README.md") == b"test readme"
 
-    expected = "Created '{}'.".format(zipname)
-    assert [expected] == [rec.message for rec in caplog.records]
+    expected = [
+        "Created '{}'.".format(zipname),
+        "SHA-256 of 'testbundle.zip': {}".format(hashlib.sha256(zipname.read_bytes()).hexdigest()),
+    ]
+    assert expected == [rec.message for rec in caplog.records]
 
     # check the manifest is present and with particular values that depend on given info
     manifest = yaml.safe_load(zf.read("manifest.yaml"))
@@ -184,6 +256,64 @@ def test_bundle_simple_succesful_build(tmp_path, caplog, bundle_yaml, bundle_con
     assert not (tmp_path / "manifest.yaml").exists()
 
 
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_bundle_upload(tmp_path, caplog, bundle_yaml, bundle_config, mock_parts):
+    """The packed bundle is uploaded to the store."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    content = bundle_yaml(name="testbundle")
+    bundle_config.set(type="bundle")
+    (tmp_path / "README.md").write_text("test readme")
+    prime_dir = tmp_path / "prime"
+    prime_dir.mkdir()
+    (prime_dir / "bundle.yaml").write_text(content)
+    (prime_dir / "README.md").write_text("test readme")
+    mock_parts.PartsLifecycle.return_value.prime_dir = prime_dir
+
+    pushed = []
+
+    def fake_push(filename, chunks):
+        pushed.extend(chunks)
+        return "test-upload-id"
+
+    store_mock = MagicMock()
+    store_mock.push_stream.side_effect = fake_push
+    store_mock.upload_pushed.return_value = Uploaded(ok=True, status=200, revision=7, errors=[])
+    with patch("charmcraft.commands.store.Store", return_value=store_mock):
+        PackCommand(bundle_config).run(get_namespace(upload=True))
+
+    # the bundle was pushed while packed, not uploaded from the file afterwards
+    zipname = tmp_path / "testbundle.zip"
+    assert store_mock.mock_calls == [
+        call.ensure_login(),
+        call.push_stream("testbundle.zip", ANY),
+        call.upload_pushed("testbundle", "test-upload-id"),
+    ]
+    assert b"".join(pushed) == zipname.read_bytes()
+    assert caplog.messages[-1] == "Revision 7 of 'testbundle' created"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_bundle_upload_tainted(tmp_path, bundle_yaml, bundle_config, mock_parts):
+    """The pushed bundle is not turned into a revision if it has the 'init' TODO token."""
+    content = bundle_yaml(name="testbundle")
+    bundle_config.set(type="bundle")
+    (tmp_path / "README.md").write_text("test readme")
+    prime_dir = tmp_path / "prime"
+    prime_dir.mkdir()
+    (prime_dir / "bundle.yaml").write_text(content)
+    (prime_dir / "README.md").write_text("TEMPLATE-TODO: write the readme")
+    mock_parts.PartsLifecycle.return_value.prime_dir = prime_dir
+
+    store_mock = MagicMock()
+    store_mock.push_stream.side_effect = lambda filename, chunks: list(chunks) and "test-id"
+    with patch("charmcraft.commands.store.Store", return_value=store_mock):
+        with pytest.raises(CommandError) as cm:
+            PackCommand(bundle_config).run(get_namespace(upload=True))
+
+    assert "TEMPLATE-TODO" in str(cm.value)
+    store_mock.upload_pushed.assert_not_called()
+
+
 @pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
 def test_bundle_missing_bundle_file(tmp_path, bundle_config):
     """Can not build a bundle without bundle.yaml."""
@@ -222,6 +352,30 @@ def test_bundle_missing_name_in_bundle(tmp_path, bundle_yaml, bundle_config):
     )
 
 
+def test_bundle_compression_level(tmp_path, bundle_yaml, bundle_config, mock_parts):
+    """The bundle is compressed with the indicated level."""
+    bundle_yaml(name="testbundle")
+    bundle_config.set(type="bundle")
+    (tmp_path / "README.md").write_text("test readme")
+
+    with patch("charmcraft.commands.pack.build_zip") as mock_build_zip:
+        with patch("charmcraft.commands.pack.get_file_sha256"):
+            PackCommand(bundle_config).run(get_namespace(compression_level=9))
+
+    mock_build_zip.assert_called_once_with(tmp_path / "testbundle.zip", mock.ANY, 9)
+
+
+def test_bundle_compression_level_invalid(tmp_path, bundle_yaml, bundle_config):
+    """The compression level for the bundle is validated."""
+    bundle_yaml(name="testbundle")
+    bundle_config.set(type="bundle")
+    (tmp_path / "README.md").write_text("test readme")
+
+    with pytest.raises(CommandError) as cm:
+        PackCommand(bundle_config).run(get_namespace(compression_level=12))
+    assert str(cm.value) == "The compression level '12' is invalid (must be 0 to 9)."
+
+
 def test_bundle_debug_no_error(
     tmp_path, bundle_yaml, bundle_config, mock_parts, mock_launch_shell
 ):
@@ -440,71 +594,6 @@ def test_prime_extra_globstar_specific_files(tmp_path, bundle_yaml, bundle_confi
         assert (srcpath in zipped_files) == expected
 
 
-# -- tests for zip builder
-
-
-def test_zipbuild_simple(tmp_path):
-    """Build a bunch of files in the zip."""
-    build_dir = tmp_path / "somedir"
-    build_dir.mkdir()
-
-    testfile1 = build_dir / "foo.txt"
-    testfile1.write_bytes(b"123\x00456")
-    subdir = build_dir / "bar"
-    subdir.mkdir()
-    testfile2 = subdir / "baz.txt"
-    testfile2.write_bytes(b"mo\xc3\xb1o")
-
-    zip_filepath = tmp_path / "testresult.zip"
-    build_zip(zip_filepath, build_dir)
-
-    zf = zipfile.ZipFile(zip_filepath)
-    assert sorted(x.filename for x in zf.infolist()) == ["bar/baz.txt", "foo.txt"]
-    assert zf.read("foo.txt") == b"123\x00456"
-    assert zf.read("bar/baz.txt") == b"mo\xc3\xb1o"
-
-
-@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
-def test_zipbuild_symlink_simple(tmp_path):
-    """Symlinks are supported."""
-    build_dir = tmp_path / "somedir"
-    build_dir.mkdir()
-
-    testfile1 = build_dir / "real.txt"
-    testfile1.write_bytes(b"123\x00456")
-    testfile2 = build_dir / "link.txt"
-    testfile2.symlink_to(testfile1)
-
-    zip_filepath = tmp_path / "testresult.zip"
-    build_zip(zip_filepath, build_dir)
-
-    zf = zipfile.ZipFile(zip_filepath)
-    assert sorted(x.filename for x in zf.infolist()) == ["link.txt", "real.txt"]
-    assert zf.read("real.txt") == b"123\x00456"
-    assert zf.read("link.txt") == b"123\x00456"
-
-
-@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
-def test_zipbuild_symlink_outside(tmp_path):
-    """No matter where the symlink points to."""
-    # outside the build dir
-    testfile1 = tmp_path / "real.txt"
-    testfile1.write_bytes(b"123\x00456")
-
-    # inside the build dir
-    build_dir = tmp_path / "somedir"
-    build_dir.mkdir()
-    testfile2 = build_dir / "link.txt"
-    testfile2.symlink_to(testfile1)
-
-    zip_filepath = tmp_path / "testresult.zip"
-    build_zip(zip_filepath, build_dir)
-
-    zf = zipfile.ZipFile(zip_filepath)
-    assert sorted(x.filename for x in zf.infolist()) == ["link.txt"]
-    assert zf.read("link.txt") == b"123\x00456"
-
-
 # tests for the main charm building process -- so far this is only using the "build" command
 # infrastructure, until we migrate the (adapted) behaviour to this command
 
@@ -539,6 +628,12 @@ def test_charm_parameters_validator(config, tmp_path):
         requirement="test-reqs",
         shell=True,
         shell_after=True,
+        jobs=3,
+        compression_level=9,
+        no_cache=True,
+        ignore_stats=True,
+        upload=False,
+        release=None,
     )
     config.set(
         type="charm",
@@ -560,6 +655,10 @@ def test_charm_parameters_validator(config, tmp_path):
                 "requirement": "test-reqs",
                 "shell": True,
                 "shell_after": True,
+                "jobs": 3,
+                "compression_level": 9,
+                "no_cache": True,
+                "ignore_stats": True,
             }
         )
     )
@@ -407,6 +407,59 @@ def test_upload_error(client_mock, config):
     assert error2.code == "error-code-2"
 
 
+def test_upload_pushed(client_mock, config):
+    """A revision is created from the already pushed bytes."""
+    store = Store(config.charmhub)
+    client_mock.request_urlpath_json.side_effect = [
+        {"status-url": "https://store.c.c/status"},
+        {"revisions": [{"status": "approved", "revision": 7, "errors": None}]},
+    ]
+
+    result = store.upload_pushed("test-charm", "test-upload-id")
+
+    assert client_mock.mock_calls == [
+        call.request_urlpath_json(
+            "POST", "/v1/charm/test-charm/revisions", json={"upload-id": "test-upload-id"}
+        ),
+        call.request_urlpath_json("GET", "https://store.c.c/status"),
+    ]
+    assert result.ok
+    assert result.revision == 7
+
+
+def test_push_stream(client_mock, config):
+    """The bytes are pushed by the client as they are produced."""
+    store = Store(config.charmhub)
+    client_mock.push_stream.return_value = "test-upload-id"
+
+    result = store.push_stream("test.charm", "test-chunks")
+
+    assert client_mock.mock_calls == [call.push_stream("test.charm", "test-chunks")]
+    assert result == "test-upload-id"
+
+
+def test_push_stream_no_login_retry(client_mock, config):
+    """Pushing a stream is not retried after logging in, as the bytes are already gone."""
+    store = Store(config.charmhub)
+    client_mock.push_stream.side_effect = NotLoggedIn()
+
+    with pytest.raises(CommandError) as cm:
+        store.push_stream("test.charm", "test-chunks")
+    assert str(cm.value).startswith("Server error while communicating to the Store: ")
+    client_mock.login.assert_not_called()
+
+
+def test_ensure_login(client_mock, config):
+    """The credentials are verified, logging in if needed."""
+    store = Store(config.charmhub)
+    client_mock.whoami.side_effect = [NotLoggedIn(), {}]
+
+    store.ensure_login()
+
+    assert client_mock.whoami.call_count == 2
+    assert client_mock.login.call_count == 1
+
+
 def test_upload_charmbundles_endpoint(config):
     """The bundle/charm upload prepares ok the endpoint and calls the generic _upload."""
     store = Store(config.charmhub)
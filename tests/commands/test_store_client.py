@@ -240,6 +240,79 @@ def test_client_push_response_unsuccessful(tmp_path, client_class):
             assert str(error.value) == expected_error
 
 
+def test_client_push_stream_ok(client_class):
+    """The chunks are pushed as they are produced, in a single file multipart body."""
+    produced = []
+
+    def fake_chunks():
+        for chunk in [b"abc", b"", b"defgh"]:
+            produced.append(chunk)
+            yield chunk
+
+    def fake_pusher(body):
+        """Consume the body, checking it's produced lazily."""
+        assert produced == []
+        boundary = body.content_type.split("boundary=")[1]
+        assert body.content_type == "multipart/form-data; boundary=" + boundary
+        parts = list(body)
+
+        # the empty chunk is not sent, as it would end the chunked body
+        assert parts == [
+            (
+                "--{}\r\n"
+                'Content-Disposition: form-data; name="binary"; filename="supercharm.bin"\r\n'
+                "Content-Type: application/octet-stream\r\n\r\n".format(boundary)
+            ).encode(),
+            b"abc",
+            b"defgh",
+            "\r\n--{}--\r\n".format(boundary).encode(),
+        ]
+        assert body.bytes_read == 8
+        content = json.dumps(dict(successful=True, upload_id="test-upload-id"))
+        return FakeResponse(content=content, status_code=200)
+
+    client = client_class("http://api.test", "http://storage.test")
+    with patch.object(client, "_storage_push", side_effect=fake_pusher):
+        upload_id = client.push_stream("supercharm.bin", fake_chunks())
+    assert upload_id == "test-upload-id"
+
+
+def test_client_push_stream_multipart_parsed(client_class):
+    """The streamed body is a proper multipart one."""
+    captured = {}
+
+    def fake_pusher(body):
+        captured["content_type"] = body.content_type
+        captured["body"] = b"".join(body)
+        content = json.dumps(dict(successful=True, upload_id="test-upload-id"))
+        return FakeResponse(content=content, status_code=200)
+
+    client = client_class("http://api.test", "http://storage.test")
+    with patch.object(client, "_storage_push", side_effect=fake_pusher):
+        client.push_stream("supercharm.bin", iter([b"\r\n--binary", b"content"]))
+
+    reference = MultipartEncoder(
+        fields={"binary": ("supercharm.bin", b"\r\n--binarycontent", "application/octet-stream")},
+        boundary=captured["content_type"].split("boundary=")[1],
+    )
+    assert captured["body"] == reference.to_string()
+
+
+def test_client_push_stream_response_unsuccessful(client_class):
+    """Didn't get a successful response from the Storage when streaming."""
+    fake_response = FakeResponse(
+        content=json.dumps(dict(successful=False, upload_id=None)), status_code=200
+    )
+
+    client = client_class("http://api.test", "https://local.test:1234/")
+    with patch.object(client, "_storage_push", return_value=fake_response):
+        with pytest.raises(CommandError) as error:
+            client.push_stream("supercharm.bin", iter([b"abc"]))
+    assert str(error.value) == (
+        "Server error while pushing file: {'successful': False, 'upload_id': None}"
+    )
+
+
 def test_storage_push_succesful(client_class):
     """Bytes are properly pushed to the Storage."""
     test_monitor = MultipartEncoderMonitor(
@@ -49,12 +49,15 @@ from charmcraft.commands.store import (
     RegisterCharmNameCommand,
     ReleaseCommand,
     StatusCommand,
+    StreamedUpload,
+    StreamedUploads,
     UploadCommand,
     UploadResourceCommand,
     WhoamiCommand,
     _get_lib_info,
     get_name_from_metadata,
     get_name_from_zip,
+    inspect_package,
 )
 from charmcraft.commands.store.store import (
     Base,
@@ -457,6 +460,34 @@ def test_get_name_nor_charm_nor_bundle(tmp_path):
     )
 
 
+def test_inspect_package_ok(tmp_path):
+    """Get the name from the package while checking all its files."""
+    test_zip = tmp_path / "some.zip"
+    with zipfile.ZipFile(str(test_zip), "w") as zf:
+        zf.writestr("src/charm.py", b"# all done")
+        zf.writestr("metadata.yaml", yaml.dump({"name": "whatever"}).encode("ascii"))
+
+    with patch.object(zipfile.ZipFile, "read", autospec=True, side_effect=zipfile.ZipFile.read):
+        name = inspect_package(test_zip)
+        read_calls = zipfile.ZipFile.read.call_count
+    assert name == "whatever"
+    assert read_calls == 2  # each file read once
+
+
+def test_inspect_package_bad_name_before_template(tmp_path):
+    """Problems with the name are reported even if there are files with the token."""
+    bad_zip = tmp_path / "badstuff.zip"
+    with zipfile.ZipFile(str(bad_zip), "w") as zf:
+        zf.writestr("whatever.yaml", b"# TEMPLATE-TODO: fix.")
+
+    with pytest.raises(CommandError) as cm:
+        inspect_package(bad_zip)
+    assert str(cm.value) == (
+        "The indicated zip file '{}' is not a charm ('metadata.yaml' not found) nor a bundle "
+        "('bundle.yaml' not found).".format(bad_zip)
+    )
+
+
 def test_upload_parameters_filepath_type(config):
     """The filepath parameter implies a set of validations."""
     cmd = UploadCommand(config)
@@ -475,7 +506,7 @@ def test_upload_call_ok(caplog, store_mock, config, tmp_path):
 
     test_charm = tmp_path / "mystuff.charm"
     _build_zip_with_yaml(test_charm, "metadata.yaml", content={"name": "mycharm"})
-    args = Namespace(filepath=test_charm, release=[])
+    args = Namespace(filepath=test_charm, release=[], resource=[])
     UploadCommand(config).run(args)
 
     assert store_mock.mock_calls == [call.upload("mycharm", test_charm)]
@@ -496,7 +527,7 @@ def test_upload_call_error(caplog, store_mock, config, tmp_path):
 
     test_charm = tmp_path / "mystuff.charm"
     _build_zip_with_yaml(test_charm, "metadata.yaml", content={"name": "mycharm"})
-    args = Namespace(filepath=test_charm, release=[])
+    args = Namespace(filepath=test_charm, release=[], resource=[])
     UploadCommand(config).run(args)
 
     assert store_mock.mock_calls == [call.upload("mycharm", test_charm)]
@@ -598,7 +629,7 @@ def test_upload_call_error_including_release(caplog, store_mock, config, tmp_pat
 
     test_charm = tmp_path / "mystuff.charm"
     _build_zip_with_yaml(test_charm, "metadata.yaml", content={"name": "mycharm"})
-    args = Namespace(filepath=test_charm, release=["edge"])
+    args = Namespace(filepath=test_charm, release=["edge"], resource=[])
     UploadCommand(config).run(args)
 
     # check the upload was attempted, but not the release!
@@ -616,7 +647,7 @@ def test_upload_charm_with_init_template_todo_token(tmp_path, config):
         zf.writestr("file_ok.cfg", b"This is fine :).")
         zf.writestr("othertainted.txt", b"# TEMPLATE-TODO: need to fix.")
 
-    args = Namespace(filepath=test_charm, release=[])
+    args = Namespace(filepath=test_charm, release=[], resource=[])
     expected_msg = (
         "Cannot upload the charm as it include the following files with a leftover "
         "TEMPLATE-TODO token from when the project was created using the 'init' "
@@ -626,6 +657,128 @@ def test_upload_charm_with_init_template_todo_token(tmp_path, config):
         UploadCommand(config).run(args)
 
 
+# -- tests for the uploads streamed while packing
+
+
+def _fake_push(pushed, upload_id="test-upload-id"):
+    """Return a fake Store.push_stream that consumes all the chunks."""
+
+    def push_stream(filename, chunks):
+        pushed.extend(chunks)
+        return upload_id
+
+    return push_stream
+
+
+def test_streamed_upload_ok(caplog, store_mock, config, tmp_path):
+    """The package is pushed while written, and the revision created after."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    pushed = []
+    store_mock.push_stream.side_effect = _fake_push(pushed)
+    store_mock.upload_pushed.return_value = Uploaded(ok=True, status=200, revision=7, errors=[])
+
+    upload = StreamedUpload(config.charmhub, tmp_path / "mystuff.charm")
+    with upload:
+        upload.inspector("metadata.yaml", b"name: mycharm")
+        upload.write(b"some ")
+        upload.write(b"bytes")
+    ok = upload.finish(["edge"])
+
+    assert ok
+    assert pushed == [b"some ", b"bytes"]
+    assert store_mock.mock_calls == [
+        call.ensure_login(),
+        call.push_stream("mystuff.charm", ANY),
+        call.upload_pushed("mycharm", "test-upload-id"),
+        call.release("mycharm", 7, ["edge"], []),
+    ]
+    assert caplog.messages == ["Revision 7 of 'mycharm' created", "Revision released to edge"]
+
+
+def test_streamed_upload_tainted(store_mock, config, tmp_path):
+    """No revision is created if the package has the 'init' template TODO marker."""
+    store_mock.push_stream.side_effect = _fake_push([])
+
+    upload = StreamedUpload(config.charmhub, tmp_path / "mystuff.charm")
+    with upload:
+        upload.inspector("metadata.yaml", b"name: mycharm")
+        upload.inspector("src/charm.py", b"# TEMPLATE-TODO: fix.")
+        upload.write(b"some bytes")
+    with pytest.raises(CommandError) as cm:
+        upload.finish()
+
+    assert str(cm.value).endswith("command: src/charm.py")
+    store_mock.upload_pushed.assert_not_called()
+
+
+def test_streamed_upload_packing_failed(store_mock, config, tmp_path):
+    """If packing fails the push is aborted, and the packing error is raised."""
+    push_errors = []
+
+    def push_stream(filename, chunks):
+        try:
+            list(chunks)
+        except CommandError as error:
+            push_errors.append(error)
+            raise
+
+    store_mock.push_stream.side_effect = push_stream
+
+    with pytest.raises(ValueError):
+        with StreamedUpload(config.charmhub, tmp_path / "mystuff.charm") as upload:
+            upload.write(b"some bytes")
+            raise ValueError("packing broke")
+
+    (error,) = push_errors
+    assert str(error) == "Packing failed, push aborted."
+
+
+def test_streamed_upload_push_failed(store_mock, config, tmp_path):
+    """If the push fails packing does not wait forever, and the push error is raised."""
+    store_mock.push_stream.side_effect = CommandError("network broke")
+
+    upload = StreamedUpload(config.charmhub, tmp_path / "mystuff.charm")
+    with pytest.raises(CommandError) as cm:
+        with upload:
+            upload._thread.join()
+            upload.write(b"some bytes")
+    assert str(cm.value) == "Cannot push 'mystuff.charm' to the Store: network broke"
+
+
+def test_streamed_upload_push_failed_at_the_end(store_mock, config, tmp_path):
+    """If the push fails after everything was written, its error is raised."""
+    store_mock.push_stream.side_effect = CommandError("network broke")
+
+    with pytest.raises(CommandError) as cm:
+        with StreamedUpload(config.charmhub, tmp_path / "mystuff.charm"):
+            pass
+    assert str(cm.value) == "network broke"
+
+
+def test_streamed_uploads_mixed(store_mock, config, tmp_path, monkeypatch):
+    """The packages packed through the stream are not uploaded again from their files."""
+    monkeypatch.chdir(tmp_path)
+    store_mock.push_stream.side_effect = _fake_push([])
+    store_mock.upload_pushed.return_value = Uploaded(ok=True, status=200, revision=7, errors=[])
+    store_mock.upload.return_value = Uploaded(ok=True, status=200, revision=8, errors=[])
+    other_charm = tmp_path / "other.charm"
+    _build_zip_with_yaml(other_charm, "metadata.yaml", content={"name": "othercharm"})
+
+    uploads = StreamedUploads(config.charmhub)
+    with uploads.stream("mystuff.charm") as upload:
+        upload.inspector("metadata.yaml", b"name: mycharm")
+        upload.write(b"some bytes")
+
+    assert uploads.upload(tmp_path / "mystuff.charm")
+    assert uploads.upload(other_charm)
+    assert store_mock.mock_calls == [
+        call.ensure_login(),
+        call.push_stream("mystuff.charm", ANY),
+        call.upload_pushed("mycharm", "test-upload-id"),
+        call.upload("othercharm", other_charm),
+    ]
+
+
 # -- tests for list revisions command
 
 
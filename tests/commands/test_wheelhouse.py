@@ -0,0 +1,132 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import datetime
+import logging
+import os
+import time
+from argparse import Namespace
+
+import pytest
+
+from charmcraft.cmdbase import CommandError
+from charmcraft.commands import wheelhouse
+from charmcraft.commands.wheelhouse import WheelhouseCommand, list_wheels
+
+
+@pytest.fixture
+def wheelhouse_dir(tmp_path, monkeypatch):
+    """Provide an empty wheelhouse where the command will look for it."""
+    wheelhouse_dir = tmp_path / "wheelhouse"
+    wheelhouse_dir.mkdir()
+    monkeypatch.setattr(wheelhouse, "get_wheelhouse_path", lambda: wheelhouse_dir)
+    return wheelhouse_dir
+
+
+def _create_wheel(wheelhouse_dir, name, size=10, days_ago=0):
+    """Create a fake wheel in the wheelhouse, last used the indicated days ago."""
+    path = wheelhouse_dir / name
+    path.write_bytes(b"x" * size)
+    timestamp = time.time() - days_ago * 86400
+    os.utime(path, (timestamp, timestamp))
+    return path
+
+
+def test_list_wheels(wheelhouse_dir):
+    """The wheels are parsed from their names and sorted."""
+    _create_wheel(wheelhouse_dir, "PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl", size=100)
+    _create_wheel(wheelhouse_dir, "ops-1.2.0-py3-none-any.whl", size=50)
+    _create_wheel(wheelhouse_dir, "cffi-1.14.6-1-cp38-cp38-linux_x86_64.whl")
+    _create_wheel(wheelhouse_dir, "not-a-wheel.whl")
+    _create_wheel(wheelhouse_dir, "somethingelse.txt")
+
+    wheels = list_wheels(wheelhouse_dir)
+    assert [(w.name, w.version, w.tag, w.size) for w in wheels] == [
+        ("cffi", "1.14.6", "cp38-cp38-linux_x86_64", 10),
+        ("ops", "1.2.0", "py3-none-any", 50),
+        ("PyYAML", "5.4.1", "cp38-cp38-linux_x86_64", 100),
+    ]
+    assert isinstance(wheels[0].last_used, datetime.datetime)
+
+
+def test_list_wheels_missing_wheelhouse(tmp_path):
+    """A wheelhouse that was never created has no wheels."""
+    assert list_wheels(tmp_path / "missing") == []
+
+
+def test_show(caplog, wheelhouse_dir):
+    """The wheels are shown in a table."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    _create_wheel(wheelhouse_dir, "ops-1.2.0-py3-none-any.whl", size=2000)
+
+    args = Namespace(prune=False, older_than=None)
+    WheelhouseCommand("config").run(args)
+
+    lines = caplog.messages
+    assert lines[0].split() == ["Name", "Version", "Tag", "Size", "Last", "used"]
+    assert lines[1].split()[:5] == ["ops", "1.2.0", "py3-none-any", "2.0", "kB"]
+    assert lines[2] == f"Total: 1 wheels, 2.0 kB ({wheelhouse_dir})."
+
+
+def test_show_empty(caplog, wheelhouse_dir):
+    """An empty wheelhouse is reported."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+
+    args = Namespace(prune=False, older_than=None)
+    WheelhouseCommand("config").run(args)
+
+    assert caplog.messages == [f"No wheels in the wheelhouse ({wheelhouse_dir})."]
+
+
+def test_prune_all(caplog, wheelhouse_dir):
+    """All the wheels are removed."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    _create_wheel(wheelhouse_dir, "ops-1.2.0-py3-none-any.whl", size=1000)
+    _create_wheel(wheelhouse_dir, "PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl", size=1000)
+
+    args = Namespace(prune=True, older_than=None)
+    WheelhouseCommand("config").run(args)
+
+    assert list(wheelhouse_dir.iterdir()) == []
+    assert caplog.messages == ["Removed 2 wheels, freeing 2.0 kB."]
+
+
+def test_prune_older_than(caplog, wheelhouse_dir):
+    """Only the wheels not used recently are removed."""
+    caplog.set_level(logging.INFO, logger="charmcraft.commands")
+    _create_wheel(wheelhouse_dir, "ops-1.2.0-py3-none-any.whl", days_ago=1)
+    old = _create_wheel(wheelhouse_dir, "ops-1.1.0-py3-none-any.whl", days_ago=40)
+
+    args = Namespace(prune=True, older_than=30)
+    WheelhouseCommand("config").run(args)
+
+    assert not old.exists()
+    assert [path.name for path in wheelhouse_dir.iterdir()] == ["ops-1.2.0-py3-none-any.whl"]
+    assert caplog.messages == ["Removed 1 wheels, freeing 10 Bytes."]
+
+
+@pytest.mark.parametrize(
+    "args, message",
+    [
+        (Namespace(prune=False, older_than=3), "The --older-than option can only be used"),
+        (Namespace(prune=True, older_than=-1), "The --older-than option must be"),
+    ],
+)
+def test_bad_options(wheelhouse_dir, args, message):
+    """The days option needs pruning and to be valid."""
+    with pytest.raises(CommandError) as cm:
+        WheelhouseCommand("config").run(args)
+    assert str(cm.value).startswith(message)
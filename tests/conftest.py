@@ -18,7 +18,7 @@ import contextlib
 import datetime
 import pathlib
 import tempfile
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from unittest import mock
 
 import pytest
@@ -141,6 +141,22 @@ def clean_already_notified():
     deprecations._ALREADY_NOTIFIED.clear()
 
 
+@pytest.fixture(autouse=True)
+def build_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the charms build cache of each test isolated (and away from the user's one)."""
+    cache_dir = tmp_path_factory.mktemp("build-cache")
+    monkeypatch.setattr("charmcraft.commands.build.get_build_cache_path", lambda: cache_dir)
+    return cache_dir
+
+
+@pytest.fixture(autouse=True)
+def wheelhouse_dir(tmp_path_factory, monkeypatch):
+    """Keep the wheelhouse shared with the instances isolated (and away from the user's one)."""
+    wheelhouse_dir = tmp_path_factory.mktemp("wheelhouse")
+    monkeypatch.setattr("charmcraft.commands.build.get_wheelhouse_path", lambda: wheelhouse_dir)
+    return wheelhouse_dir
+
+
 @pytest.fixture
 def responses():
     """Simple helper to use responses module as a fixture, for easier integration in tests."""
@@ -180,6 +196,8 @@ def fake_provider(mock_instance, monkeypatch):
             base: Base,
             bases_index: int,
             build_on_index: int,
+            output_path: Optional[pathlib.Path] = None,
+            wheelhouse_path: Optional[pathlib.Path] = None,
         ):
             yield mock_instance
 
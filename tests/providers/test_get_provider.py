@@ -19,7 +19,15 @@ from unittest import mock
 
 import pytest
 
-from charmcraft.providers import LXDProvider, MultipassProvider, get_provider
+from charmcraft.cmdbase import CommandError
+from charmcraft.providers import (
+    LXDProvider,
+    LXDRemote,
+    MultipassProvider,
+    get_keep_alive,
+    get_lxd_remotes,
+    get_provider,
+)
 from charmcraft.snap import CharmcraftSnapConfiguration
 
 
@@ -72,3 +80,60 @@ def test_get_provider_snap_config(mock_is_snap, mock_snap_config):
 
     mock_snap_config.return_value = CharmcraftSnapConfiguration(provider="multipass")
     assert isinstance(get_provider(), MultipassProvider)
+
+
+def test_get_lxd_remotes_default():
+    assert get_lxd_remotes() == []
+
+
+def test_get_lxd_remotes_developer_mode_env(monkeypatch, mock_is_developer_mode):
+    mock_is_developer_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_LXD_REMOTES", "host1:2,host2")
+    assert get_lxd_remotes() == [LXDRemote("host1", 2), LXDRemote("host2", 1)]
+
+
+def test_get_lxd_remotes_env_ignored_if_not_developer_mode(monkeypatch):
+    monkeypatch.setenv("CHARMCRAFT_LXD_REMOTES", "host1:2,host2")
+    assert get_lxd_remotes() == []
+
+
+def test_get_lxd_remotes_snap_config(mock_is_snap, mock_snap_config):
+    mock_is_snap.return_value = True
+    mock_snap_config.return_value = CharmcraftSnapConfiguration(lxd_remotes="host1:3")
+    assert get_lxd_remotes() == [LXDRemote("host1", 3)]
+
+
+def test_get_lxd_remotes_invalid(monkeypatch, mock_is_developer_mode):
+    mock_is_developer_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_LXD_REMOTES", "host1:0")
+    with pytest.raises(CommandError) as cm:
+        get_lxd_remotes()
+    assert str(cm.value) == (
+        "Invalid LXD remotes configuration: invalid capacity for LXD remote 'host1' "
+        "(must be >= 1)."
+    )
+
+
+def test_get_keep_alive_default():
+    assert get_keep_alive() == 0
+
+
+def test_get_keep_alive_developer_mode_env(monkeypatch, mock_is_developer_mode):
+    mock_is_developer_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_KEEP_ALIVE", "15")
+    assert get_keep_alive() == 15
+    assert get_provider().keep_alive == 15
+
+
+def test_get_keep_alive_snap_config(mock_is_snap, mock_snap_config):
+    mock_is_snap.return_value = True
+    mock_snap_config.return_value = CharmcraftSnapConfiguration(keep_alive=30)
+    assert get_keep_alive() == 30
+
+
+def test_get_keep_alive_invalid(monkeypatch, mock_is_developer_mode):
+    mock_is_developer_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_KEEP_ALIVE", "-1")
+    with pytest.raises(CommandError) as cm:
+        get_keep_alive()
+    assert str(cm.value) == "Invalid keep alive configuration: '-1' is not a number of minutes."
@@ -69,3 +69,27 @@ def test_capture_logs_from_instance_not_found(
         mock.call.pull_file(source=pathlib.Path("/tmp/charmcraft.log"), destination=fake_log),
     ]
     assert ["No logs found in instance."] == [rec.message for rec in caplog.records]
+
+
+def test_capture_logs_from_host(caplog, mock_instance, tmp_path):
+    """The log written in a directory mounted from the host is read there."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    host_log_path = tmp_path / "test.charm.log"
+    host_log_path.write_text("some\nlog data")
+
+    providers.capture_logs_from_instance(mock_instance, host_log_path=host_log_path)
+
+    assert mock_instance.mock_calls == []
+    expected = ["Logs captured from managed instance:", ":: some", ":: log data"]
+    assert expected == [rec.message for rec in caplog.records]
+    assert host_log_path.exists()
+
+
+def test_capture_logs_from_host_not_found(caplog, mock_instance, tmp_path):
+    """The log was not written in the directory mounted from the host."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+
+    providers.capture_logs_from_instance(mock_instance, host_log_path=tmp_path / "test.charm.log")
+
+    assert mock_instance.mock_calls == []
+    assert ["No logs found in instance."] == [rec.message for rec in caplog.records]
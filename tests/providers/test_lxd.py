@@ -16,6 +16,10 @@
 
 import pathlib
 import re
+import tarfile
+import threading
+import time
+from subprocess import DEVNULL, CalledProcessError
 from unittest import mock
 from unittest.mock import call
 
@@ -24,6 +28,7 @@ from craft_providers import bases
 from craft_providers.lxd import LXDError, LXDInstallationError
 
 from charmcraft import providers
+from charmcraft.providers import _lxd
 from charmcraft.cmdbase import CommandError
 from charmcraft.config import Base
 
@@ -96,8 +101,9 @@ def mock_lxd_is_installed():
 
 @pytest.fixture
 def mock_lxd_launch():
-    with mock.patch("craft_providers.lxd.launch", autospec=True) as mock_lxd_launch:
-        yield mock_lxd_launch
+    with mock.patch("charmcraft.providers._lxd._ensure_project_exists"):
+        with mock.patch("craft_providers.lxd.launch", autospec=True) as mock_lxd_launch:
+            yield mock_lxd_launch
 
 
 def test_clean_project_environments_without_lxd(mock_lxc, mock_lxd_is_installed, mock_path):
@@ -463,6 +469,50 @@ def test_launched_environment(
     ]
 
 
+def test_launched_environment_output_path(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    """The output directory is mounted in the instance, besides the project."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider()
+    output_path = tmp_path / "output"
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+        output_path=output_path,
+    ):
+        assert mock_lxd_launch.return_value.mount.mock_calls == [
+            call(host_source=tmp_path, target=pathlib.Path("/root/project")),
+            call(host_source=output_path, target=pathlib.Path("/root/output")),
+        ]
+
+
+def test_launched_environment_wheelhouse_path(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    """The host's wheelhouse is mounted in the instance, besides the project."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider()
+    wheelhouse_path = tmp_path / "wheelhouse"
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+        wheelhouse_path=wheelhouse_path,
+    ):
+        assert mock_lxd_launch.return_value.mount.mock_calls == [
+            call(host_source=tmp_path, target=pathlib.Path("/root/project")),
+            call(host_source=wheelhouse_path, target=pathlib.Path("/root/wheelhouse")),
+        ]
+
+
 def test_launched_environment_launch_base_configuration_error(
     mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
 ):
@@ -528,6 +578,56 @@ def test_launched_environment_unmounts_and_stops_after_error(
     ]
 
 
+def test_launched_environment_kept_alive(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    """The instance is kept running after used, scheduled to stop by itself."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider(keep_alive=10)
+    mock_instance = mock_lxd_launch.return_value
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+    ):
+        # a stop scheduled when it was used before is cancelled
+        assert mock_instance.execute_run.mock_calls == [
+            call(["shutdown", "-c"], check=False, stdout=DEVNULL, stderr=DEVNULL)
+        ]
+        mock_instance.reset_mock()
+
+    assert mock_instance.mock_calls == [
+        call.unmount_all(),
+        call.execute_run(
+            ["shutdown", "--poweroff", "+10"], check=True, stdout=DEVNULL, stderr=DEVNULL
+        ),
+    ]
+
+
+def test_launched_environment_kept_alive_error(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    """The instance is stopped if it can not be scheduled to stop by itself."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider(keep_alive=10)
+    mock_instance = mock_lxd_launch.return_value
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+    ):
+        mock_instance.reset_mock()
+        mock_instance.execute_run.side_effect = CalledProcessError(1, ["shutdown"])
+
+    assert mock_instance.mock_calls[-1] == call.stop()
+
+
 def test_launched_environment_unmount_all_error(
     mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
 ):
@@ -568,3 +668,180 @@ def test_launched_environment_stop_error(
             pass
 
     assert exc_info.value.__cause__ is error
+
+
+@pytest.mark.parametrize("lxd_remote, mounts_project", [("local", True), ("buildhost", False)])
+def test_mounts_project(lxd_remote, mounts_project):
+    provider = providers.LXDProvider(lxd_remote=lxd_remote)
+
+    assert provider.mounts_project is mounts_project
+
+
+def test_launched_environment_in_remote_pushes_project(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    project_path = tmp_path / "project"
+    (project_path / "src").mkdir(parents=True)
+    (project_path / "src" / "charm.py").write_text("code")
+    (project_path / "metadata.yaml").write_text("name: test-charm")
+    (project_path / "build" / "venv").mkdir(parents=True)
+    (project_path / "test-charm_ubuntu-20.04-amd64.charm").write_text("previous")
+    # what the charm builder ignores is not transferred either (but the root files are)
+    (project_path / ".git").mkdir()
+    (project_path / ".git" / "HEAD").write_text("ref")
+    (project_path / "node_modules" / "left-pad").mkdir(parents=True)
+    (project_path / "src" / "notes.log").write_text("log")
+    (project_path / "requirements.txt").write_text("ops")
+    (project_path / ".jujuignore").write_text("node_modules\n*.log\n/requirements.txt\n")
+    transferred = []
+
+    def fake_push_file(*, source, destination):
+        with tarfile.open(source) as tar:
+            transferred.extend(
+                sorted(pathlib.PurePath(name).as_posix() for name in tar.getnames())
+            )
+
+    mock_instance = mock_lxd_launch.return_value
+    mock_instance.push_file.side_effect = fake_push_file
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider(lxd_remote="buildhost")
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=project_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+    ):
+        assert mock_instance.mount.mock_calls == []
+        assert mock_instance.execute_run.mock_calls == [
+            call(["rm", "-rf", "/root/project"], check=True),
+            call(["mkdir", "-p", "/root/project"], check=True),
+            call(["tar", "-xf", "/root/project.tar", "-C", "/root/project"], check=True),
+            call(["rm", "/root/project.tar"], check=True),
+        ]
+        assert mock_instance.push_file.mock_calls == [
+            call(source=mock.ANY, destination=pathlib.Path("/root/project.tar"))
+        ]
+
+    assert transferred == [
+        ".",
+        ".jujuignore",
+        "metadata.yaml",
+        "requirements.txt",
+        "src",
+        "src/charm.py",
+    ]
+    assert mock_lxd_launch.mock_calls[0].kwargs["remote"] == "buildhost"
+    # the host's user does not exist in the remote
+    assert mock_lxd_launch.mock_calls[0].kwargs["map_user_uid"] is False
+
+
+def test_launched_environment_in_remote_push_error(
+    mock_buildd_base_configuration, mock_configure_buildd_image_remote, mock_lxd_launch, tmp_path
+):
+    error = LXDError(brief="fail")
+    mock_lxd_launch.return_value.push_file.side_effect = error
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.LXDProvider(lxd_remote="buildhost")
+
+    with pytest.raises(CommandError, match="Failed to transfer the project") as exc_info:
+        with provider.launched_environment(
+            charm_name="test-charm",
+            project_path=tmp_path,
+            base=base,
+            bases_index=1,
+            build_on_index=2,
+        ):
+            pass
+
+    assert exc_info.value.__cause__ is error
+    # the instance is not left running
+    assert mock_lxd_launch.return_value.stop.mock_calls == [call()]
+
+
+def test_ensure_project_exists_creates_it_once(mock_lxc):
+    """The project is created only if missing, even if requested from several threads."""
+    projects = ["default"]
+
+    def fake_create(*, lxc, project, remote):
+        time.sleep(0.05)  # give the other threads the chance to also see it missing
+        projects.append(project)
+
+    mock_lxc.project_list.side_effect = lambda remote: list(projects)
+    with mock.patch("craft_providers.lxd.project.create_with_default_profile") as mock_create:
+        mock_create.side_effect = fake_create
+        threads = [
+            threading.Thread(
+                target=_lxd._ensure_project_exists, args=(mock_lxc, "charmcraft", "local")
+            )
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert mock_create.mock_calls == [call(lxc=mock_lxc, project="charmcraft", remote="local")]
+    assert projects == ["default", "charmcraft"]
+
+
+def test_ensure_project_exists_error(mock_lxc):
+    """Errors creating the project are raised (and converted by the caller)."""
+    mock_lxc.project_list.return_value = ["default"]
+    error = LXDError(brief="fail")
+    with mock.patch("craft_providers.lxd.project.create_with_default_profile") as mock_create:
+        mock_create.side_effect = error
+        with pytest.raises(LXDError):
+            _lxd._ensure_project_exists(mock_lxc, "charmcraft", "local")
+
+
+@pytest.mark.parametrize(
+    "channels, max_concurrent", [(["20.04", "20.04"], 1), (["20.04", "18.04"], 2)]
+)
+def test_launched_environment_same_base_serialized(
+    mock_buildd_base_configuration,
+    mock_configure_buildd_image_remote,
+    mock_lxd_launch,
+    tmp_path,
+    channels,
+    max_concurrent,
+):
+    """Instances for the same base are launched one at a time, as they share the snapshot."""
+    running = []
+    concurrent = []
+    running_lock = threading.Lock()
+
+    def fake_launch(**kwargs):
+        with running_lock:
+            running.append(kwargs["name"])
+            concurrent.append(len(running))
+        time.sleep(0.1)
+        with running_lock:
+            running.remove(kwargs["name"])
+        return mock.MagicMock()
+
+    mock_lxd_launch.side_effect = fake_launch
+    provider = providers.LXDProvider()
+
+    def _launch(bases_index, channel):
+        base = Base(name="ubuntu", channel=channel, architectures=["host-arch"])
+        with provider.launched_environment(
+            charm_name="test-charm",
+            project_path=tmp_path,
+            base=base,
+            bases_index=bases_index,
+            build_on_index=0,
+        ):
+            pass
+
+    threads = [
+        threading.Thread(target=_launch, args=(idx, channel))
+        for idx, channel in enumerate(channels)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(concurrent) == max_concurrent
@@ -16,6 +16,7 @@
 
 import pathlib
 import re
+from subprocess import DEVNULL
 from unittest import mock
 from unittest.mock import call
 
@@ -449,6 +450,79 @@ def test_launched_environment(
     ]
 
 
+def test_launched_environment_output_path(
+    mock_buildd_base_configuration, mock_multipass_launch, tmp_path
+):
+    """The output directory is mounted in the instance, besides the project."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.MultipassProvider()
+    output_path = tmp_path / "output"
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+        output_path=output_path,
+    ):
+        assert mock_multipass_launch.return_value.mount.mock_calls == [
+            call(host_source=tmp_path, target=pathlib.Path("/root/project")),
+            call(host_source=output_path, target=pathlib.Path("/root/output")),
+        ]
+
+
+def test_launched_environment_wheelhouse_path(
+    mock_buildd_base_configuration, mock_multipass_launch, tmp_path
+):
+    """The host's wheelhouse is mounted in the instance, besides the project."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.MultipassProvider()
+    wheelhouse_path = tmp_path / "wheelhouse"
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+        wheelhouse_path=wheelhouse_path,
+    ):
+        assert mock_multipass_launch.return_value.mount.mock_calls == [
+            call(host_source=tmp_path, target=pathlib.Path("/root/project")),
+            call(host_source=wheelhouse_path, target=pathlib.Path("/root/wheelhouse")),
+        ]
+
+
+def test_launched_environment_kept_alive(
+    mock_buildd_base_configuration, mock_multipass_launch, tmp_path
+):
+    """The instance is kept running after used, scheduled to stop by itself."""
+    base = Base(name="ubuntu", channel="20.04", architectures=["host-arch"])
+    provider = providers.MultipassProvider(keep_alive=10)
+    mock_instance = mock_multipass_launch.return_value
+
+    with provider.launched_environment(
+        charm_name="test-charm",
+        project_path=tmp_path,
+        base=base,
+        bases_index=1,
+        build_on_index=2,
+    ):
+        # a stop scheduled when it was used before is cancelled
+        assert mock_instance.execute_run.mock_calls == [
+            call(["shutdown", "-c"], check=False, stdout=DEVNULL, stderr=DEVNULL)
+        ]
+        mock_instance.reset_mock()
+
+    assert mock_instance.mock_calls == [
+        call.unmount_all(),
+        call.execute_run(
+            ["shutdown", "--poweroff", "+10"], check=True, stdout=DEVNULL, stderr=DEVNULL
+        ),
+    ]
+
+
 def test_launched_environment_unmounts_and_stops_after_error(
     mock_buildd_base_configuration, mock_multipass_launch, tmp_path
 ):
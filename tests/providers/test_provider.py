@@ -49,6 +49,7 @@ def test_get_command_environment_all_opts(monkeypatch):
     monkeypatch.setenv("http_proxy", "test-http-proxy")
     monkeypatch.setenv("https_proxy", "test-https-proxy")
     monkeypatch.setenv("no_proxy", "test-no-proxy")
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
     provider = providers.LXDProvider()
 
     env = provider.get_command_environment()
@@ -59,6 +60,7 @@ def test_get_command_environment_all_opts(monkeypatch):
         "http_proxy": "test-http-proxy",
         "https_proxy": "test-https-proxy",
         "no_proxy": "test-no-proxy",
+        "SOURCE_DATE_EPOCH": "1633046400",
     }
 
 
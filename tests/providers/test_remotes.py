@@ -0,0 +1,100 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import threading
+
+import pytest
+
+from charmcraft.providers import LXDRemote, RemoteScheduler, parse_lxd_remotes
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("", []),
+        ("host1", [LXDRemote("host1", 1)]),
+        ("host1:4, host2", [LXDRemote("host1", 4), LXDRemote("host2", 1)]),
+        ("host1:2,,host2:3,", [LXDRemote("host1", 2), LXDRemote("host2", 3)]),
+    ],
+)
+def test_parse_lxd_remotes(value, expected):
+    assert parse_lxd_remotes(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        (":3", "missing LXD remote name in ':3'"),
+        ("host1:0", "invalid capacity for LXD remote 'host1' (must be >= 1)"),
+        ("host1:many", "invalid capacity for LXD remote 'host1' (must be >= 1)"),
+        ("host1,host1:2", "LXD remote 'host1' is duplicated"),
+    ],
+)
+def test_parse_lxd_remotes_invalid(value, message):
+    with pytest.raises(ValueError) as cm:
+        parse_lxd_remotes(value)
+    assert str(cm.value) == message
+
+
+def test_scheduler_least_loaded():
+    """The builds go to the least loaded remote, relative to its capacity."""
+    scheduler = RemoteScheduler([LXDRemote("small", 1), LXDRemote("big", 3)])
+
+    acquired = [scheduler.acquire().name for _ in range(4)]
+    assert acquired == ["small", "big", "big", "big"]
+    assert scheduler.running == {"small": 1, "big": 3}
+
+    scheduler.release(LXDRemote("big", 3))
+    assert scheduler.acquire().name == "big"
+
+
+def test_scheduler_ties_in_order():
+    """With the same load, the remotes are used in the configured order."""
+    scheduler = RemoteScheduler([LXDRemote("one", 2), LXDRemote("two", 2)])
+    acquired = [scheduler.acquire().name for _ in range(4)]
+    assert acquired == ["one", "two", "one", "two"]
+
+
+def test_scheduler_waits_when_full():
+    """When all the remotes are at full capacity, it waits for one to be released."""
+    remote = LXDRemote("only", 1)
+    scheduler = RemoteScheduler([remote])
+    scheduler.acquire()
+
+    acquired = threading.Event()
+
+    def _acquire():
+        scheduler.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=_acquire)
+    thread.start()
+    assert not acquired.wait(timeout=0.1)
+
+    scheduler.release(remote)
+    assert acquired.wait(timeout=5)
+    thread.join()
+
+
+def test_scheduler_reserved():
+    """The remote is released when the context ends, even on errors."""
+    scheduler = RemoteScheduler([LXDRemote("only", 1)])
+    with pytest.raises(ValueError):
+        with scheduler.reserved() as remote:
+            assert remote.name == "only"
+            assert scheduler.running == {"only": 1}
+            raise ValueError()
+    assert scheduler.running == {"only": 0}
@@ -0,0 +1,196 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+from unittest import mock
+
+import pytest
+
+from charmcraft import __version__, agent
+from charmcraft.cmdbase import CommandError
+from charmcraft.snap import CharmcraftSnapConfiguration
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+
+
+# -- tests for the configuration
+
+
+@pytest.fixture
+def mock_config_sources():
+    """Control where the build agent configuration comes from."""
+    with mock.patch(
+        "charmcraft.agent.is_charmcraft_running_in_developer_mode", return_value=False
+    ) as mock_dev_mode:
+        with mock.patch(
+            "charmcraft.agent.is_charmcraft_running_from_snap", return_value=False
+        ) as mock_is_snap:
+            with mock.patch(
+                "charmcraft.agent.get_snap_configuration", return_value=None
+            ) as mock_snap_config:
+                yield mock_dev_mode, mock_is_snap, mock_snap_config
+
+
+def test_build_agent_default(mock_config_sources, monkeypatch):
+    monkeypatch.setenv("CHARMCRAFT_BUILD_AGENT", "1")
+    assert agent.is_build_agent_enabled() is False
+
+
+def test_build_agent_developer_mode_env(mock_config_sources, monkeypatch):
+    mock_dev_mode, _, _ = mock_config_sources
+    mock_dev_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_BUILD_AGENT", "1")
+    assert agent.is_build_agent_enabled() is True
+
+
+@pytest.mark.parametrize("value, expected", [(True, True), (False, False), ("yes", True)])
+def test_build_agent_snap_config(mock_config_sources, value, expected):
+    _, mock_is_snap, mock_snap_config = mock_config_sources
+    mock_is_snap.return_value = True
+    mock_snap_config.return_value = CharmcraftSnapConfiguration(build_agent=value)
+    assert agent.is_build_agent_enabled() is expected
+
+
+def test_build_agent_invalid(mock_config_sources, monkeypatch):
+    mock_dev_mode, _, _ = mock_config_sources
+    mock_dev_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_BUILD_AGENT", "sometimes")
+    with pytest.raises(CommandError) as cm:
+        agent.is_build_agent_enabled()
+    assert str(cm.value) == "Invalid build agent configuration: 'sometimes' is not a boolean."
+
+
+def test_client_command():
+    """The client is run with the instance's Python, followed by the command to request."""
+    cmd = agent.get_agent_client_command(["charmcraft", "pack", "--bases-index", "0"])
+    assert cmd[:2] == ["python3", "-c"]
+    assert cmd[3:] == [
+        f"/root/.charmcraft-agent-{__version__}.sock",
+        "charmcraft",
+        "pack",
+        "--bases-index",
+        "0",
+    ]
+
+
+# -- tests for the agent and its client
+
+
+def _fake_main(argv):
+    """Show what was requested, failing with a specific code."""
+    print(f"argv: {argv}")
+    print(f"cwd: {os.getcwd()}")
+    print(f"env: {os.environ.get('TEST_AGENT_VAR')}")
+    return 3
+
+
+@pytest.fixture
+def running_agent(tmp_path, monkeypatch):
+    """Run an agent (with a fake charmcraft) in a thread, until idle for a short time."""
+    socket_path = str(tmp_path / "agent.sock")
+    monkeypatch.setattr(agent, "AGENT_IDLE_TIMEOUT", 1)
+    with mock.patch("charmcraft.main.main", _fake_main):
+        thread = threading.Thread(target=agent.serve, args=(socket_path,))
+        thread.start()
+        try:
+            yield socket_path
+        finally:
+            thread.join()
+    assert not os.path.exists(socket_path)
+
+
+def _wait_listening(socket_path):
+    """Wait for the agent to be listening in the socket."""
+    for _ in range(500):
+        with socket.socket(socket.AF_UNIX) as sock:
+            try:
+                sock.connect(socket_path)
+            except OSError:
+                pass
+            else:
+                sock.sendall(b"\n")  # an empty request is ignored
+                return
+        threading.Event().wait(0.01)
+    pytest.fail("the agent never started to listen")
+
+
+def test_agent_request_through_client(running_agent, tmp_path):
+    """The client sends the request, the agent runs it and returns its output and code."""
+    _wait_listening(running_agent)
+    cmd = agent.get_agent_client_command(["charmcraft", "pack"])
+    cmd[0] = sys.executable
+    cmd[3] = running_agent
+    proc = subprocess.run(
+        cmd,
+        cwd=tmp_path,
+        env=dict(os.environ, TEST_AGENT_VAR="from-client"),
+        stdout=subprocess.PIPE,
+        check=False,
+    )
+    assert proc.returncode == 3
+    assert proc.stdout.decode().splitlines() == [
+        "argv: ['charmcraft', 'pack']",
+        f"cwd: {tmp_path}",
+        "env: from-client",
+    ]
+
+
+def test_agent_serves_several_requests(running_agent, tmp_path):
+    """The same agent serves all the requests, each run in a new process."""
+    _wait_listening(running_agent)
+    for idx in range(3):
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(running_agent)
+            request = {"argv": ["charmcraft", str(idx)], "cwd": str(tmp_path), "env": {}}
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            response = b""
+            while True:
+                data = sock.recv(1024)
+                if not data:
+                    break
+                response += data
+        assert response.startswith(f"argv: ['charmcraft', '{idx}']\n".encode())
+        assert response.endswith(b"env: None\n\x03")
+
+
+def test_agent_invalid_request(running_agent):
+    """Invalid requests are ignored, closing the connection without a response."""
+    _wait_listening(running_agent)
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(running_agent)
+        sock.sendall(b'{"argv": "not a list", "cwd": "/", "env": {}}\n')
+        assert sock.recv(1024) == b""
+
+
+def test_agent_already_running(running_agent):
+    """Another agent in the same socket exits right away, leaving the running one."""
+    _wait_listening(running_agent)
+    assert agent.serve(running_agent) == 0
+    assert os.path.exists(running_agent)
+
+
+@pytest.mark.parametrize(
+    "status, expected",
+    [(0, 0), (3 << 8, 3), (9, 128 + 9)],
+)
+def test_get_exit_code(status, expected):
+    """The exit code is the one of the process, or a signal indication if killed."""
+    assert agent._get_exit_code(status) == expected
@@ -0,0 +1,382 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import http.server
+import logging
+import os
+import sys
+import threading
+import zipfile
+from unittest import mock
+
+import pytest
+
+from charmcraft.buildcache import (
+    MAX_CACHED_PER_CHARM,
+    BuildCache,
+    FilesystemSharedCache,
+    HTTPSharedCache,
+    get_shared_cache,
+    hash_file,
+    hash_project_tree,
+    is_valid_charm,
+    parse_shared_cache,
+)
+from charmcraft.cmdbase import CommandError
+from charmcraft.snap import CharmcraftSnapConfiguration
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Provide a simple project."""
+    project_dir = tmp_path / "project"
+    (project_dir / "src").mkdir(parents=True)
+    (project_dir / "src" / "charm.py").write_text("code")
+    (project_dir / "metadata.yaml").write_text("name: test")
+    (project_dir / "requirements.txt").write_text("ops")
+    return project_dir
+
+
+def _create_file(path):
+    """Create a file, and the directories it's in."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("content")
+
+
+# -- tests for the project hashing
+
+
+def test_hash_project_tree_stable(project):
+    """The hash does not change if the sources do not."""
+    assert hash_project_tree(project) == hash_project_tree(project)
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda p: (p / "src" / "charm.py").write_text("new code"),
+        lambda p: (p / "src" / "other.py").write_text(""),
+        lambda p: (p / "requirements.txt").unlink(),
+        lambda p: (p / "src" / "charm.py").rename(p / "src" / "renamed.py"),
+        lambda p: (p / "src" / "charm.py").chmod(0o755),
+    ],
+)
+def test_hash_project_tree_changed(project, change):
+    """The hash changes with the content, names and kind of the files."""
+    original = hash_project_tree(project)
+    change(project)
+    assert hash_project_tree(project) != original
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda p: (p / "test.charm").write_text("charm"),
+        lambda p: (p / "charmcraft.yaml").write_text("type: charm"),
+        lambda p: _create_file(p / "build" / "stuff"),
+        lambda p: _create_file(p / ".git" / "HEAD"),
+        lambda p: (p / "src" / "charm.py").touch(),
+    ],
+)
+def test_hash_project_tree_not_sources(project, change):
+    """The hash does not change with what is not part of the sources."""
+    original = hash_project_tree(project)
+    change(project)
+    assert hash_project_tree(project) == original
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_hash_project_tree_symlink_loop(project):
+    """Symlinked directories are not walked into, so loops are fine."""
+    (project / "src" / "loop").symlink_to(".")
+    original = hash_project_tree(project)
+    assert hash_project_tree(project) == original
+
+
+def test_hash_project_tree_jujuignore(project):
+    """Files ignored in .jujuignore are not considered (but the ignore file itself is)."""
+    (project / ".jujuignore").write_text("/tests\n*.log\n")
+    original = hash_project_tree(project)
+
+    (project / "tests").mkdir()
+    (project / "tests" / "test_charm.py").write_text("tests")
+    (project / "src" / "debug.log").write_text("log")
+    assert hash_project_tree(project) == original
+
+    (project / "tests.txt").write_text("not ignored")
+    assert hash_project_tree(project) != original
+
+
+def test_hash_project_tree_rules_source(project, caplog):
+    """The ignore rules are logged with where they come from."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft.jujuignore")
+    (project / ".jujuignore").write_text("/tests\n")
+    hash_project_tree(project)
+    translated = [msg for msg in caplog.messages if msg.startswith("Translated")]
+    assert translated
+    assert all(
+        msg.startswith(("Translated .jujuignore defaults:", "Translated .jujuignore .jujuignore:"))
+        for msg in translated
+    )
+    assert any(msg.startswith("Translated .jujuignore .jujuignore:1 ") for msg in translated)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_hash_project_tree_symlinks(project, tmp_path):
+    """Symlinked directories are considered by their target, not walked into."""
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "lib.py").write_text("lib")
+    (project / "lib").symlink_to(outside)
+    original = hash_project_tree(project)
+
+    # the builder ignores what is outside the project, so it does not matter
+    (outside / "lib.py").write_text("new lib")
+    assert hash_project_tree(project) == original
+
+    (project / "lib").unlink()
+    (project / "lib").symlink_to(os.path.relpath(outside, project))
+    assert hash_project_tree(project) != original
+
+
+def test_hash_file(tmp_path):
+    """Files are hashed by their content, missing ones have an empty hash."""
+    (tmp_path / "one.txt").write_text("same")
+    (tmp_path / "two.txt").write_text("same")
+    assert hash_file(tmp_path / "one.txt") == hash_file(tmp_path / "two.txt")
+    assert hash_file(tmp_path / "one.txt") != ""
+    assert hash_file(tmp_path / "missing.txt") == ""
+
+
+# -- tests for the cache
+
+
+def test_cache_put_get(tmp_path):
+    """A stored charm is found by its name and key."""
+    cache = BuildCache(tmp_path / "cache")
+    charm = tmp_path / "test.charm"
+    charm.write_bytes(b"charm content")
+
+    assert cache.get("test.charm", "key1") is None
+    cache.put("test.charm", "key1", charm)
+
+    cached = cache.get("test.charm", "key1")
+    assert cached.read_bytes() == b"charm content"
+    assert cache.get("test.charm", "key2") is None
+    assert cache.get("other.charm", "key1") is None
+
+
+def test_cache_put_missing(tmp_path):
+    """Nothing is stored if the charm is not there."""
+    cache = BuildCache(tmp_path / "cache")
+    cache.put("test.charm", "key1", tmp_path / "test.charm")
+    assert cache.get("test.charm", "key1") is None
+
+
+def test_cache_put_removes_least_recently_used(tmp_path):
+    """Only the most recently used charms are kept."""
+    cache = BuildCache(tmp_path / "cache")
+    charm = tmp_path / "test.charm"
+    charm.write_bytes(b"charm content")
+
+    keys = [f"key{idx}" for idx in range(MAX_CACHED_PER_CHARM + 1)]
+    for idx, key in enumerate(keys[:-1]):
+        cache.put("test.charm", key, charm)
+        os.utime(tmp_path / "cache" / "test.charm" / key, (idx, idx))
+
+    # use the oldest one, and store a new one
+    assert cache.get("test.charm", keys[0]) is not None
+    cache.put("test.charm", keys[-1], charm)
+
+    assert cache.get("test.charm", keys[1]) is None
+    for key in [keys[0]] + keys[2:]:
+        assert cache.get("test.charm", key) is not None
+
+
+# -- tests for the shared caches
+
+
+class _CacheRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Minimal cache server: GET and PUT of the content by path."""
+
+    def do_GET(self):  # noqa: N802 (the name is the one the base class expects)
+        content = self.server.storage.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_PUT(self):  # noqa: N802 (the name is the one the base class expects)
+        if self.server.fail_puts:
+            self.send_response(500)
+            self.end_headers()
+            return
+        size = int(self.headers["Content-Length"])
+        self.server.storage[self.path] = self.rfile.read(size)
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cache_server():
+    """Provide a local HTTP server working as a shared cache."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _CacheRequestHandler)
+    server.storage = {}
+    server.fail_puts = False
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    server.url = "http://127.0.0.1:{}/charms".format(server.server_address[1])
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _create_charm(path, content=b"code"):
+    """Create a valid charm file."""
+    with zipfile.ZipFile(path, "w") as zipfh:
+        zipfh.writestr("src/charm.py", content)
+    return path
+
+
+@pytest.mark.parametrize("kind", ["filesystem", "http"])
+def test_shared_cache_store_fetch(tmp_path, cache_server, kind):
+    """A charm stored by one machine is fetched by the others."""
+    if kind == "filesystem":
+        shared_cache = FilesystemSharedCache(tmp_path / "nfs")
+    else:
+        shared_cache = HTTPSharedCache(cache_server.url)
+    charm = _create_charm(tmp_path / "test.charm")
+    destination = tmp_path / "fetched.charm"
+
+    assert shared_cache.fetch("abcdef", destination) is False
+    shared_cache.store("abcdef", charm)
+    assert shared_cache.fetch("abcdef", destination) is True
+    assert destination.read_bytes() == charm.read_bytes()
+    assert shared_cache.fetch("other", destination) is False
+
+
+def test_shared_cache_filesystem_layout(tmp_path):
+    """The charms are stored in the directory by their key, without leftovers."""
+    shared_cache = FilesystemSharedCache(tmp_path / "nfs")
+    shared_cache.store("abcdef", _create_charm(tmp_path / "test.charm"))
+    assert [path.name for path in (tmp_path / "nfs" / "ab").iterdir()] == ["abcdef"]
+
+
+def test_shared_cache_http_paths(tmp_path, cache_server):
+    """The charms are stored in the server by their key under the URL."""
+    shared_cache = HTTPSharedCache(cache_server.url + "/")
+    shared_cache.store("abcdef", _create_charm(tmp_path / "test.charm"))
+    assert list(cache_server.storage) == ["/charms/abcdef"]
+
+
+def test_shared_cache_http_errors(tmp_path, cache_server):
+    """Problems with the server are reported as OSError."""
+    cache_server.fail_puts = True
+    shared_cache = HTTPSharedCache(cache_server.url)
+    with pytest.raises(OSError, match="cannot put 'abcdef'"):
+        shared_cache.store("abcdef", _create_charm(tmp_path / "test.charm"))
+
+    shared_cache = HTTPSharedCache("http://127.0.0.1:1/charms")
+    with pytest.raises(OSError, match="cannot get 'abcdef'"):
+        shared_cache.fetch("abcdef", tmp_path / "fetched.charm")
+
+
+def test_is_valid_charm(tmp_path):
+    """Only complete zips are valid charms."""
+    charm = _create_charm(tmp_path / "test.charm", content=os.urandom(10000))
+    assert is_valid_charm(charm)
+
+    truncated = tmp_path / "truncated.charm"
+    truncated.write_bytes(charm.read_bytes()[:5000])
+    assert not is_valid_charm(truncated)
+    assert not is_valid_charm(tmp_path / "missing.charm")
+
+
+@pytest.mark.parametrize(
+    "value, kind, location",
+    [
+        ("http://cache:8080/charms/", HTTPSharedCache, "http://cache:8080/charms"),
+        ("https://cache/charms", HTTPSharedCache, "https://cache/charms"),
+        ("/mnt/nfs/charms", FilesystemSharedCache, "/mnt/nfs/charms"),
+        ("file:///mnt/nfs/charms", FilesystemSharedCache, "/mnt/nfs/charms"),
+    ],
+)
+def test_parse_shared_cache(value, kind, location):
+    shared_cache = parse_shared_cache(value)
+    assert isinstance(shared_cache, kind)
+    assert str(shared_cache) == location
+
+
+@pytest.mark.parametrize("value", ["relative/dir", "ftp://cache/charms"])
+def test_parse_shared_cache_invalid(value):
+    with pytest.raises(ValueError) as cm:
+        parse_shared_cache(value)
+    assert str(cm.value) == f"{value!r} is not a HTTP(S) URL or an absolute path"
+
+
+@pytest.fixture
+def mock_config_sources():
+    """Control where the shared cache configuration comes from."""
+    with mock.patch(
+        "charmcraft.buildcache.is_charmcraft_running_in_developer_mode", return_value=False
+    ) as mock_dev_mode:
+        with mock.patch(
+            "charmcraft.buildcache.is_charmcraft_running_from_snap", return_value=False
+        ) as mock_is_snap:
+            with mock.patch(
+                "charmcraft.buildcache.get_snap_configuration", return_value=None
+            ) as mock_snap_config:
+                yield mock_dev_mode, mock_is_snap, mock_snap_config
+
+
+def test_get_shared_cache_default(mock_config_sources, monkeypatch):
+    monkeypatch.setenv("CHARMCRAFT_SHARED_CACHE", "/mnt/nfs/charms")
+    assert get_shared_cache() is None
+
+
+def test_get_shared_cache_developer_mode_env(mock_config_sources, monkeypatch):
+    mock_dev_mode, _, _ = mock_config_sources
+    mock_dev_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_SHARED_CACHE", "/mnt/nfs/charms")
+    assert str(get_shared_cache()) == "/mnt/nfs/charms"
+
+
+def test_get_shared_cache_snap_config(mock_config_sources):
+    _, mock_is_snap, mock_snap_config = mock_config_sources
+    mock_is_snap.return_value = True
+    mock_snap_config.return_value = CharmcraftSnapConfiguration(shared_cache="http://cache/")
+    assert str(get_shared_cache()) == "http://cache"
+
+
+def test_get_shared_cache_invalid(mock_config_sources, monkeypatch):
+    mock_dev_mode, _, _ = mock_config_sources
+    mock_dev_mode.return_value = True
+    monkeypatch.setenv("CHARMCRAFT_SHARED_CACHE", "nfs/charms")
+    with pytest.raises(CommandError) as cm:
+        get_shared_cache()
+    assert str(cm.value) == (
+        "Invalid shared cache configuration: 'nfs/charms' is not a HTTP(S) URL or an "
+        "absolute path."
+    )
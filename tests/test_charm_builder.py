@@ -16,11 +16,14 @@
 
 import errno
 import filecmp
+import json
 import logging
 import os
 import pathlib
 import socket
+import subprocess
 import sys
+import threading
 from unittest.mock import call, patch
 
 import pytest
@@ -261,6 +264,107 @@ def test_build_generics_tree_xdev(tmp_path, caplog):
         _test_build_generics_tree(tmp_path, caplog, expect_hardlinks=False)
 
 
+def test_build_generics_subtree_ignored(tmp_path, caplog):
+    """Directories whose content is all ignored are created but not walked."""
+    caplog.set_level(logging.DEBUG)
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    entrypoint = tmp_path / "crazycharm.py"
+    entrypoint.touch()
+    vendor_dir = tmp_path / "vendor" / "deep"
+    vendor_dir.mkdir(parents=True)
+    (vendor_dir / "file.txt").touch()
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=entrypoint,
+    )
+    builder.ignore_rules.extend_patterns(["/vendor/**"])
+    with patch.object(builder.ignore_rules, "match", wraps=builder.ignore_rules.match) as mock:
+        builder.handle_generic_paths()
+
+    assert (build_dir / "vendor").is_dir()
+    assert list((build_dir / "vendor").iterdir()) == []
+    assert "Ignoring directory content because of rules: 'vendor'" in caplog.messages
+    checked = [call_args[0][0] for call_args in mock.call_args_list]
+    assert not any(path.startswith("vendor/") for path in checked)
+
+
+def test_build_generics_subtree_kept(tmp_path):
+    """Directories where nothing can be ignored are linked without checking the rules."""
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    entrypoint = tmp_path / "crazycharm.py"
+    entrypoint.touch()
+    lib_dir = tmp_path / "lib" / "deep"
+    lib_dir.mkdir(parents=True)
+    (lib_dir / "file.pyc").touch()
+    (tmp_path / "other.pyc").touch()
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=entrypoint,
+    )
+    builder.ignore_rules.extend_patterns(["*.pyc", "!/lib/**"])
+    with patch.object(builder.ignore_rules, "match", wraps=builder.ignore_rules.match) as mock:
+        builder.handle_generic_paths()
+
+    assert (build_dir / "lib" / "deep" / "file.pyc").exists()
+    assert not (build_dir / "other.pyc").exists()
+    checked = [call_args[0][0] for call_args in mock.call_args_list]
+    assert not any(path.startswith("lib/") for path in checked)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_generics_link_error(tmp_path):
+    """Unexpected errors when linking files in the pool are raised."""
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    entrypoint = tmp_path / "crazycharm.py"
+    entrypoint.touch()
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=entrypoint,
+    )
+    with patch("os.link") as mock_link:
+        mock_link.side_effect = OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+        with pytest.raises(OSError) as raised:
+            builder.handle_generic_paths()
+    assert raised.value.errno == errno.ENOSPC
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_generics_many_directories(tmp_path):
+    """All the files in a wide and deep tree are linked in their directories."""
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    entrypoint = tmp_path / "crazycharm.py"
+    entrypoint.touch()
+    expected = {"crazycharm.py"}
+    for idx in range(20):
+        subdir = tmp_path / f"dir{idx}" / "sub"
+        subdir.mkdir(parents=True)
+        for fidx in range(5):
+            (subdir / f"file{fidx}").touch()
+            expected.add(f"dir{idx}/sub/file{fidx}")
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=entrypoint,
+    )
+    builder.handle_generic_paths()
+
+    built = {str(p.relative_to(build_dir)) for p in build_dir.glob("**/*") if p.is_file()}
+    assert built == expected
+    for rel_path in expected:
+        assert (build_dir / rel_path).samefile(tmp_path / rel_path)
+
+
 @pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
 def test_build_generics_symlink_file(tmp_path):
     """Respects a symlinked file."""
@@ -607,7 +711,7 @@ def test_build_dependencies_virtualenv_simple(tmp_path):
     )
 
     with patch("charmcraft.charm_builder._process_run") as mock:
-        with patch("shutil.copytree") as mock_copytree:
+        with patch.object(builder.stager, "stage_tree") as mock_stage_tree:
             builder.handle_dependencies()
 
     pip_cmd = str(charm_builder._find_venv_bin(tmp_path / STAGING_VENV_DIRNAME, "pip3"))
@@ -619,7 +723,7 @@ def test_build_dependencies_virtualenv_simple(tmp_path):
     ]
 
     site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
-    assert mock_copytree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
+    assert mock_stage_tree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
 
 
 def test_build_dependencies_virtualenv_multiple(tmp_path):
@@ -638,7 +742,7 @@ def test_build_dependencies_virtualenv_multiple(tmp_path):
     )
 
     with patch("charmcraft.charm_builder._process_run") as mock:
-        with patch("shutil.copytree") as mock_copytree:
+        with patch.object(builder.stager, "stage_tree") as mock_stage_tree:
             builder.handle_dependencies()
 
     pip_cmd = str(charm_builder._find_venv_bin(tmp_path / STAGING_VENV_DIRNAME, "pip3"))
@@ -659,7 +763,7 @@ def test_build_dependencies_virtualenv_multiple(tmp_path):
     ]
 
     site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
-    assert mock_copytree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
+    assert mock_stage_tree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
 
 
 def test_build_dependencies_virtualenv_none(tmp_path):
@@ -699,7 +803,7 @@ def test_build_dependencies_virtualenv_packages(tmp_path):
     )
 
     with patch("charmcraft.charm_builder._process_run") as mock:
-        with patch("shutil.copytree") as mock_copytree:
+        with patch.object(builder.stager, "stage_tree") as mock_stage_tree:
             builder.handle_dependencies()
 
     pip_cmd = str(charm_builder._find_venv_bin(tmp_path / STAGING_VENV_DIRNAME, "pip3"))
@@ -711,7 +815,7 @@ def test_build_dependencies_virtualenv_packages(tmp_path):
     ]
 
     site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
-    assert mock_copytree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
+    assert mock_stage_tree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
 
 
 def test_build_dependencies_virtualenv_both(tmp_path):
@@ -730,7 +834,7 @@ def test_build_dependencies_virtualenv_both(tmp_path):
     )
 
     with patch("charmcraft.charm_builder._process_run") as mock:
-        with patch("shutil.copytree") as mock_copytree:
+        with patch.object(builder.stager, "stage_tree") as mock_stage_tree:
             builder.handle_dependencies()
 
     pip_cmd = str(charm_builder._find_venv_bin(tmp_path / STAGING_VENV_DIRNAME, "pip3"))
@@ -753,7 +857,967 @@ def test_build_dependencies_virtualenv_both(tmp_path):
     ]
 
     site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
-    assert mock_copytree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
+    assert mock_stage_tree.mock_calls == [call(site_packages_dir, build_dir / VENV_DIRNAME)]
+
+
+def _fake_pip_install(site_packages_dir):
+    """Return a _process_run replacement that "installs" a package in the staging venv."""
+
+    def fake_run(cmd):
+        if "install" in cmd:
+            site_packages_dir.mkdir(parents=True, exist_ok=True)
+            (site_packages_dir / "pkg.py").write_text("installed")
+
+    return fake_run
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_cache_miss(tmp_path, monkeypatch):
+    """The installed dependencies are stored in the cache and linked from there."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "reqs.txt").write_text("ops")
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        requirements=["reqs.txt"],
+        cache_dir=cache_dir,
+    )
+    site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
+    fake_run = _fake_pip_install(tmp_path / site_packages_dir)
+    with patch("charmcraft.charm_builder._process_run", side_effect=fake_run) as mock:
+        builder.handle_dependencies()
+    assert len(mock.mock_calls) == 3
+
+    (cached_dir,) = (cache_dir / charm_builder.DEPENDENCIES_CACHE_DIRNAME).iterdir()
+    assert cached_dir.name == builder._get_dependencies_hash()
+    assert (cached_dir / "pkg.py").read_text() == "installed"
+    assert (build_dir / VENV_DIRNAME / "pkg.py").samefile(cached_dir / "pkg.py")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_cache_hit(tmp_path, monkeypatch):
+    """The cached dependencies are linked without creating a venv nor running pip."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "reqs.txt").write_text("ops")
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        requirements=["reqs.txt"],
+        cache_dir=cache_dir,
+    )
+    cached_dir = (
+        cache_dir / charm_builder.DEPENDENCIES_CACHE_DIRNAME / builder._get_dependencies_hash()
+    )
+    (cached_dir / "ops").mkdir(parents=True)
+    (cached_dir / "ops" / "__init__.py").write_text("cached")
+
+    with patch("charmcraft.charm_builder._process_run") as mock:
+        builder.handle_dependencies()
+    mock.assert_not_called()
+    assert not (tmp_path / STAGING_VENV_DIRNAME).exists()
+
+    linked = build_dir / VENV_DIRNAME / "ops" / "__init__.py"
+    assert linked.samefile(cached_dir / "ops" / "__init__.py")
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda builder, path: path.write_text("ops==1.2"),
+        lambda builder, path: builder.python_packages.append("pkg2"),
+        lambda builder, path: builder.requirement_paths.append("reqs.txt"),
+    ],
+)
+def test_build_dependencies_cache_key_changes(tmp_path, monkeypatch, change):
+    """The cache key changes with the requirements' content and the packages."""
+    monkeypatch.chdir(tmp_path)
+    reqs = tmp_path / "reqs.txt"
+    reqs.write_text("ops")
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        requirements=["reqs.txt"],
+        cache_dir=tmp_path / "cache",
+    )
+    original = builder._get_dependencies_hash()
+    assert builder._get_dependencies_hash() == original
+    change(builder, reqs)
+    assert builder._get_dependencies_hash() != original
+
+
+def test_build_dependencies_cache_key_interpreter(tmp_path, monkeypatch):
+    """The cache key changes with the interpreter and the architecture."""
+    monkeypatch.chdir(tmp_path)
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        cache_dir=tmp_path / "cache",
+    )
+    original = builder._get_dependencies_hash()
+
+    with patch("charmcraft.charm_builder._get_interpreter_info", return_value="cpython-99"):
+        assert builder._get_dependencies_hash() != original
+    with patch("platform.machine", return_value="s390x"):
+        assert builder._get_dependencies_hash() != original
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_cache_store_error(tmp_path, monkeypatch):
+    """If the dependencies can not be cached they are copied directly."""
+    monkeypatch.chdir(tmp_path)
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        cache_dir=tmp_path / "cache",
+    )
+    site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
+    fake_run = _fake_pip_install(tmp_path / site_packages_dir)
+    with patch("charmcraft.charm_builder._process_run", side_effect=fake_run):
+        with patch("charmcraft.charm_builder._store_in_cache", side_effect=OSError("boom")):
+            builder.handle_dependencies()
+
+    assert (build_dir / VENV_DIRNAME / "pkg.py").read_text() == "installed"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_cache_eviction(tmp_path, monkeypatch):
+    """Only the most recently used dependencies are kept in the cache."""
+    monkeypatch.chdir(tmp_path)
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    basedir = cache_dir / charm_builder.DEPENDENCIES_CACHE_DIRNAME
+    for idx in range(charm_builder.MAX_CACHED_DEPENDENCIES + 2):
+        old_dir = basedir / f"old-{idx}"
+        old_dir.mkdir(parents=True)
+        os.utime(old_dir, (1000 + idx, 1000 + idx))
+    storing_dir = basedir / "otherhash.tmp-99999"
+    storing_dir.mkdir()
+    os.utime(storing_dir, (1, 1))
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        cache_dir=cache_dir,
+    )
+    site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
+    fake_run = _fake_pip_install(tmp_path / site_packages_dir)
+    with patch("charmcraft.charm_builder._process_run", side_effect=fake_run):
+        builder.handle_dependencies()
+
+    # the new one plus the most recent old ones; what other build is storing is left alone
+    expected = {builder._get_dependencies_hash(), storing_dir.name}
+    for idx in range(3, charm_builder.MAX_CACHED_DEPENDENCIES + 2):
+        expected.add(f"old-{idx}")
+    assert {path.name for path in basedir.iterdir()} == expected
+    assert (build_dir / VENV_DIRNAME / "pkg.py").read_text() == "installed"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_cache_hit_recorded(tmp_path, monkeypatch):
+    """Reusing cached dependencies marks them as recently used."""
+    monkeypatch.chdir(tmp_path)
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        python_packages=["pkg1"],
+        cache_dir=cache_dir,
+    )
+    cached_dir = (
+        cache_dir / charm_builder.DEPENDENCIES_CACHE_DIRNAME / builder._get_dependencies_hash()
+    )
+    cached_dir.mkdir(parents=True)
+    os.utime(cached_dir, (1000, 1000))
+
+    with patch("charmcraft.charm_builder._process_run"):
+        builder.handle_dependencies()
+    assert cached_dir.stat().st_mtime > 1000
+
+
+def test_store_in_cache_concurrent(tmp_path):
+    """Storing in the cache what other build already stored keeps the existing one."""
+    src_dir = tmp_path / "src"
+    src_dir.mkdir()
+    (src_dir / "new").touch()
+    cached_dir = tmp_path / "cache" / "somehash"
+    cached_dir.mkdir(parents=True)
+    (cached_dir / "old").touch()
+
+    charm_builder._store_in_cache(charm_builder.FileStager(), src_dir, cached_dir)
+    assert [path.name for path in (tmp_path / "cache").iterdir()] == ["somehash"]
+    assert [path.name for path in cached_dir.iterdir()] == ["old"]
+
+
+def test_build_dependencies_wheelhouse_hit(tmp_path, monkeypatch):
+    """With everything in the wheelhouse nothing is built from source nor fetched."""
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "cache"
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        cache_dir=cache_dir,
+    )
+
+    with patch("charmcraft.charm_builder._process_run") as mock:
+        builder._pip_install("pip3", ["pkg1", "pkg2"])
+
+    wheelhouse = cache_dir / charm_builder.WHEELHOUSE_DIRNAME
+    assert wheelhouse.is_dir()
+    assert mock.mock_calls == [
+        call(
+            ["pip3", "install", "--upgrade", "--no-index", f"--find-links={wheelhouse}"]
+            + ["pkg1", "pkg2"]
+        ),
+    ]
+
+
+def test_build_dependencies_wheelhouse_miss(tmp_path, monkeypatch):
+    """Only what is missing in the wheelhouse is built from source there, then installed."""
+    monkeypatch.chdir(tmp_path)
+    cache_dir = tmp_path / "cache"
+    wheelhouse = cache_dir / charm_builder.WHEELHOUSE_DIRNAME
+    wheelhouse.mkdir(parents=True)
+    (wheelhouse / "PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl").write_text("already built")
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        cache_dir=cache_dir,
+    )
+    seen_wheels = []
+
+    def fake_run(cmd):
+        if cmd[1] == "install" and len(mock.mock_calls) == 1:
+            raise CommandError("missing")
+        if cmd[1] == "install":
+            seen_wheels.extend(sorted(path.name for path in wheelhouse.iterdir()))
+        if cmd[1] == "download":
+            (dest,) = [arg[len("--dest=") :] for arg in cmd if arg.startswith("--dest=")]
+            dest = pathlib.Path(dest)
+            dest.mkdir()
+            (dest / "PyYAML-5.4.1.tar.gz").write_text("source")
+            (dest / "ops-1.2.0.tar.gz").write_text("source")
+        if cmd[1] == "wheel":
+            (wheel_dir,) = [arg[len("--wheel-dir=") :] for arg in cmd if "--wheel-dir=" in arg]
+            wheel_dir = pathlib.Path(wheel_dir)
+            wheel_dir.mkdir(exist_ok=True)
+            (wheel_dir / "ops-1.2.0-py3-none-any.whl").write_text("built")
+
+    with patch("charmcraft.charm_builder._process_run", side_effect=fake_run) as mock:
+        builder._pip_install("pip3", ["--requirement=reqs.txt"])
+
+    install_cmd = ["pip3", "install", "--upgrade", "--no-index", f"--find-links={wheelhouse}"]
+    (tmp_dir,) = {
+        pathlib.Path(arg.split("=", 1)[1]).parent
+        for call_args in mock.call_args_list
+        for arg in call_args.args[0]
+        if arg.startswith("--dest=")
+    }
+    assert tmp_dir.parent == wheelhouse
+    assert tmp_dir.name.startswith(charm_builder.WHEELHOUSE_TMP_PREFIX)
+    assert mock.mock_calls == [
+        call(install_cmd + ["--requirement=reqs.txt"]),
+        call(
+            ["pip3", "download", "--no-binary", ":all:", f"--dest={tmp_dir / 'sources'}"]
+            + ["--requirement=reqs.txt"]
+        ),
+        # only the distribution without a wheel is built
+        call(
+            ["pip3", "wheel", "--no-deps", "--no-binary", ":all:"]
+            + [f"--wheel-dir={tmp_dir / 'wheels'}", str(tmp_dir / "sources" / "ops-1.2.0.tar.gz")]
+        ),
+        call(install_cmd + ["--requirement=reqs.txt"]),
+    ]
+
+    # the built wheel was moved to the wheelhouse before installing, and nothing else is left
+    assert seen_wheels == ["PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl", "ops-1.2.0-py3-none-any.whl"]
+    assert (wheelhouse / "ops-1.2.0-py3-none-any.whl").read_text() == "built"
+
+
+@pytest.mark.parametrize(
+    "filename, key",
+    [
+        ("PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl", ("pyyaml", "5.4.1")),
+        ("PyYAML-5.4.1.tar.gz", ("pyyaml", "5.4.1")),
+        ("python-dateutil-2.8.2.tar.gz", ("python_dateutil", "2.8.2")),
+        ("python_dateutil-2.8.2-py2.py3-none-any.whl", ("python_dateutil", "2.8.2")),
+        ("ops-1.2.0.zip", ("ops", "1.2.0")),
+    ],
+)
+def test_get_distribution_key(filename, key):
+    """Wheels and source distributions are matched by normalized name and version."""
+    assert charm_builder._get_distribution_key(filename) == key
+
+
+def test_build_dependencies_wheelhouse_indicated(tmp_path, monkeypatch):
+    """The indicated wheelhouse is used instead of the one in the cache."""
+    monkeypatch.chdir(tmp_path)
+    wheelhouse = tmp_path / "shared-wheelhouse"
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        cache_dir=tmp_path / "cache",
+        wheelhouse_dir=wheelhouse,
+    )
+
+    with patch("charmcraft.charm_builder._process_run") as mock:
+        builder._pip_install("pip3", ["pkg1"])
+
+    assert wheelhouse.is_dir()
+    assert not (tmp_path / "cache" / charm_builder.WHEELHOUSE_DIRNAME).exists()
+    assert mock.mock_calls == [
+        call(["pip3", "install", "--upgrade", "--no-index", f"--find-links={wheelhouse}", "pkg1"]),
+    ]
+
+
+def test_build_dependencies_wheelhouse_no_cache(tmp_path, monkeypatch):
+    """Without cache the wheelhouse is not used, so requirements are resolved in the index."""
+    monkeypatch.chdir(tmp_path)
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+    )
+
+    with patch("charmcraft.charm_builder._process_run") as mock:
+        builder._pip_install("pip3", ["pkg1"])
+
+    assert mock.mock_calls == [
+        call(["pip3", "install", "--upgrade", "--no-binary", ":all:", "pkg1"]),
+    ]
+
+
+def test_touch_used_wheels(tmp_path):
+    """Only the wheels of the installed distributions are marked as used."""
+    site_packages_dir = tmp_path / "site-packages"
+    (site_packages_dir / "PyYAML-5.4.1.dist-info").mkdir(parents=True)
+    (site_packages_dir / "ops-1.2.0.dist-info").mkdir(parents=True)
+    wheelhouse = tmp_path / "wheelhouse"
+    wheelhouse.mkdir()
+    names = [
+        "PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl",
+        "ops-1.1.0-py3-none-any.whl",
+        "ops-1.2.0-py3-none-any.whl",
+    ]
+    for name in names:
+        (wheelhouse / name).touch()
+        os.utime(wheelhouse / name, (1000, 1000))
+
+    charm_builder._touch_used_wheels(site_packages_dir, wheelhouse)
+    mtimes = {name: (wheelhouse / name).stat().st_mtime for name in names}
+    assert mtimes["PyYAML-5.4.1-cp38-cp38-linux_x86_64.whl"] > 1000
+    assert mtimes["ops-1.1.0-py3-none-any.whl"] == 1000
+    assert mtimes["ops-1.2.0-py3-none-any.whl"] > 1000
+
+
+# --- pruning
+
+
+@pytest.fixture
+def prunable_venv(tmp_path):
+    """Provide a build directory with a venv full of things to prune."""
+    build_dir = tmp_path / BUILD_DIRNAME
+    venv_dir = build_dir / VENV_DIRNAME
+    files = {
+        "pkg/__init__.py": "code",
+        "pkg/__pycache__/__init__.cpython-38.pyc": "bytecode",
+        "pkg/tests/__init__.py": "",
+        "pkg/tests/conftest.py": "fixtures",
+        "pkg/tests/test_pkg.py": "tests",
+        "pkg/docs/index.rst": "documentation",
+        "pkg/data.txt": "data",
+        "pkg-1.0.dist-info/METADATA": "metadata",
+        "pkg-1.0.dist-info/RECORD": "record",
+        "botocore/docs/__init__.py": "code",
+    }
+    for name, content in files.items():
+        path = venv_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    def get_files():
+        return {str(p.relative_to(venv_dir)) for p in venv_dir.glob("**/*") if p.is_file()}
+
+    return build_dir, get_files
+
+
+def test_build_pruning_defaults(tmp_path, prunable_venv, caplog):
+    """The default rules remove tests, bytecode, records and documentation."""
+    caplog.set_level(logging.DEBUG)
+    build_dir, get_files = prunable_venv
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        prune=True,
+    )
+    with patch("shutil.which", return_value=None):
+        builder.handle_pruning()
+
+    assert get_files() == {
+        "pkg/__init__.py",
+        "pkg/data.txt",
+        "pkg-1.0.dist-info/METADATA",
+        "botocore/docs/__init__.py",
+    }
+    removed_size = len("bytecode" + "fixtures" + "tests" + "documentation" + "record")
+    expected = (
+        f"Pruned dependencies: removed 4 paths ({removed_size} bytes), "
+        f"stripped 0 libraries (0 bytes); {removed_size} bytes saved"
+    )
+    assert expected in caplog.messages
+    assert "Pruning directory 'pkg/tests'" in caplog.messages
+
+
+def test_build_pruning_keep_and_remove(tmp_path, prunable_venv):
+    """The rules from the project keep or remove more paths."""
+    build_dir, get_files = prunable_venv
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        prune=True,
+        prune_keep=["pkg/tests/conftest.py", "/pkg/docs/"],
+        prune_remove=["*.txt"],
+    )
+    with patch("shutil.which", return_value=None):
+        builder.handle_pruning()
+
+    assert get_files() == {
+        "pkg/__init__.py",
+        "pkg/tests/conftest.py",
+        "pkg/docs/index.rst",
+        "pkg-1.0.dist-info/METADATA",
+        "botocore/docs/__init__.py",
+    }
+
+
+def test_build_pruning_only_remove(tmp_path, prunable_venv):
+    """Without the defaults only what is indicated is removed."""
+    build_dir, get_files = prunable_venv
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        prune_remove=["/pkg/tests/"],
+    )
+    with patch("charmcraft.charm_builder._strip_debug_symbols") as mock_strip:
+        builder.handle_pruning()
+    mock_strip.assert_not_called()
+
+    assert "pkg/tests/test_pkg.py" not in get_files()
+    assert "pkg/__pycache__/__init__.cpython-38.pyc" in get_files()
+    assert "pkg-1.0.dist-info/RECORD" in get_files()
+
+
+def test_build_pruning_no_venv(tmp_path):
+    """Nothing is done if there are no dependencies."""
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=pathlib.Path("whatever"),
+        prune=True,
+    )
+    builder.handle_pruning()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_pruning_strip(tmp_path, prunable_venv, caplog):
+    """The debug symbols of the libraries are removed."""
+    caplog.set_level(logging.DEBUG)
+    build_dir, get_files = prunable_venv
+    library = build_dir / VENV_DIRNAME / "pkg" / "_speedups.cpython-38-x86_64-linux-gnu.so"
+    library.write_bytes(b"x" * 100)
+    cached_library = tmp_path / "cached.so"
+    os.link(library, cached_library)
+
+    def fake_strip(cmd, **kwargs):
+        # write the stripped version where indicated
+        pathlib.Path(cmd[3]).write_bytes(b"x" * 60)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        prune=True,
+    )
+    with patch("shutil.which", return_value="/usr/bin/strip"):
+        with patch("subprocess.run", side_effect=fake_strip) as mock_run:
+            builder.handle_pruning()
+
+    assert mock_run.call_args[0][0] == [
+        "/usr/bin/strip",
+        "--strip-debug",
+        "-o",
+        str(library) + ".stripped",
+        str(library),
+    ]
+    assert library.stat().st_size == 60
+    assert cached_library.stat().st_size == 100
+    assert not library.with_name(library.name + ".stripped").exists()
+    assert any("stripped 1 libraries (40 bytes)" in message for message in caplog.messages)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_strip_debug_symbols_failure(tmp_path):
+    """Libraries that can not be stripped are left as they are."""
+    library = tmp_path / "lib.so"
+    library.write_bytes(b"not really a library")
+
+    def fake_strip(cmd, **kwargs):
+        pathlib.Path(cmd[3]).write_bytes(b"half")
+        return subprocess.CompletedProcess(cmd, 1)
+
+    with patch("subprocess.run", side_effect=fake_strip):
+        assert charm_builder._strip_debug_symbols("strip", str(library)) == 0
+    assert library.read_bytes() == b"not really a library"
+    assert list(tmp_path.iterdir()) == [library]
+
+
+# --- tree shaking
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_tree_shaking(tmp_path, caplog):
+    """The modules not imported by the charm nor its libs are removed, and reported."""
+    caplog.set_level(logging.DEBUG)
+    build_dir = tmp_path / BUILD_DIRNAME
+    files = {
+        "src/charm.py": "import ops\n",
+        "lib/charms/db/v0/api.py": "import yaml\n",
+        "venv/ops/__init__.py": "",
+        "venv/ops/testing.py": "12345",
+        "venv/ops/__pycache__/testing.cpython-38.pyc": "123",
+        "venv/yaml/__init__.py": "",
+        "venv/plugin/__init__.py": "",
+        "venv/kubernetes/__init__.py": "1234567890",
+    }
+    for name, content in files.items():
+        path = build_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        tree_shake=True,
+        tree_shake_keep=["plugin"],
+    )
+    builder.handle_tree_shaking(build_dir / "src" / "charm.py")
+
+    venv_dir = build_dir / VENV_DIRNAME
+    remaining = {str(p.relative_to(venv_dir)) for p in venv_dir.glob("**/*") if p.is_file()}
+    assert remaining == {"ops/__init__.py", "yaml/__init__.py", "plugin/__init__.py"}
+    assert "Tree shaking removed 2 unused modules (18 bytes)" in caplog.messages
+    report_idx = caplog.messages.index("Tree shaking removed 2 unused modules (18 bytes)")
+    assert caplog.messages[report_idx + 1 :] == [
+        "   kubernetes: 10 bytes",
+        "   ops.testing: 8 bytes",
+    ]
+
+
+# --- bytecode
+
+
+@pytest.fixture
+def bytecode_build(tmp_path):
+    """Provide a build directory with some code to compile."""
+    build_dir = tmp_path / BUILD_DIRNAME
+    (build_dir / "src").mkdir(parents=True)
+    (build_dir / "src" / "charm.py").write_text("import ops\nVALUES = {'a', 'b', 'c'}\n")
+    (build_dir / VENV_DIRNAME / "ops").mkdir(parents=True)
+    (build_dir / VENV_DIRNAME / "ops" / "__init__.py").write_text("X = 1\n")
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=pathlib.Path("whatever"),
+        compile_bytecode=True,
+    )
+    return builder
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_bytecode(bytecode_build):
+    """The code is compiled in hash checked and relocatable bytecode files."""
+    bytecode_build.handle_bytecode()
+
+    build_dir = bytecode_build.buildpath
+    (pyc,) = (build_dir / "src" / "__pycache__").iterdir()
+    content = pyc.read_bytes()
+    # the flags after the magic number indicate that it's a checked hash based pyc
+    assert int.from_bytes(content[4:8], "little") == 0b11
+    assert b"src/charm.py" in content
+    assert str(build_dir).encode() not in content
+    assert list((build_dir / VENV_DIRNAME / "ops" / "__pycache__").iterdir())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_bytecode_deterministic(bytecode_build):
+    """Compiling the same code again produces exactly the same bytecode."""
+    bytecode_build.handle_bytecode()
+    (pyc,) = (bytecode_build.buildpath / "src" / "__pycache__").iterdir()
+    first_content = pyc.read_bytes()
+
+    bytecode_build.handle_bytecode()
+    assert pyc.read_bytes() == first_content
+
+
+def test_build_bytecode_call(bytecode_build):
+    """The compilation is done in parallel for each directory, with a fixed hash seed."""
+    with patch("charmcraft.charm_builder._process_run") as mock:
+        bytecode_build.handle_bytecode()
+
+    build_dir = bytecode_build.buildpath
+    base_cmd = ["python3", "-m", "compileall", "-q", "-f", "-j", "0"]
+    base_cmd.extend(["--invalidation-mode", "checked-hash"])
+    assert [c[1][0] for c in mock.mock_calls] == [
+        base_cmd + ["-d", "src", str(build_dir / "src")],
+        base_cmd + ["-d", VENV_DIRNAME, str(build_dir / VENV_DIRNAME)],
+    ]
+    assert all(c[2]["env"]["PYTHONHASHSEED"] == "0" for c in mock.mock_calls)
+
+
+def test_build_bytecode_errors(bytecode_build, caplog):
+    """Problems compiling are reported but they don't break the build."""
+    with patch("charmcraft.charm_builder._process_run", side_effect=CommandError("boom")):
+        bytecode_build.handle_bytecode()
+    assert "Some files in 'src' could not be compiled" in caplog.messages
+
+
+def test_build_bytecode_old_python(bytecode_build, caplog):
+    """Without deterministic bytecode support in the interpreter nothing is compiled."""
+    with patch("subprocess.check_output", return_value="False\n"):
+        with patch("charmcraft.charm_builder._process_run") as mock:
+            bytecode_build.handle_bytecode()
+    mock.assert_not_called()
+    assert "Not compiling bytecode: Python 3.7 or newer is needed" in caplog.messages
+
+
+# --- file staging
+
+
+@pytest.fixture
+def staging_files(tmp_path):
+    """Provide a source file and the destination directory to stage it."""
+    src = tmp_path / "src.txt"
+    src.write_text("the content")
+    src.chmod(0o754)
+    os.utime(src, (1000, 2000))
+    dest_dir = tmp_path / "dest"
+    dest_dir.mkdir()
+    return src, dest_dir
+
+
+def _check_staged_copy(src, dest):
+    """The staged file is not the source one, but it's essentially the same."""
+    assert not dest.samefile(src)
+    assert dest.read_text() == "the content"
+    assert dest.stat().st_mode == src.stat().st_mode
+    assert dest.stat().st_mtime == src.stat().st_mtime
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_stager_hardlink_fallback(staging_files):
+    """When reflinks are not supported the files are hard linked, not trying reflinks again."""
+    src, dest_dir = staging_files
+    stager = charm_builder.FileStager()
+    unsupported = OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+    with patch("charmcraft.charm_builder._reflink", side_effect=unsupported) as mock_reflink:
+        assert stager.stage(src, dest_dir / "one") == charm_builder.STAGE_HARDLINK
+        assert stager.stage(src, dest_dir / "two") == charm_builder.STAGE_HARDLINK
+    assert len(mock_reflink.mock_calls) == 1
+    assert (dest_dir / "one").samefile(src)
+    assert (dest_dir / "two").samefile(src)
+    assert stager.counters == {
+        "reflink": 0,
+        "hardlink": 2,
+        "copy_file_range": 0,
+        "copy": 0,
+    }
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Only supported in Linux")
+def test_stager_copy_range(staging_files):
+    """When hard links are not possible across filesystems the file is copied in the kernel."""
+    src, dest_dir = staging_files
+    stager = charm_builder.FileStager()
+    with patch("os.link", side_effect=OSError(errno.EXDEV, os.strerror(errno.EXDEV))):
+        assert stager.stage(src, dest_dir / "file") == charm_builder.STAGE_COPY_RANGE
+    _check_staged_copy(src, dest_dir / "file")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_stager_plain_copy(staging_files):
+    """The last resort is a plain copy."""
+    src, dest_dir = staging_files
+    stager = charm_builder.FileStager()
+    with patch("os.link", side_effect=PermissionError("No you don't.")):
+        with patch("os.copy_file_range", side_effect=OSError(errno.ENOSYS, "nope"), create=True):
+            assert stager.stage(src, dest_dir / "file") == charm_builder.STAGE_COPY
+    _check_staged_copy(src, dest_dir / "file")
+    assert stager.counters["copy"] == 1
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_stager_permission_error_not_remembered(staging_files):
+    """Not being allowed to hard link a file doesn't stop trying it for other files."""
+    src, dest_dir = staging_files
+    stager = charm_builder.FileStager()
+    with patch("os.link", side_effect=[PermissionError("No you don't."), None]) as mock_link:
+        stager.stage(src, dest_dir / "one")
+        assert stager.stage(src, dest_dir / "two") == charm_builder.STAGE_HARDLINK
+    assert len(mock_link.mock_calls) == 2
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_stager_unexpected_error(staging_files):
+    """Other errors are raised, leaving nothing behind."""
+    src, dest_dir = staging_files
+    stager = charm_builder.FileStager()
+    with patch("os.link", side_effect=OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))):
+        with pytest.raises(OSError) as raised:
+            stager.stage(src, dest_dir / "file")
+    assert raised.value.errno == errno.ENOSPC
+    assert list(dest_dir.iterdir()) == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_stager_tree_and_report(tmp_path, caplog):
+    """A whole tree is staged, and the used strategies reported."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft")
+    src_dir = tmp_path / "src"
+    (src_dir / "sub").mkdir(parents=True)
+    (src_dir / "file1").write_text("1")
+    (src_dir / "sub" / "file2").write_text("2")
+
+    stager = charm_builder.FileStager()
+    unsupported = OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+    with patch("charmcraft.charm_builder._reflink", side_effect=unsupported):
+        stager.stage_tree(src_dir, tmp_path / "dest")
+    stager.report()
+
+    assert (tmp_path / "dest" / "sub" / "file2").samefile(src_dir / "sub" / "file2")
+    assert (
+        "Files staged by strategy: reflink=0, hardlink=2, copy_file_range=0, copy=0"
+        in caplog.messages
+    )
+
+
+# --- dependencies installed while linking
+
+
+@pytest.fixture
+def overlap_builder(tmp_path):
+    """A builder for a simple charm with dependencies."""
+    charmdir = tmp_path / "charm"
+    (charmdir / "src").mkdir(parents=True)
+    (charmdir / "src" / "charm.py").write_text("all the magic")
+    (charmdir / CHARM_METADATA).write_text("name: crazycharm")
+    return CharmBuilder(
+        charmdir=charmdir,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=charmdir / "src" / "charm.py",
+        python_packages=["ops"],
+    )
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_dependencies_overlap_linking(overlap_builder, tmp_path):
+    """The dependencies are installed while linking, and placed after both finish."""
+    builder = overlap_builder
+    linking = threading.Event()
+    installed_dir = tmp_path / "installed"
+    installed_dir.mkdir()
+    (installed_dir / "ops.py").write_text("ops")
+
+    def fake_install():
+        # only finishes if the linking is going on at the same time
+        assert linking.wait(timeout=10)
+        return installed_dir, None
+
+    original_generic_paths = builder.handle_generic_paths
+
+    def fake_generic_paths():
+        linking.set()
+        return original_generic_paths()
+
+    with patch.object(builder, "install_dependencies", fake_install):
+        with patch.object(builder, "handle_generic_paths", fake_generic_paths):
+            builder.build_charm()
+
+    assert (builder.buildpath / "src" / "charm.py").exists()
+    assert (builder.buildpath / VENV_DIRNAME / "ops.py").samefile(installed_dir / "ops.py")
+
+
+def test_build_dependencies_install_error(overlap_builder):
+    """A problem installing the dependencies is raised after linking."""
+    builder = overlap_builder
+    error = CommandError("pip crashed")
+    with patch.object(builder, "install_dependencies", side_effect=error):
+        with patch.object(builder, "place_dependencies") as mock_place:
+            with pytest.raises(CommandError) as cm:
+                builder.build_charm()
+    assert cm.value is error
+    assert (builder.buildpath / "src" / "charm.py").exists()
+    mock_place.assert_not_called()
+
+
+def test_build_dependencies_linking_error(overlap_builder, caplog):
+    """A problem when linking is raised once the installation finished."""
+    builder = overlap_builder
+    installed = threading.Event()
+
+    def fake_install():
+        installed.set()
+        return None, None
+
+    error = OSError("disk on fire")
+    with patch.object(builder, "install_dependencies", fake_install):
+        with patch.object(builder, "handle_generic_paths", side_effect=error):
+            with pytest.raises(OSError) as cm:
+                builder.build_charm()
+    assert cm.value is error
+    assert installed.is_set()
+    assert not any(record.levelno == logging.ERROR for record in caplog.records)
+
+
+def test_build_dependencies_both_errors(overlap_builder, caplog):
+    """If linking and installing fail, both problems are reported."""
+    builder = overlap_builder
+    install_error = CommandError("pip crashed")
+    linking_error = OSError("disk on fire")
+    with patch.object(builder, "install_dependencies", side_effect=install_error):
+        with patch.object(builder, "handle_generic_paths", side_effect=linking_error):
+            with pytest.raises(OSError) as cm:
+                builder.build_charm()
+    assert cm.value is linking_error
+    assert "Installing the dependencies also failed: pip crashed" in caplog.messages
+
+
+# --- build report
+
+
+def test_build_report_phases():
+    """The phases are accumulated, counting the files staged in them."""
+    report = charm_builder.BuildReport()
+    stager = charm_builder.FileStager()
+
+    with report.phase("one", stager=stager) as counts:
+        stager.counters[charm_builder.STAGE_HARDLINK] += 2
+        stager.staged_bytes += 100
+        counts["files"] += 1
+    with report.phase("two"):
+        pass
+    with report.phase("one") as counts:
+        counts["bytes"] += 5
+
+    assert list(report.phases) == ["one", "two"]
+    one = report.phases["one"]
+    assert one["files"] == 3
+    assert one["bytes"] == 105
+    assert one["wall_time"] >= 0
+    assert one["cpu_time"] >= 0
+
+
+def test_build_report_phase_error():
+    """The phase is recorded even if it fails."""
+    report = charm_builder.BuildReport()
+    with pytest.raises(ValueError):
+        with report.phase("broken"):
+            raise ValueError()
+    assert list(report.phases) == ["broken"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_report_saved(tmp_path, monkeypatch):
+    """The build leaves a report of its phases next to the build directory."""
+    charmdir = tmp_path / "charm"
+    (charmdir / "src").mkdir(parents=True)
+    (charmdir / "src" / "charm.py").write_text("all the magic")
+    (charmdir / CHARM_METADATA).write_text("name: crazycharm")
+    (charmdir / "reqs.txt").write_text("ops")
+    monkeypatch.chdir(charmdir)
+    build_dir = tmp_path / BUILD_DIRNAME
+    report_path = tmp_path / charm_builder.BUILD_REPORT_FILENAME
+    report_path.write_text("stale")
+
+    builder = CharmBuilder(
+        charmdir=charmdir,
+        builddir=build_dir,
+        entrypoint=charmdir / "src" / "charm.py",
+        requirements=["reqs.txt"],
+    )
+    site_packages_dir = charm_builder._find_venv_site_packages(pathlib.Path(STAGING_VENV_DIRNAME))
+    fake_run = _fake_pip_install(charmdir / site_packages_dir)
+    with patch("charmcraft.charm_builder._process_run", side_effect=fake_run):
+        builder.build_charm()
+
+    report = json.loads(report_path.read_text())
+    phases = {phase["name"]: phase for phase in report["phases"]}
+    assert sorted(phases) == ["copy", "dispatch", "link", "pip", "venv", "walk"]
+    # src, charm.py, metadata and reqs (and the staging venv, if already created)
+    assert phases["walk"]["files"] in (4, 5)
+    assert phases["link"]["files"] == 3
+    assert phases["link"]["bytes"] == len("all the magic") + len("name: crazycharm") + 3
+    assert phases["copy"]["files"] == 1
+    assert phases["copy"]["bytes"] == len("installed")
+    assert all(phase["wall_time"] >= 0 and phase["cpu_time"] >= 0 for phase in phases.values())
+    assert sum(report["staged"].values()) == 4
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_build_report_other_path(tmp_path, monkeypatch):
+    """The report is written where indicated, creating its directory if needed."""
+    charmdir = tmp_path / "charm"
+    (charmdir / "src").mkdir(parents=True)
+    (charmdir / "src" / "charm.py").write_text("all the magic")
+    (charmdir / CHARM_METADATA).write_text("name: crazycharm")
+    monkeypatch.chdir(charmdir)
+    report_path = tmp_path / "project" / "build" / "crazycharm.charm.build-report.json"
+
+    builder = CharmBuilder(
+        charmdir=charmdir,
+        builddir=tmp_path / BUILD_DIRNAME,
+        entrypoint=charmdir / "src" / "charm.py",
+        report_path=report_path,
+    )
+    with patch("charmcraft.charm_builder._process_run"):
+        builder.build_charm()
+
+    report = json.loads(report_path.read_text())
+    assert "dispatch" in [phase["name"] for phase in report["phases"]]
+    assert not (tmp_path / charm_builder.BUILD_REPORT_FILENAME).exists()
 
 
 def test_builder_without_jujuignore(tmp_path):
@@ -797,6 +1861,46 @@ def test_builder_with_jujuignore(tmp_path):
     assert not ignore.match("myfile.c", is_dir=False)
 
 
+def test_builder_ignore_stats(tmp_path, caplog):
+    """The statistics of the ignore rules are reported, including the dead rules."""
+    caplog.set_level(logging.DEBUG)
+    build_dir = tmp_path / BUILD_DIRNAME
+    build_dir.mkdir()
+    entrypoint = tmp_path / "crazycharm.py"
+    entrypoint.touch()
+    (tmp_path / "foo.pyc").touch()
+    modules_dir = tmp_path / "node_modules" / "somelib"
+    modules_dir.mkdir(parents=True)
+    (modules_dir / "index.js").touch()
+    (tmp_path / ".jujuignore").write_text("*.pyc\n/never-there\nnode_modules/**\n")
+
+    builder = CharmBuilder(
+        charmdir=tmp_path,
+        builddir=build_dir,
+        entrypoint=entrypoint,
+        ignore_stats=True,
+    )
+    builder.handle_generic_paths()
+    builder.show_ignore_stats()
+
+    assert not (build_dir / "foo.pyc").exists()
+    assert not (build_dir / "node_modules" / "somelib").exists()
+    stats = {stat.rule: stat for stat in builder.ignore_rules.get_stats()}
+    assert stats["*.pyc"].matches == 1
+    assert stats["*.pyc"].evaluations > 1
+    assert stats["/never-there"].matches == 0
+    assert stats["node_modules/**"].matches == 1  # the subtree is ignored by this rule
+    assert stats[".svn"].source == "defaults"
+    assert stats["/staging-venv"].source == "internal"
+
+    assert "Ignore rules statistics (slowest first):" in caplog.messages
+    assert any(line.endswith(".jujuignore:1: '*.pyc'") for line in caplog.messages)
+    assert any(line.endswith("defaults:3: '.svn'") for line in caplog.messages)
+    dead_idx = caplog.messages.index("Ignore rules that never matched:")
+    dead_lines = caplog.messages[dead_idx + 1 :]
+    assert dead_lines == ["   .jujuignore:2: '/never-there'"]
+
+
 def test_builder_arguments_defaults(tmp_path):
     """The arguments passed to the cli must be correctly parsed."""
 
@@ -805,6 +1909,16 @@ def test_builder_arguments_defaults(tmp_path):
         assert self.buildpath == pathlib.Path("builddir")
         assert self.entrypoint == pathlib.Path("src/charm.py")
         assert self.requirement_paths is None
+        assert self.ignore_stats is False
+        assert self.cache_dir is None
+        assert self.wheelhouse_dir is None
+        assert self.compile_bytecode is False
+        assert self.prune is False
+        assert self.prune_keep == []
+        assert self.prune_remove == []
+        assert self.tree_shake is False
+        assert self.tree_shake_keep == []
+        assert self.report_path == pathlib.Path(charm_builder.BUILD_REPORT_FILENAME)
         sys.exit(42)
 
     with patch.object(sys, "argv", ["cmd", "--charmdir", "charmdir", "--builddir", "builddir"]):
@@ -822,6 +1936,16 @@ def test_builder_arguments_full(tmp_path):
         assert self.buildpath == pathlib.Path("builddir")
         assert self.entrypoint == pathlib.Path("src/charm.py")
         assert self.requirement_paths == ["reqs1.txt", "reqs2.txt"]
+        assert self.ignore_stats is True
+        assert self.cache_dir == pathlib.Path("cachedir")
+        assert self.wheelhouse_dir == pathlib.Path("wheelhousedir")
+        assert self.compile_bytecode is True
+        assert self.prune is True
+        assert self.prune_keep == ["keep1", "keep2"]
+        assert self.prune_remove == ["remove"]
+        assert self.tree_shake is True
+        assert self.tree_shake_keep == ["plugins"]
+        assert self.report_path == pathlib.Path("reports/report.json")
         sys.exit(42)
 
     with patch.object(
@@ -836,6 +1960,24 @@ def test_builder_arguments_full(tmp_path):
             "-r" "reqs1.txt",
             "--requirement",
             "reqs2.txt",
+            "--ignore-stats",
+            "--cache-dir",
+            "cachedir",
+            "--wheelhouse-dir",
+            "wheelhousedir",
+            "--compile-bytecode",
+            "--prune",
+            "--prune-keep",
+            "keep1",
+            "--prune-keep",
+            "keep2",
+            "--prune-remove",
+            "remove",
+            "--tree-shake",
+            "--tree-shake-keep",
+            "plugins",
+            "--build-report",
+            "reports/report.json",
         ],
     ):
         with patch("charmcraft.charm_builder.CharmBuilder.build_charm", new=mock_build_charm):
@@ -51,6 +51,19 @@ def test_load_current_directory(create_config, monkeypatch):
     assert config.project.started_at == fake_utcnow
 
 
+def test_load_source_date_epoch(create_config, monkeypatch):
+    """The build start time is taken from SOURCE_DATE_EPOCH if set."""
+    tmp_path = create_config(
+        """
+        type: charm
+    """
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
+    config = load(None)
+    assert config.project.started_at == datetime.datetime(2021, 10, 1)
+
+
 def test_load_managed_mode_directory(create_config, monkeypatch, tmp_path):
     """Validate managed-mode default directory is /root/project."""
     monkeypatch.chdir(tmp_path)
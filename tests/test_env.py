@@ -19,6 +19,7 @@ import pathlib
 import pytest
 
 from charmcraft import env
+from charmcraft.cmdbase import CommandError
 
 
 def test_get_managed_environment_home_path():
@@ -31,6 +32,15 @@ def test_get_managed_environment_log_path():
     dirpath = env.get_managed_environment_log_path()
 
     assert dirpath == pathlib.Path("/tmp/charmcraft.log")
+    assert not env.is_managed_environment_log_path_set()
+
+
+def test_get_managed_environment_log_path_from_host(monkeypatch):
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_LOG_PATH", "/root/project/build/test.charm.log")
+    dirpath = env.get_managed_environment_log_path()
+
+    assert dirpath == pathlib.Path("/root/project/build/test.charm.log")
+    assert env.is_managed_environment_log_path_set()
 
 
 def test_get_managed_environment_project_path():
@@ -39,6 +49,25 @@ def test_get_managed_environment_project_path():
     assert dirpath == pathlib.Path("/root/project")
 
 
+@pytest.mark.parametrize("value, result", [(None, None), ("0", 0), ("1633046400", 1633046400)])
+def test_get_source_date_epoch(monkeypatch, value, result):
+    if value is None:
+        monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    else:
+        monkeypatch.setenv("SOURCE_DATE_EPOCH", value)
+
+    assert env.get_source_date_epoch() == result
+
+
+@pytest.mark.parametrize("value", ["", "yesterday", "-5", "1.5"])
+def test_get_source_date_epoch_invalid(monkeypatch, value):
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", value)
+
+    with pytest.raises(CommandError) as cm:
+        env.get_source_date_epoch()
+    assert str(cm.value) == f"Invalid SOURCE_DATE_EPOCH {value!r} (must be a Unix timestamp)."
+
+
 def test_get_managed_environment_snap_channel_none(monkeypatch):
     monkeypatch.delenv("CHARMCRAFT_INSTALL_SNAP_CHANNEL", raising=False)
 
@@ -0,0 +1,199 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import textwrap
+
+import pytest
+
+from charmcraft.importgraph import ImportGraph, find_unreachable, iter_imports
+
+
+def _create_files(basedir, files):
+    """Create the files (relative path and content) in the base directory."""
+    for name, content in files.items():
+        path = basedir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(content))
+
+
+# -- tests for the imports parsing
+
+
+def test_iter_imports_all_kinds(tmp_path):
+    """All kinds of imports are found, wherever they are."""
+    filepath = tmp_path / "test.py"
+    filepath.write_text(
+        textwrap.dedent(
+            """
+            import os, foo.bar as baz
+            from a.b import c, d
+            from . import sibling
+            from ..parent import thing
+            from e import *
+
+            def func():
+                import inside
+                importlib.import_module("dynamic.module")
+                __import__("other")
+                importlib.import_module(".relative", "pkg")
+                importlib.import_module(some_variable)
+            """
+        )
+    )
+    assert list(iter_imports(filepath)) == [
+        (0, "os", []),
+        (0, "foo.bar", []),
+        (0, "a.b", ["c", "d"]),
+        (1, "", ["sibling"]),
+        (2, "parent", ["thing"]),
+        (0, "e", ["*"]),
+        (0, "inside", []),
+        (0, "dynamic.module", []),
+        (0, "other", []),
+    ]
+
+
+@pytest.mark.parametrize("content", [b"this is not python", b"null\0byte"])
+def test_iter_imports_invalid(tmp_path, content):
+    """Files that can not be parsed have no imports."""
+    filepath = tmp_path / "test.py"
+    filepath.write_bytes(content)
+    assert list(iter_imports(filepath)) == []
+
+
+def test_iter_imports_missing(tmp_path):
+    """Missing files have no imports."""
+    assert list(iter_imports(tmp_path / "missing.py")) == []
+
+
+# -- tests for the graph
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Provide the charm code, the libs and the venv directories."""
+    src_dir = tmp_path / "src"
+    lib_dir = tmp_path / "lib"
+    venv_dir = tmp_path / "venv"
+    for dirpath in (src_dir, lib_dir, venv_dir):
+        dirpath.mkdir()
+    return src_dir, lib_dir, venv_dir
+
+
+def test_graph_follow_imports(project):
+    """The imports are followed through all the directories."""
+    src_dir, lib_dir, venv_dir = project
+    _create_files(src_dir, {"charm.py": "import helpers\nfrom charms.db.v0 import api\n"})
+    _create_files(src_dir, {"helpers.py": "import yaml.loader\n"})
+    _create_files(lib_dir, {"charms/db/v0/api.py": "from ops.model import Relation\n"})
+    _create_files(
+        venv_dir,
+        {
+            "yaml/__init__.py": "from .error import *\n",
+            "yaml/error.py": "",
+            "yaml/loader.py": "from .reader import Reader\n",
+            "yaml/reader.py": "from . import error\nfrom .. import impossible\n",
+            "yaml/unused.py": "import requests\n",
+            "ops/__init__.py": "from . import charm\n",
+            "ops/charm.py": "",
+            "ops/model.py": "",
+            "ops/testing.py": "",
+            "requests/__init__.py": "",
+        },
+    )
+
+    graph = ImportGraph([src_dir, lib_dir, venv_dir])
+    graph.add_module("charm")
+    graph.resolve()
+
+    for name in [
+        "helpers",
+        "charms.db.v0.api",
+        "yaml",
+        "yaml.loader",
+        "yaml.reader",
+        "yaml.error",
+        "ops",
+        "ops.charm",
+        "ops.model",
+    ]:
+        assert graph.is_reachable(name), name
+    for name in ["yaml.unused", "ops.testing", "requests"]:
+        assert not graph.is_reachable(name), name
+
+
+def test_graph_star_import(project):
+    """Importing everything from a package reaches all its submodules."""
+    src_dir, lib_dir, venv_dir = project
+    _create_files(src_dir, {"charm.py": "from pkg import *\n"})
+    _create_files(venv_dir, {"pkg/__init__.py": "", "pkg/one.py": "", "pkg/sub/__init__.py": ""})
+
+    graph = ImportGraph([src_dir, lib_dir, venv_dir])
+    graph.add_module("charm")
+    graph.resolve()
+    assert graph.is_reachable("pkg.one")
+    assert graph.is_reachable("pkg.sub")
+
+
+def test_graph_keep_all(project):
+    """Modules can be kept with everything under them, following their imports."""
+    src_dir, lib_dir, venv_dir = project
+    _create_files(src_dir, {"charm.py": ""})
+    _create_files(
+        venv_dir,
+        {"plugins/__init__.py": "import extra\n", "plugins/deep/one.py": "", "extra.py": ""},
+    )
+
+    graph = ImportGraph([src_dir, lib_dir, venv_dir])
+    graph.add_module("charm")
+    graph.add_module("plugins", keep_all=True)
+    graph.resolve()
+    assert graph.is_reachable("plugins.deep.one")
+    assert graph.is_reachable("extra")
+    assert not graph.is_reachable("pluginsfoo")
+
+
+def test_find_unreachable(project):
+    """Only unreachable packages and source modules are reported."""
+    src_dir, lib_dir, venv_dir = project
+    _create_files(src_dir, {"charm.py": "import used\nimport nspkg.used\n"})
+    _create_files(
+        venv_dir,
+        {
+            "used/__init__.py": "",
+            "used/unused_module.py": "",
+            "used/data/schema.json": "{}",
+            "used/__pycache__/__init__.cpython-38.pyc": "",
+            "unused/__init__.py": "",
+            "unused/sub.py": "",
+            "single_unused.py": "",
+            "_speedups.cpython-38-x86_64-linux-gnu.so": "",
+            "nspkg/used/__init__.py": "",
+            "nspkg/unused/__init__.py": "",
+            "unused-1.0.dist-info/METADATA": "",
+        },
+    )
+
+    graph = ImportGraph([src_dir, lib_dir, venv_dir])
+    graph.add_module("charm")
+    graph.resolve()
+    unreachable = sorted(find_unreachable(graph, venv_dir))
+    assert unreachable == [
+        ("nspkg.unused", str(venv_dir / "nspkg" / "unused")),
+        ("single_unused", str(venv_dir / "single_unused.py")),
+        ("unused", str(venv_dir / "unused")),
+        ("used.unused_module", str(venv_dir / "used" / "unused_module.py")),
+    ]
@@ -16,6 +16,7 @@
 
 import io
 import pathlib
+import random
 import subprocess
 import sys
 import textwrap
@@ -448,3 +449,305 @@ def test_extend_patterns():
     ignore.extend_patterns(["bar"])
     assert ignore.match("foo", is_dir=False)
     assert ignore.match("bar", is_dir=False)
+
+
+def _sequential_match(ignore, path, is_dir):
+    """Evaluate the matchers one by one, as the combined matching should be equivalent to."""
+    if not path.startswith("/"):
+        path = "/" + path
+    keep = True
+    for matcher in ignore._matchers:
+        result = matcher.match(path, is_dir)
+        if result == jujuignore.SKIP:
+            keep = False
+        elif result == jujuignore.FORCEKEEP:
+            keep = True
+            break
+    return not keep
+
+
+def test_combined_matching_equivalent_to_sequential():
+    rules = jujuignore.default_juju_ignore + [
+        "*.py[cod]",
+        "/foo/*.py",
+        "!/foo/keep.py",
+        "apps/**/logs/",
+        "!apps/special/logs/",
+        "bar/**",
+        "!bar/README.md",
+        "foo?.txt",
+        r"\!bang",
+    ]
+    ignore = jujuignore.JujuIgnore(rules)
+    paths = [
+        "version",
+        ".git",
+        "sub/.git",
+        "build",
+        "sub/build",
+        "foo/a.py",
+        "foo/keep.py",
+        "foo/sub/a.py",
+        "x/y.pyc",
+        "apps/logs",
+        "apps/a/b/logs",
+        "apps/special/logs",
+        "bar",
+        "bar/README.md",
+        "bar/other",
+        "foo1.txt",
+        "foo12.txt",
+        "!bang",
+    ]
+    for path in paths:
+        for is_dir in (True, False):
+            expected = _sequential_match(ignore, path, is_dir)
+            assert ignore.match(path, is_dir=is_dir) == expected, (path, is_dir)
+
+
+def test_combined_matching_after_extending():
+    ignore = jujuignore.JujuIgnore(["*.py"])
+    assert ignore.match("foo.py", is_dir=False)
+    ignore.extend_patterns(["!foo.py"])
+    assert not ignore.match("foo.py", is_dir=False)
+    assert ignore.match("bar.py", is_dir=False)
+
+
+def test_no_rules():
+    ignore = jujuignore.JujuIgnore([])
+    assert not ignore.match("foo", is_dir=False)
+    assert not ignore.match("foo", is_dir=True)
+
+
+@pytest.mark.parametrize(
+    "rule, expected",
+    [
+        ("/build", ("path", "/build")),
+        ("/foo/bar.txt", ("path", "/foo/bar.txt")),
+        ("**/.git", ("basename", ".git")),
+        ("**/*.pyc", ("suffix", ".pyc")),
+        ("**/*~", ("suffix", "~")),
+        ("**/foo/bar", None),
+        ("**/*", None),
+        ("**/*.py[cod]", None),
+        ("**/foo?", None),
+        ("**/foo*.py", None),
+        ("/foo/*.py", None),
+        ("/foo/**", None),
+    ],
+)
+def test_rule_to_literal(rule, expected):
+    assert jujuignore._rule_to_literal(rule) == expected
+
+
+def test_literal_rules_equivalent_to_regexes():
+    """Randomized check that the literal fast paths behave exactly like the regexes."""
+    rng = random.Random(42)
+    rule_components = ["foo", "bar", ".git", "*.py", "*.pyc", "a?", "[ab]c", "*", "**", "x~"]
+    path_components = ["foo", "bar", ".git", "a.py", "x.pyc", "ab", "bc", "x~", "pyc", "baz"]
+
+    for _ in range(200):
+        rules = []
+        for _ in range(rng.randint(1, 8)):
+            depth = rng.choice([1, 1, 1, 2, 3])
+            rule = "/".join(rng.choice(rule_components) for _ in range(depth))
+            if rng.random() < 0.3:
+                rule = "/" + rule
+            if rng.random() < 0.2:
+                rule += "/"
+            if rng.random() < 0.2:
+                rule = "!" + rule
+            rules.append(rule)
+        ignore = jujuignore.JujuIgnore(rules)
+
+        for _ in range(30):
+            depth = rng.randint(1, 4)
+            path = "/".join(rng.choice(path_components) for _ in range(depth))
+            is_dir = rng.random() < 0.5
+            expected = _sequential_match(ignore, path, is_dir)
+            assert ignore.match(path, is_dir=is_dir) == expected, (rules, path, is_dir)
+
+
+def test_subtree_ignored_by_doublestar():
+    ignore = jujuignore.JujuIgnore(["vendor/**", "/node_modules/**"])
+    assert ignore.is_subtree_ignored("vendor")
+    assert ignore.is_subtree_ignored("/foo/vendor")
+    assert ignore.is_subtree_ignored("/vendor/foo")
+    assert ignore.is_subtree_ignored("node_modules")
+    assert not ignore.is_subtree_ignored("/foo/node_modules")
+    assert not ignore.is_subtree_ignored("/vendors")
+    assert not ignore.is_subtree_ignored("/")
+    assert not ignore.is_subtree_ignored("")
+
+
+def test_subtree_ignored_not_everything_matched():
+    ignore = jujuignore.JujuIgnore(["vendor/*", "*.pyc", "logs/**/"])
+    assert not ignore.is_subtree_ignored("vendor")
+    assert not ignore.is_subtree_ignored("foo")
+    assert not ignore.is_subtree_ignored("logs")
+
+
+@pytest.mark.parametrize(
+    "negated, ignored",
+    [
+        ("!vendor/keep.txt", False),
+        ("!/vendor/keep.txt", False),
+        ("!keep.txt", False),
+        ("!/vendor/*/keep/", False),
+        ("!/vendor/**/keep", False),
+        ("!/other/keep.txt", True),
+        ("!/keep.txt", True),
+        ("!/vendor", True),
+        ("!/ven*/foo", False),
+        ("!/foo/**/vendor/x", True),
+    ],
+)
+def test_subtree_ignored_with_negations(negated, ignored):
+    ignore = jujuignore.JujuIgnore(["/vendor/**", negated])
+    assert ignore.is_subtree_ignored("vendor") is ignored
+
+
+def test_subtree_ignored_matches_rules():
+    """Everything under a subtree reported as ignored is really ignored."""
+    ignore = jujuignore.JujuIgnore(["/vendor/**", "!/other/keep.txt", "!/other/**/"])
+    assert ignore.is_subtree_ignored("vendor")
+    for path in ["vendor/foo", "vendor/other/keep.txt", "vendor/a/b/c", "vendor/x.md"]:
+        assert ignore.match(path, is_dir=False)
+
+
+def test_subtree_kept_no_rules_below():
+    ignore = jujuignore.JujuIgnore(["/build/", "/foo/*.py", "/foo/bar/"])
+    assert ignore.is_subtree_kept("src")
+    assert ignore.is_subtree_kept("build")
+    assert ignore.is_subtree_kept("foo/baz")
+    assert not ignore.is_subtree_kept("foo")
+    assert not ignore.is_subtree_kept("")
+
+
+def test_subtree_kept_unanchored_rules():
+    ignore = jujuignore.JujuIgnore(["/build/", "*.pyc"])
+    assert not ignore.is_subtree_kept("src")
+    assert not ignore.is_subtree_kept("")
+
+
+def test_subtree_kept_root():
+    ignore = jujuignore.JujuIgnore([])
+    assert ignore.is_subtree_kept("")
+    ignore = jujuignore.JujuIgnore(["/foo"])
+    assert not ignore.is_subtree_kept("/")
+
+
+def test_subtree_kept_by_negation():
+    ignore = jujuignore.JujuIgnore(["*.pyc", "!lib/**", "!/venv/**/"])
+    assert ignore.is_subtree_kept("lib")
+    assert ignore.is_subtree_kept("src/lib/foo")
+    assert not ignore.is_subtree_kept("src")
+    assert not ignore.is_subtree_kept("venv")
+    assert not ignore.match("lib/foo.pyc", is_dir=False)
+
+
+def test_subtree_kept_doublestar_in_the_middle():
+    # '/foo/**/bar' is translated to a regex that also matches '/fooX/bar'
+    ignore = jujuignore.JujuIgnore(["/foo/**/bar"])
+    assert ignore.match("/fooX/bar", is_dir=False)
+    assert not ignore.is_subtree_kept("fooX")
+    assert not ignore.is_subtree_kept("foo")
+    assert ignore.is_subtree_kept("other")
+
+
+def test_subtree_kept_doublestar_inside_component():
+    ignore = jujuignore.JujuIgnore(["/foo**bar"])
+    assert ignore.match("/foo/x/bar", is_dir=False)
+    assert not ignore.is_subtree_kept("foo")
+    assert not ignore.is_subtree_kept("foobaz")
+    assert ignore.is_subtree_kept("other")
+
+
+def test_subtree_kept_bracket_with_slash():
+    ignore = jujuignore.JujuIgnore(["/foo[/]bar"])
+    assert not ignore.is_subtree_kept("foo")
+
+
+def test_subtree_analysis_is_sound():
+    """Randomized check that the subtree analysis never contradicts the rules."""
+    rng = random.Random(7)
+    rule_components = ["foo", "bar", "*.py", "a?", "[ab]c", "*", "**", "x**", "f*"]
+    path_components = ["foo", "bar", "a.py", "ab", "bc", "fooX", "xy", "baz"]
+
+    def random_path(depth):
+        return "/".join(rng.choice(path_components) for _ in range(depth))
+
+    for _ in range(200):
+        rules = []
+        for _ in range(rng.randint(1, 6)):
+            depth = rng.choice([1, 2, 2, 3, 4])
+            rule = "/".join(rng.choice(rule_components) for _ in range(depth))
+            if rng.random() < 0.5:
+                rule = "/" + rule
+            if rng.random() < 0.2:
+                rule += "/"
+            if rng.random() < 0.3:
+                rule = "!" + rule
+            rules.append(rule)
+        ignore = jujuignore.JujuIgnore(rules)
+
+        for _ in range(10):
+            dirpath = random_path(rng.randint(0, 2))
+            ignored = ignore.is_subtree_ignored(dirpath)
+            kept = ignore.is_subtree_kept(dirpath)
+            assert not (ignored and kept)
+            if not (ignored or kept):
+                continue
+            for _ in range(10):
+                path = (dirpath + "/" + random_path(rng.randint(1, 3))).lstrip("/")
+                is_dir = rng.random() < 0.5
+                assert ignore.match(path, is_dir=is_dir) is ignored, (rules, dirpath, path)
+
+
+def test_instrumented_stats():
+    ignore = jujuignore.JujuIgnore(["*.py", "!foo.py"], instrument=True, source="first")
+    ignore.extend_patterns(["logs/", "/unused"], source="second")
+    assert ignore.match("bar.py", is_dir=False)
+    assert not ignore.match("foo.py", is_dir=False)
+    assert ignore.match("logs", is_dir=True)
+    assert not ignore.match("logs", is_dir=False)
+
+    stats = ignore.get_stats()
+    assert [(s.source, s.line_num, s.rule, s.evaluations, s.matches) for s in stats] == [
+        ("first", 1, "*.py", 4, 2),
+        ("first", 2, "!foo.py", 4, 1),
+        ("second", 1, "logs/", 4, 1),
+        ("second", 2, "/unused", 4, 0),
+    ]
+    assert all(s.elapsed >= 0 for s in stats)
+
+
+def test_instrumented_no_subtree_shortcuts():
+    """When instrumented the subtrees are always walked, so all the matches are counted."""
+    rules = ["node_modules/**", "!/docs/**"]
+    assert jujuignore.JujuIgnore(rules).is_subtree_ignored("node_modules")
+    assert jujuignore.JujuIgnore(rules).is_subtree_kept("docs")
+
+    ignore = jujuignore.JujuIgnore(rules, instrument=True)
+    assert not ignore.is_subtree_ignored("node_modules")
+    assert not ignore.is_subtree_kept("docs")
+    assert not ignore.is_subtree_kept("src")
+
+
+def test_not_instrumented_stats():
+    ignore = jujuignore.JujuIgnore(["*.py"])
+    assert ignore.match("bar.py", is_dir=False)
+    (stat,) = ignore.get_stats()
+    assert stat.evaluations == 0
+    assert stat.matches == 0
+    assert stat.elapsed == 0
+
+
+def test_instrumented_equivalent_to_combined():
+    rules = ["*.py[cod]", "/foo/*.py", "!/foo/keep.py", "apps/**/logs/", "bar/**", "!bar/X"]
+    combined = jujuignore.JujuIgnore(rules)
+    instrumented = jujuignore.JujuIgnore(rules, instrument=True)
+    paths = ["a.pyc", "foo/a.py", "foo/keep.py", "apps/x/logs", "bar/X", "bar/Y", "baz"]
+    for path in paths:
+        for is_dir in (True, False):
+            assert combined.match(path, is_dir) == instrumented.match(path, is_dir)
@@ -119,6 +119,21 @@ def test_ended_success(caplog, create_message_handler):
     assert not caplog.records
 
 
+def test_ended_success_managed_log_path(create_message_handler, monkeypatch, tmp_path):
+    """In managed mode the log is written where the host indicated, and kept."""
+    log_path = tmp_path / "build" / "test.charm.log"
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_LOG_PATH", str(log_path))
+
+    mh = create_message_handler()
+    mh.init(mh.NORMAL)
+    logging.getLogger("charmcraft.test").info("test info")
+    mh.ended_ok()
+
+    assert mh._log_filepath == str(log_path)
+    assert "test info" in log_path.read_text()
+
+
 def test_ended_interrupt(caplog, create_message_handler):
     """Reports ^C, removes log file."""
     caplog.set_level(logging.DEBUG, logger="charmcraft")
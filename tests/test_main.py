@@ -366,6 +366,25 @@ def test_main_ok():
     mh_mock.ended_ok.assert_called_once_with()
 
 
+def test_main_build_agent(monkeypatch):
+    """In a managed instance, charmcraft can be run as the build agent."""
+    monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+    with patch("charmcraft.agent.serve", return_value=0) as serve_mock:
+        retcode = main(["charmcraft", "--internal-build-agent", "/root/agent.sock"])
+    assert retcode == 0
+    serve_mock.assert_called_once_with("/root/agent.sock")
+
+
+def test_main_build_agent_not_managed(monkeypatch):
+    """The build agent is never run outside a managed instance."""
+    monkeypatch.delenv("CHARMCRAFT_MANAGED_MODE", raising=False)
+    with patch("charmcraft.agent.serve") as serve_mock:
+        with patch("charmcraft.main.message_handler"):
+            retcode = main(["charmcraft", "--internal-build-agent", "/root/agent.sock"])
+    assert retcode == 1
+    serve_mock.assert_not_called()
+
+
 def test_main_load_config_ok(create_config):
     """Command is properly executed, after loading and receiving the config."""
     tmp_path = create_config(
@@ -0,0 +1,393 @@
+# Copyright 2021 Canonical Ltd.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# For further info, check https://github.com/canonical/charmcraft
+
+import hashlib
+import logging
+import os
+import sys
+import zipfile
+from unittest import mock
+
+import pytest
+
+from charmcraft.package import COMPRESSION_LEVEL, build_zip, get_file_sha256
+
+
+@pytest.fixture(autouse=True)
+def clean_source_date_epoch(monkeypatch):
+    """Do not let the environment affect the packing."""
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+
+
+# -- tests for zip builder
+
+
+def test_zipbuild_simple(tmp_path):
+    """Build a bunch of files in the zip."""
+    build_dir = tmp_path / "somedir"
+    build_dir.mkdir()
+
+    testfile1 = build_dir / "foo.txt"
+    testfile1.write_bytes(b"123\x00456")
+    subdir = build_dir / "bar"
+    subdir.mkdir()
+    testfile2 = subdir / "baz.txt"
+    testfile2.write_bytes(b"mo\xc3\xb1o")
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert sorted(x.filename for x in zf.infolist()) == ["bar/baz.txt", "foo.txt"]
+    assert zf.read("foo.txt") == b"123\x00456"
+    assert zf.read("bar/baz.txt") == b"mo\xc3\xb1o"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_zipbuild_symlink_simple(tmp_path):
+    """Symlinks are supported."""
+    build_dir = tmp_path / "somedir"
+    build_dir.mkdir()
+
+    testfile1 = build_dir / "real.txt"
+    testfile1.write_bytes(b"123\x00456")
+    testfile2 = build_dir / "link.txt"
+    testfile2.symlink_to(testfile1)
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert sorted(x.filename for x in zf.infolist()) == ["link.txt", "real.txt"]
+    assert zf.read("real.txt") == b"123\x00456"
+    assert zf.read("link.txt") == b"123\x00456"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Windows not [yet] supported")
+def test_zipbuild_symlink_outside(tmp_path):
+    """No matter where the symlink points to."""
+    # outside the build dir
+    testfile1 = tmp_path / "real.txt"
+    testfile1.write_bytes(b"123\x00456")
+
+    # inside the build dir
+    build_dir = tmp_path / "somedir"
+    build_dir.mkdir()
+    testfile2 = build_dir / "link.txt"
+    testfile2.symlink_to(testfile1)
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert sorted(x.filename for x in zf.infolist()) == ["link.txt"]
+    assert zf.read("link.txt") == b"123\x00456"
+
+
+def _create_files(basedir, files):
+    """Create the files (relative path and content) in the base directory, in order."""
+    for name, content in files:
+        path = basedir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+
+def test_zipbuild_reproducible(tmp_path, monkeypatch):
+    """The same content produces the same zip, no matter when and how it was created."""
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
+    files = [("src/charm.py", b"code"), ("metadata.yaml", b"name: test"), ("b/a.txt", b"a")]
+
+    build_dir_1 = tmp_path / "first"
+    _create_files(build_dir_1, files)
+    (build_dir_1 / "src" / "charm.py").chmod(0o775)
+    build_dir_2 = tmp_path / "second"
+    _create_files(build_dir_2, reversed(files))
+    (build_dir_2 / "src" / "charm.py").chmod(0o700)
+    (build_dir_2 / "metadata.yaml").chmod(0o600)
+    os.utime(build_dir_2 / "b" / "a.txt", (1000000000, 1000000000))
+
+    build_zip(tmp_path / "first.zip", build_dir_1)
+    build_zip(tmp_path / "second.zip", build_dir_2)
+    assert (tmp_path / "first.zip").read_bytes() == (tmp_path / "second.zip").read_bytes()
+
+
+def test_zipbuild_normalized(tmp_path, monkeypatch):
+    """The entries are sorted, with the same timestamp and normalized permissions."""
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
+    build_dir = tmp_path / "somedir"
+    _create_files(build_dir, [("z.txt", b"z"), ("a/b.txt", b"b"), ("dispatch", b"#!/bin/sh")])
+    (build_dir / "dispatch").chmod(0o700)
+    (build_dir / "z.txt").chmod(0o600)
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    infos = zf.infolist()
+    assert [info.filename for info in infos] == ["a/b.txt", "dispatch", "z.txt"]
+    assert {info.date_time for info in infos} == {(2021, 10, 1, 0, 0, 0)}
+    assert [info.external_attr >> 16 for info in infos] == [0o100644, 0o100755, 0o100644]
+    assert {info.compress_type for info in infos} == {zipfile.ZIP_DEFLATED}
+
+
+def test_zipbuild_timestamp_newest_file(tmp_path):
+    """Without SOURCE_DATE_EPOCH the timestamp is the one of the newest file."""
+    build_dir = tmp_path / "somedir"
+    _create_files(build_dir, [("old.txt", b"old"), ("new.txt", b"new")])
+    os.utime(build_dir / "old.txt", (1500000000, 1500000000))
+    os.utime(build_dir / "new.txt", (1633046400, 1633046400))
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert {info.date_time for info in zf.infolist()} == {(2021, 10, 1, 0, 0, 0)}
+
+
+def test_zipbuild_timestamp_too_old(tmp_path, monkeypatch):
+    """The timestamp can not be older than what the zip format supports."""
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    build_dir = tmp_path / "somedir"
+    _create_files(build_dir, [("foo.txt", b"foo")])
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert zf.getinfo("foo.txt").date_time == (1980, 1, 1, 0, 0, 0)
+
+
+def test_zipbuild_compression_level(tmp_path):
+    """The content is compressed with the given level."""
+    build_dir = tmp_path / "somedir"
+    content = b"".join(b"line %d of some text\n" % (idx % 97) for idx in range(20000))
+    _create_files(build_dir, [("foo.txt", content)])
+
+    sizes = []
+    for level in (0, 1, 9):
+        zip_filepath = tmp_path / f"level{level}.zip"
+        build_zip(zip_filepath, build_dir, compression_level=level)
+        zf = zipfile.ZipFile(zip_filepath)
+        assert zf.read("foo.txt") == content
+        sizes.append(zf.getinfo("foo.txt").compress_size)
+    assert sizes[0] > sizes[1] > sizes[2]
+    assert COMPRESSION_LEVEL == 6
+
+
+def test_zipbuild_already_compressed_stored(tmp_path):
+    """Files in already compressed formats are stored, the rest is deflated."""
+    build_dir = tmp_path / "somedir"
+    names = ["wheels/ops-1.2.0-py3-none-any.whl", "data.tar.gz", "icon.PNG", "other.zip"]
+    _create_files(build_dir, [(name, b"x" * 1000) for name in names + ["src/charm.py"]])
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    for name in names:
+        assert zf.getinfo(name).compress_type == zipfile.ZIP_STORED
+        assert zf.read(name) == b"x" * 1000
+    assert zf.getinfo("src/charm.py").compress_type == zipfile.ZIP_DEFLATED
+    assert zf.read("src/charm.py") == b"x" * 1000
+
+
+def test_zipbuild_many_files(tmp_path, monkeypatch):
+    """All the files are compressed in parallel and written in order, intact."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 3)
+    build_dir = tmp_path / "somedir"
+    files = [(f"dir{idx % 7}/file{idx:03d}.py", os.urandom(idx * 50)) for idx in range(200)]
+    _create_files(build_dir, files)
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+
+    zf = zipfile.ZipFile(zip_filepath)
+    assert zf.testzip() is None
+    assert [info.filename for info in zf.infolist()] == sorted(name for name, _ in files)
+    for name, content in files:
+        assert zf.read(name) == content
+
+
+def test_zipbuild_same_as_zipfile(tmp_path, monkeypatch):
+    """The compressed entries are the same as zipfile itself would produce."""
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
+    build_dir = tmp_path / "somedir"
+    content = b"some repeated content " * 500
+    _create_files(build_dir, [("foo.txt", content)])
+
+    zip_filepath = tmp_path / "testresult.zip"
+    build_zip(zip_filepath, build_dir)
+    info = zipfile.ZipFile(zip_filepath).getinfo("foo.txt")
+
+    reference_filepath = tmp_path / "reference.zip"
+    with zipfile.ZipFile(reference_filepath, "w") as zf:
+        zf.writestr(info, content, compresslevel=COMPRESSION_LEVEL)
+        zf.comment = b"charmcraft compression-level=6"
+    assert zip_filepath.read_bytes() == reference_filepath.read_bytes()
+
+
+def test_zipbuild_inspector(tmp_path, monkeypatch):
+    """The inspector gets every file's content, in the order they are stored."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 3)
+    build_dir = tmp_path / "somedir"
+    files = [(f"dir{idx % 3}/file{idx:02d}.txt", os.urandom(idx * 10)) for idx in range(30)]
+    _create_files(build_dir, files)
+
+    inspected = []
+    build_zip(
+        tmp_path / "testresult.zip",
+        build_dir,
+        inspector=lambda name, content: inspected.append((name, content)),
+    )
+    assert inspected == sorted(files)
+
+
+def test_zipbuild_stream(tmp_path, monkeypatch):
+    """Everything written to the zip is also written to the stream, as it's written."""
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    build_dir = tmp_path / "somedir"
+    _create_files(build_dir, [(f"file{idx:02d}.py", b"code" * idx) for idx in range(20)])
+    zip_filepath = tmp_path / "testresult.zip"
+
+    class FakeStream:
+        def __init__(self):
+            self.chunks = []
+
+        def write(self, data):
+            # the zip is streamed while it's still being built
+            assert not zip_filepath.exists()
+            self.chunks.append(data)
+
+    stream = FakeStream()
+    build_zip(zip_filepath, build_dir, stream=stream)
+
+    assert len(stream.chunks) > 20
+    assert b"".join(stream.chunks) == zip_filepath.read_bytes()
+    assert zipfile.ZipFile(zip_filepath).testzip() is None
+
+
+# -- tests for reusing the previous package
+
+
+@pytest.fixture
+def reuse_project(tmp_path, monkeypatch, caplog):
+    """Provide a directory to pack, and a function to pack it getting how much was reused."""
+    caplog.set_level(logging.DEBUG, logger="charmcraft.package")
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1633046400")
+    build_dir = tmp_path / "somedir"
+    _create_files(
+        build_dir,
+        [
+            ("src/charm.py", b"code" * 100),
+            ("venv/lib.py", b"library" * 100),
+            ("venv/dep.whl", b"wheel"),
+        ],
+    )
+    zip_filepath = tmp_path / "test.charm"
+
+    def pack(compression_level=COMPRESSION_LEVEL):
+        caplog.clear()
+        build_zip(zip_filepath, build_dir, compression_level)
+        (message,) = [msg for msg in caplog.messages if msg.startswith("Reused ")]
+        return int(message.split()[1])
+
+    return build_dir, zip_filepath, pack
+
+
+def test_zipbuild_reuse_unchanged(reuse_project):
+    """The entries of the files not changed are reused, giving the same result."""
+    build_dir, zip_filepath, pack = reuse_project
+    assert pack() == 0
+    assert pack() == 3
+
+    (build_dir / "src" / "charm.py").write_bytes(b"new code")
+    assert pack() == 2
+    reused_content = zip_filepath.read_bytes()
+    assert zipfile.ZipFile(zip_filepath).read("src/charm.py") == b"new code"
+
+    zip_filepath.unlink()
+    assert pack() == 0
+    assert zip_filepath.read_bytes() == reused_content
+
+
+def test_zipbuild_reuse_without_pread(reuse_project, monkeypatch):
+    """The previous package is read portably (e.g. Windows does not have os.pread)."""
+    build_dir, zip_filepath, pack = reuse_project
+    monkeypatch.delattr(os, "pread", raising=False)
+    pack()
+    assert pack() == 3
+
+
+def test_zipbuild_reuse_same_size_changed(reuse_project):
+    """A file with the same size but different content is compressed again."""
+    build_dir, zip_filepath, pack = reuse_project
+    pack()
+
+    (build_dir / "venv" / "lib.py").write_bytes(b"LIBRARY" * 100)
+    assert pack() == 2
+    assert zipfile.ZipFile(zip_filepath).read("venv/lib.py") == b"LIBRARY" * 100
+
+
+def test_zipbuild_reuse_other_level(reuse_project):
+    """Nothing is reused if the previous package was compressed with other level."""
+    build_dir, zip_filepath, pack = reuse_project
+    pack(compression_level=1)
+
+    assert pack() == 0
+    assert pack(compression_level=1) == 0
+
+
+@pytest.mark.parametrize("content", [b"not a zip", b""])
+def test_zipbuild_reuse_broken(reuse_project, content):
+    """A broken previous package is just replaced."""
+    build_dir, zip_filepath, pack = reuse_project
+    zip_filepath.write_bytes(content)
+
+    assert pack() == 0
+    assert zipfile.ZipFile(zip_filepath).testzip() is None
+
+
+def test_zipbuild_reuse_foreign(reuse_project):
+    """A previous package not built here is not reused."""
+    build_dir, zip_filepath, pack = reuse_project
+    with zipfile.ZipFile(zip_filepath, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("src/charm.py", b"code" * 100)
+
+    assert pack() == 0
+
+
+def test_zipbuild_error_keeps_previous(reuse_project):
+    """If packing fails, the previous package is left untouched."""
+    build_dir, zip_filepath, pack = reuse_project
+    pack()
+    previous_content = zip_filepath.read_bytes()
+
+    with mock.patch("charmcraft.package._append_entry", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            pack()
+    assert zip_filepath.read_bytes() == previous_content
+    assert [path.name for path in zip_filepath.parent.iterdir() if path.is_file()] == [
+        "test.charm"
+    ]
+
+
+def test_get_file_sha256(tmp_path):
+    """The digest is of the whole file content."""
+    filepath = tmp_path / "test.charm"
+    content = os.urandom(3 * 2 ** 20)
+    filepath.write_bytes(content)
+
+    assert get_file_sha256(filepath) == hashlib.sha256(content).hexdigest()
@@ -93,6 +93,7 @@ class TestCharmPlugin:
             "{charm_builder} "
             "--charmdir {work_dir}/parts/foo/build "
             "--builddir {work_dir}/parts/foo/install "
+            "--cache-dir {work_dir} "
             "--entrypoint {work_dir}/parts/foo/build/entrypoint "
             "-p pkg1 "
             "-p pkg2 "
@@ -104,6 +105,89 @@ class TestCharmPlugin:
             )
         ]
 
+    def test_get_build_commands_ignore_stats(self):
+        spec = {
+            "plugin": "charm",
+            "charm-requirements": ["reqs1.txt"],
+            "charm-ignore-stats": True,
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert command.endswith("-r reqs1.txt --ignore-stats")
+
+    def test_get_build_commands_build_report(self):
+        spec = {
+            "plugin": "charm",
+            "charm-requirements": ["reqs1.txt"],
+            "charm-build-report": "/root/project/build/test.charm.build-report.json",
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert command.endswith(
+            "-r reqs1.txt --build-report /root/project/build/test.charm.build-report.json"
+        )
+
+    def test_get_build_commands_no_dependencies_cache(self):
+        spec = {
+            "plugin": "charm",
+            "charm-requirements": ["reqs1.txt"],
+            "charm-dependencies-cache": False,
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert "--cache-dir" not in command
+
+    def test_get_build_commands_managed_mode(self, monkeypatch):
+        monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+        (command,) = self._plugin.get_build_commands()
+        assert "--wheelhouse-dir /root/wheelhouse " in command
+
+    def test_get_build_commands_managed_mode_no_dependencies_cache(self, monkeypatch):
+        monkeypatch.setenv("CHARMCRAFT_MANAGED_MODE", "1")
+        spec = {
+            "plugin": "charm",
+            "charm-requirements": ["reqs1.txt"],
+            "charm-dependencies-cache": False,
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert "--wheelhouse-dir" not in command
+
+    def test_get_build_commands_bytecode(self):
+        spec = {
+            "plugin": "charm",
+            "charm-requirements": ["reqs1.txt", "reqs2.txt"],
+            "charm-compile-bytecode": True,
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert command.endswith("-r reqs2.txt --compile-bytecode")
+
+    def test_get_build_commands_prune(self):
+        spec = {
+            "plugin": "charm",
+            "charm-prune": True,
+            "charm-prune-keep": ["yaml/tests/"],
+            "charm-prune-remove": ["*.txt", "/docutils/"],
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert command.endswith(
+            "--prune --prune-keep yaml/tests/ --prune-remove '*.txt' --prune-remove /docutils/"
+        )
+
+    def test_get_build_commands_tree_shake(self):
+        spec = {
+            "plugin": "charm",
+            "charm-tree-shake": True,
+            "charm-tree-shake-keep": ["kubernetes.client", "jsonschema"],
+        }
+        self._plugin._options = parts.CharmPluginProperties.unmarshal(spec)
+        (command,) = self._plugin.get_build_commands()
+        assert command.endswith(
+            "--tree-shake --tree-shake-keep kubernetes.client --tree-shake-keep jsonschema"
+        )
+
     def test_invalid_properties(self):
         with pytest.raises(pydantic.ValidationError) as raised:
             parts.CharmPlugin.properties_class.unmarshal({"source": ".", "charm-invalid": True})
@@ -131,6 +215,21 @@ class TestPartsLifecycle:
             )
         assert lifecycle.prime_dir == pathlib.Path("/some/workdir/prime")
 
+    def test_parts_dir(self, tmp_path):
+        data = {
+            "plugin": "charm",
+            "source": ".",
+        }
+
+        with patch("craft_parts.LifecycleManager.refresh_packages_list"):
+            lifecycle = parts.PartsLifecycle(
+                all_parts={"charm": data},
+                work_dir="/some/workdir",
+                project_dir=tmp_path,
+                ignore_local_sources=["*.charm"],
+            )
+        assert lifecycle.parts_dir == pathlib.Path("/some/workdir/parts")
+
     def test_run_new_entrypoint(self, tmp_path, monkeypatch):
         data = {
             "plugin": "charm",
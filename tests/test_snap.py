@@ -74,3 +74,66 @@ def test_get_snap_configuration_invalid_providers(mock_snap_config, provider):
 
     with pytest.raises(ValueError, match=re.escape(f"provider {provider!r} is not supported")):
         validate_snap_configuration(snap_config)
+
+
+def test_get_snap_configuration_lxd_remotes(mock_snap_config):
+    def fake_get(key: str):
+        if key == "lxd-remotes":
+            return "host1:2,host2"
+        raise snaphelpers._conf.UnknownConfigKey(key=key)
+
+    mock_snap_config.return_value.get.side_effect = fake_get
+
+    snap_config = get_snap_configuration()
+
+    assert snap_config == CharmcraftSnapConfiguration(lxd_remotes="host1:2,host2")
+    validate_snap_configuration(snap_config)
+
+
+def test_validate_snap_configuration_invalid_lxd_remotes():
+    snap_config = CharmcraftSnapConfiguration(lxd_remotes="host1:-1")
+
+    with pytest.raises(ValueError, match=re.escape("invalid capacity for LXD remote 'host1'")):
+        validate_snap_configuration(snap_config)
+
+
+def test_get_snap_configuration_shared_cache(mock_snap_config):
+    def fake_get(key: str):
+        if key == "shared-cache":
+            return "https://cache.example.com/charms"
+        raise snaphelpers._conf.UnknownConfigKey(key=key)
+
+    mock_snap_config.return_value.get.side_effect = fake_get
+
+    snap_config = get_snap_configuration()
+
+    assert snap_config == CharmcraftSnapConfiguration(
+        shared_cache="https://cache.example.com/charms"
+    )
+    validate_snap_configuration(snap_config)
+
+
+def test_validate_snap_configuration_invalid_shared_cache():
+    snap_config = CharmcraftSnapConfiguration(shared_cache="relative/dir")
+
+    with pytest.raises(ValueError, match="is not a HTTP"):
+        validate_snap_configuration(snap_config)
+
+
+@pytest.mark.parametrize("value", [True, False, "true", "no"])
+def test_validate_snap_configuration_build_agent(value):
+    validate_snap_configuration(CharmcraftSnapConfiguration(build_agent=value))
+
+
+def test_validate_snap_configuration_invalid_build_agent():
+    snap_config = CharmcraftSnapConfiguration(build_agent="sometimes")
+
+    with pytest.raises(ValueError, match="'sometimes' is not a boolean"):
+        validate_snap_configuration(snap_config)
+
+
+def test_validate_snap_configuration_invalid_keep_alive():
+    snap_config = CharmcraftSnapConfiguration(keep_alive="forever")
+
+    with pytest.raises(ValueError, match="'forever' is not a number of minutes"):
+        validate_snap_configuration(snap_config)